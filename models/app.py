@@ -1,27 +1,50 @@
 import os
+import io
 import ast
+import csv
+import hashlib
+import threading
+from statistics import NormalDist
 import pandas as pd
 import numpy as np
-from sentence_transformers import SentenceTransformer
 # from deepdiff import DeepDiff
-from typing import Union, Dict, Tuple, List
+from typing import Any, Union, Dict, Tuple, List, Optional
+from result_store import ResultStore
+from query_cache import TTLCache
 
-class ScientificReproducibilityChecker:
-    """Complete solution for validating and comparing research outputs"""
+# Text models shared by all checkers in the process, loaded on first use
+_TEXT_MODELS: Dict[str, Any] = {}
+_TEXT_MODELS_LOCK = threading.Lock()
+
+def get_text_model(model_name: str):
+    """Returns the shared SentenceTransformer for model_name, loading it once"""
+    with _TEXT_MODELS_LOCK:
+        if model_name not in _TEXT_MODELS:
+            # Imported here so validation never pulls in torch
+            from sentence_transformers import SentenceTransformer
+            _TEXT_MODELS[model_name] = SentenceTransformer(model_name)
+        return _TEXT_MODELS[model_name]
+
+class SubmissionValidator:
+    """Validation-only entry point; never loads torch or sentence-transformers"""
+    
+    # CSV files are scanned in blocks of this many bytes
+    CSV_BLOCK_BYTES = 256 * 1024
+    
+    # Longest record (quoted fields may span lines) carried between blocks;
+    # anything longer is treated as an unclosed quote
+    CSV_MAX_RECORD_BYTES = 1024 * 1024
     
-    def __init__(self, numeric_tolerance: float = 1e-6):
+    def __init__(self):
         # Validation parameters (★ = strict requirements)
         self.validation_rules = {
             'allowed_formats': ['.csv', '.xlsx', '.py'],  # ★ Updated formats
             'max_file_size_mb': 5,                      # ★
             'delimiters': [',', '\t'],                    # ★ For CSV files
             'forbidden_header_chars': ['#', '@'],         # ★ For CSV/Excel headers
-            'min_columns': 1                              # ★ For data files
+            'min_columns': 1,                             # ★ For data files
+            'max_nan_ratio': 0.5                          # Warn above this missing ratio
         }
-        
-        # Comparison parameters
-        self.numeric_tolerance = numeric_tolerance
-        self.text_model = SentenceTransformer('all-MiniLM-L6-v2')
     
     def validate_file(self, file_path: str) -> Tuple[bool, Dict]:
         """Validates a research file against submission guidelines"""
@@ -80,17 +103,17 @@ class ScientificReproducibilityChecker:
                 )
                 return (False, report)
             
-            # Load sample for structure checks
-            df = pd.read_csv(file_path, delimiter=delim, nrows=10)
+            # Header only; the body is streamed below
+            columns = pd.read_csv(file_path, delimiter=delim, nrows=0).columns
             
             # ★ Column checks
-            if len(df.columns) < self.validation_rules['min_columns']:
+            if len(columns) < self.validation_rules['min_columns']:
                 report['errors'].append(
                     f"★ Minimum {self.validation_rules['min_columns']} column required"
                 )
             
             # ★ Header checks
-            for col in df.columns:
+            for col in columns:
                 col_str = str(col)
                 if any(c in col_str for c in self.validation_rules['forbidden_header_chars']):
                     report['errors'].append(
@@ -100,18 +123,52 @@ class ScientificReproducibilityChecker:
                     report['warnings'].append(
                         f"Potential merged cells in column: {col_str}"
                     )
+            report['columns'] = columns.tolist()
+            
+            # ★ Full-file scan; stops at the first fatal error
+            scan = self._scan_csv(file_path, delim, len(columns), report)
+            if scan is None:
+                report['valid'] = False
+                return (False, report)
             
             # Content checks
-            if df.empty:
+            rows = scan['rows']
+            if rows == 0:
                 report['errors'].append("★ Empty file")
-            elif len(df) == 1:
+            elif rows == 1:
                 report['warnings'].append("Only header row detected - no data rows")
             
-            report['columns'] = df.columns.tolist()
+            dtypes = {}
+            nan_ratio = {}
+            for i, col in enumerate(columns):
+                non_empty = int(scan['non_empty'][i])
+                numeric = int(scan['numeric'][i])
+                nan_ratio[col] = 1 - non_empty / rows if rows else 0.0
+                
+                if 0 < numeric < non_empty:
+                    report['warnings'].append(
+                        f"Mixed types in column '{col}': {numeric} numeric and "
+                        f"{non_empty - numeric} non-numeric values (e.g. '{scan['examples'][i]}')"
+                    )
+                if rows and non_empty == 0:
+                    report['warnings'].append(f"Column '{col}' is entirely empty")
+                elif nan_ratio[col] > self.validation_rules['max_nan_ratio']:
+                    report['warnings'].append(
+                        f"Column '{col}' is {nan_ratio[col]:.0%} missing values"
+                    )
+                
+                # Mirror the dtype pandas would infer for the full column
+                if non_empty and numeric == non_empty:
+                    is_int = scan['integral'][i] == numeric and non_empty == rows
+                    dtypes[col] = np.dtype('int64') if is_int else np.dtype('float64')
+                else:
+                    dtypes[col] = np.dtype('O')
+            
             report['metadata'] = {
                 'delimiter': delim,
-                'shape': df.shape,
-                'dtypes': df.dtypes.to_dict()
+                'shape': (rows, len(columns)),
+                'dtypes': dtypes,
+                'nan_ratio': nan_ratio
             }
             
         except pd.errors.EmptyDataError:
@@ -124,6 +181,167 @@ class ScientificReproducibilityChecker:
         report['valid'] = len(report['errors']) == 0
         return (report['valid'], report)
     
+    def _scan_csv(self, file_path: str, delim: str, n_cols: int, report: Dict) -> Optional[Dict]:
+        """Streams the CSV body in fixed-size blocks, accumulating per-column stats
+        
+        Returns None after recording a fatal error in the report.
+        """
+        stats = {
+            'rows': 0,
+            'non_empty': np.zeros(n_cols, dtype=np.int64),
+            'numeric': np.zeros(n_cols, dtype=np.int64),
+            'integral': np.zeros(n_cols, dtype=np.int64),
+            'examples': [None] * n_cols
+        }
+        
+        with open(file_path, 'rb') as f:
+            f.readline()  # Header, already checked
+            line_number = 2
+            carry = b''
+            while True:
+                block = f.read(self.CSV_BLOCK_BYTES)
+                data = carry + block
+                if block:
+                    # Only process whole lines, and never split a quoted field
+                    cut = data.rfind(b'\n') + 1
+                    opened = self._open_quote(data[:cut], delim) if cut else -1
+                    if cut == 0 or opened >= 0:
+                        if len(data) > self.CSV_MAX_RECORD_BYTES:
+                            bad_line = line_number + data.count(b'\n', 0, max(opened, 0))
+                            report['errors'].append(
+                                f"★ Malformed CSV: unclosed quote near line {bad_line} "
+                                f"(or a record over {self.CSV_MAX_RECORD_BYTES // 1024}KB)"
+                            )
+                            return None
+                        carry = data
+                        continue
+                    data, carry = data[:cut], data[cut:]
+                else:
+                    opened = self._open_quote(data, delim)
+                    if opened >= 0:
+                        bad_line = line_number + data.count(b'\n', 0, opened)
+                        report['errors'].append(f"★ Malformed CSV: unclosed quote near line {bad_line}")
+                        return None
+                
+                if data and not self._check_csv_block(data, delim, n_cols, line_number, stats, report):
+                    return None
+                line_number += data.count(b'\n')
+                
+                if not block:
+                    break
+        
+        return stats
+    
+    @staticmethod
+    def _open_quote(data: bytes, delim: str) -> int:
+        """Offset of a quoted field left open at the end of data, or -1
+        
+        data starts at a record boundary. As in the csv module, only a quote at
+        the start of a field opens one; a bare quote inside a field (15" monitor)
+        is literal, and "" inside a quoted field is an escaped quote.
+        """
+        boundaries = (ord(delim), ord('\n'), ord('\r'))
+        pos = data.find(b'"')
+        while pos >= 0:
+            if pos and data[pos - 1] not in boundaries:
+                pos = data.find(b'"', pos + 1)
+                continue
+            end = data.find(b'"', pos + 1)
+            while end >= 0 and data[end + 1:end + 2] == b'"':
+                end = data.find(b'"', end + 2)
+            if end < 0:
+                return pos
+            pos = data.find(b'"', end + 1)
+        return -1
+    
+    def _check_csv_block(
+        self,
+        data: bytes,
+        delim: str,
+        n_cols: int,
+        line_number: int,
+        stats: Dict,
+        report: Dict
+    ) -> bool:
+        """Vectorized row-width, encoding and per-column parse checks for one block"""
+        # ★ Encoding
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError as e:
+            bad_line = line_number + data.count(b'\n', 0, e.start)
+            report['errors'].append(f"★ Encoding error at line {bad_line} - use UTF-8")
+            return False
+        
+        # ★ Row width: count delimiters per line straight from the bytes,
+        # falling back to the csv module when quoting may hide delimiters
+        if b'"' in data:
+            reader = csv.reader(io.StringIO(text), delimiter=delim)
+            widths, lines = [], []
+            for row in reader:
+                if row:
+                    widths.append(len(row))
+                    lines.append(line_number + reader.line_num - 1)
+            widths, lines = np.array(widths, dtype=np.int64), np.array(lines, dtype=np.int64)
+        else:
+            raw = np.frombuffer(data, dtype=np.uint8)
+            ends = np.flatnonzero(raw == ord('\n'))
+            if not data.endswith(b'\n'):
+                ends = np.append(ends, len(data))
+            starts = np.concatenate(([0], ends[:-1] + 1))
+            delim_pos = np.flatnonzero(raw == ord(delim))
+            widths = np.searchsorted(delim_pos, ends) - np.searchsorted(delim_pos, starts) + 1
+            
+            # Blank lines (optionally just '\r') are skipped by the parser
+            lengths = ends - starts
+            has_cr = np.zeros(len(ends), dtype=bool)
+            nonzero = lengths > 0
+            has_cr[nonzero] = raw[ends[nonzero] - 1] == ord('\r')
+            keep = (lengths - has_cr) > 0
+            widths = widths[keep]
+            lines = line_number + np.flatnonzero(keep)
+        
+        ragged = np.flatnonzero(widths != n_cols)
+        if len(ragged):
+            i = ragged[0]
+            report['errors'].append(
+                f"★ Ragged row at line {lines[i]}: expected {n_cols} fields, found {widths[i]}"
+            )
+            return False
+        
+        # Per-column parse-ability and missing values; the C parser types
+        # clean numeric columns itself, so only object columns need coercing
+        chunk = pd.read_csv(
+            io.StringIO(text),
+            sep=delim,
+            header=None,
+            names=range(n_cols),
+            low_memory=False
+        )
+        present = chunk.notna().sum().to_numpy()
+        stats['rows'] += len(chunk)
+        stats['non_empty'] += present
+        
+        for i in range(n_cols):
+            col = chunk[i]
+            if pd.api.types.is_integer_dtype(col) or pd.api.types.is_bool_dtype(col):
+                stats['numeric'][i] += present[i]
+                stats['integral'][i] += present[i]
+                continue
+            if pd.api.types.is_float_dtype(col):
+                numeric = col.to_numpy()
+            else:
+                # Coerce each distinct value once rather than every cell
+                codes, uniques = pd.factorize(col)
+                parsed_uniques = pd.to_numeric(pd.Series(uniques), errors='coerce').to_numpy(dtype=float)
+                numeric = np.where(codes >= 0, parsed_uniques[codes], np.nan)
+                unparsed = np.flatnonzero(np.isnan(parsed_uniques))
+                if stats['examples'][i] is None and len(unparsed):
+                    stats['examples'][i] = uniques[unparsed[0]]
+            stats['numeric'][i] += np.count_nonzero(~np.isnan(numeric))
+            stats['integral'][i] += np.count_nonzero(numeric == np.floor(numeric))
+        
+        return True
+    
     def _validate_xlsx(self, file_path: str, report: Dict) -> Tuple[bool, Dict]:
         """Specialized Excel validation"""
         try:
@@ -251,13 +469,61 @@ class ScientificReproducibilityChecker:
         delims = self.validation_rules['delimiters'] + [';']
         counts = {d: sample.count(d) for d in delims}
         return max(counts.items(), key=lambda x: x[1])[0]
+
+class ScientificReproducibilityChecker(SubmissionValidator):
+    """Complete solution for validating and comparing research outputs"""
+    
+    def __init__(
+        self,
+        numeric_tolerance: float = 1e-6,
+        model_name: str = 'all-MiniLM-L6-v2',
+        cache_dir: Optional[str] = None
+    ):
+        super().__init__()
+        
+        # Comparison parameters
+        self.numeric_tolerance = numeric_tolerance
+        
+        # Approximate (sampled) comparison parameters
+        self.approximation_params = {
+            'initial_sample': 1000,     # Rows compared in the first round
+            'strata': 10,               # Contiguous row blocks sampled evenly
+            'confidence': 0.95,         # Confidence level of the score interval
+            'threshold': 0.95,          # Verification threshold for early exit
+            'seed': 0
+        }
+        self.model_name = model_name
+        
+        # In-memory cache bounds (LRU, with entries expiring after ttl_seconds)
+        self.cache_params = {
+            'definition_entries': 4096,
+            'ttl_seconds': 3600
+        }
+        
+        # Code embeddings keyed by hash of normalized definition source
+        self._definition_embeddings = TTLCache(
+            self.cache_params['definition_entries'], self.cache_params['ttl_seconds']
+        )
+        
+        # Durable results keyed by file content + configuration
+        self.result_store = ResultStore(cache_dir) if cache_dir else None
+    
+    @property
+    def text_model(self):
+        """Sentence embedding model, loaded lazily and shared across checkers"""
+        return get_text_model(self.model_name)
     
     def compare_outputs(
         self,
         expected_path: str,
-        actual_path: str
+        actual_path: str,
+        approximate: bool = False
     ) -> Tuple[float, Dict]:
-        """Main comparison function after validation"""
+        """Main comparison function after validation
+        
+        With approximate=True, large tables are compared on a growing row
+        sample until the score interval clears the verification threshold.
+        """
         expected = self._load_file(expected_path)
         actual = self._load_file(actual_path)
         
@@ -271,7 +537,7 @@ class ScientificReproducibilityChecker:
         
         # Dispatch to appropriate comparator
         if isinstance(expected, pd.DataFrame):
-            return self._compare_dataframes(expected, actual)
+            return self._compare_dataframes(expected, actual, approximate=approximate)
         elif isinstance(expected, str) and expected_ext == '.py':
             return self._compare_python_files(expected, actual)
         else:
@@ -294,7 +560,12 @@ class ScientificReproducibilityChecker:
         except Exception as e:
             raise ValueError(f"Failed to load {file_path}: {str(e)}")
     
-    def _compare_dataframes(self, df_expected: pd.DataFrame, df_actual: pd.DataFrame) -> Tuple[float, Dict]:
+    def _compare_dataframes(
+        self,
+        df_expected: pd.DataFrame,
+        df_actual: pd.DataFrame,
+        approximate: bool = False
+    ) -> Tuple[float, Dict]:
         """Detailed DataFrame comparison"""
         results = {
             "score_components": {},
@@ -317,6 +588,9 @@ class ScientificReproducibilityChecker:
         if extra_cols:
             results["differences"].append(f"Extra columns: {extra_cols}")
         
+        if approximate and len(df_expected) > self.approximation_params['initial_sample']:
+            return self._compare_dataframes_sampled(df_expected, df_actual, results)
+        
         # 3. Numeric comparison
         numeric_score = 1.0
         numeric_cols = df_expected.select_dtypes(include=np.number).columns
@@ -364,6 +638,141 @@ class ScientificReproducibilityChecker:
         
         return final_score, results
     
+    def _compare_dataframes_sampled(
+        self,
+        df_expected: pd.DataFrame,
+        df_actual: pd.DataFrame,
+        results: Dict
+    ) -> Tuple[float, Dict]:
+        """Approximate DataFrame comparison on an adaptively grown row sample"""
+        params = self.approximation_params
+        total_rows = len(df_expected)
+        rng = np.random.default_rng(params['seed'])
+        
+        # Stratify by row position so sorted tables are covered evenly;
+        # each stratum is shuffled once and consumed as a growing prefix
+        strata = [
+            rng.permutation(block)
+            for block in np.array_split(np.arange(total_rows), params['strata'])
+            if len(block)
+        ]
+        taken = [0] * len(strata)
+        
+        numeric_cols = [
+            col for col in df_expected.select_dtypes(include=np.number).columns
+            if col in df_actual.columns
+        ]
+        text_cols = [
+            col for col in df_expected.select_dtypes(include='object').columns
+            if col in df_actual.columns
+        ]
+        # Per-row match values seen so far, per column
+        row_scores = {col: [] for col in numeric_cols + text_cols}
+        max_diffs = {col: 0.0 for col in numeric_cols}
+        
+        # Bonferroni correction so the joint interval holds across columns
+        alpha = (1 - params['confidence']) / max(len(row_scores), 1)
+        z = NormalDist().inv_cdf(1 - alpha / 2)
+        
+        sample_size = min(params['initial_sample'], total_rows)
+        while True:
+            new_rows = []
+            for i, block in enumerate(strata):
+                target = min(len(block), int(np.ceil(sample_size * len(block) / total_rows)))
+                new_rows.append(block[taken[i]:target])
+                taken[i] = target
+            new_rows = np.concatenate(new_rows)
+            sampled = sum(taken)
+            
+            expected_rows = df_expected.iloc[new_rows]
+            actual_rows = df_actual.iloc[new_rows]
+            for col in numeric_cols:
+                close = np.isclose(
+                    expected_rows[col],
+                    actual_rows[col],
+                    atol=self.numeric_tolerance,
+                    equal_nan=True
+                )
+                row_scores[col].append(close)
+                if not close.all():
+                    diff = (expected_rows[col] - actual_rows[col]).abs().max()
+                    max_diffs[col] = max(max_diffs[col], float(diff))
+            for col in text_cols:
+                emb_expected = self.text_model.encode(
+                    expected_rows[col].astype(str).tolist()
+                )
+                emb_actual = self.text_model.encode(
+                    actual_rows[col].astype(str).tolist()
+                )
+                row_scores[col].append(np.clip(np.sum(emb_expected * emb_actual, axis=1), 0.0, 1.0))
+            
+            # Score with per-column means, and with their interval bounds;
+            # the score is monotone in every column mean
+            bounds = {}
+            for col, chunks in row_scores.items():
+                mean = float(np.concatenate(chunks).mean())
+                bounds[col] = (mean,) + self._mean_interval(mean, sampled, total_rows, z)
+            
+            estimate, lower, upper = (
+                0.7 * np.prod([bounds[col][k] for col in numeric_cols])
+                + 0.3 * np.prod([bounds[col][k] for col in text_cols])
+                for k in range(3)
+            )
+            
+            if lower >= params['threshold']:
+                decision = 'above_threshold'
+            elif upper < params['threshold']:
+                decision = 'below_threshold'
+            else:
+                decision = 'undecided'
+            
+            if decision != 'undecided' or sampled >= total_rows:
+                break
+            sample_size = min(sample_size * 2, total_rows)
+        
+        for col in numeric_cols:
+            if bounds[col][0] < 1.0:
+                results["differences"].append(
+                    f"Numeric deviation in '{col}': max difference {max_diffs[col]:.2e} (sampled)"
+                )
+        for col in text_cols:
+            if bounds[col][0] < 0.99:
+                results["differences"].append(
+                    f"Text difference in '{col}': similarity {bounds[col][0]:.2f} (sampled)"
+                )
+        
+        results["score_components"] = {
+            "numeric_score": float(np.prod([bounds[col][0] for col in numeric_cols])),
+            "text_score": float(np.prod([bounds[col][0] for col in text_cols]))
+        }
+        results["approximation"] = {
+            "sample_size": sampled,
+            "total_rows": total_rows,
+            "confidence": params['confidence'],
+            "score_interval": (float(lower), float(upper)),
+            "error_bound": float(max(estimate - lower, upper - estimate)),
+            "threshold": params['threshold'],
+            "decision": decision
+        }
+        
+        return float(estimate), results
+    
+    @staticmethod
+    def _mean_interval(mean: float, n: int, population: int, z: float) -> Tuple[float, float]:
+        """Wilson interval for a mean of [0, 1] values, finite-population corrected"""
+        if n >= population:
+            return mean, mean
+        
+        # Wilson is conservative for non-binary values since p(1-p) bounds their variance
+        denom = 1 + z ** 2 / n
+        center = (mean + z ** 2 / (2 * n)) / denom
+        half = z / denom * np.sqrt(mean * (1 - mean) / n + z ** 2 / (4 * n ** 2))
+        fpc = np.sqrt((population - n) / (population - 1))
+        
+        lower = mean - (mean - max(0.0, center - half)) * fpc
+        upper = mean + (min(1.0, center + half) - mean) * fpc
+        return float(lower), float(upper)
+    
     def _compare_python_files(self, expected_code: str, actual_code: str) -> Tuple[float, Dict]:
         """Compare Python code files"""
         results = {
@@ -396,10 +805,9 @@ class ScientificReproducibilityChecker:
             structural_score = 0.0
             results["differences"].append("Syntax error in one or both files")
         
-        # 3. Text similarity
-        emb_expected = self.text_model.encode([expected_code])
-        emb_actual = self.text_model.encode([actual_code])
-        text_similarity = float(emb_expected @ emb_actual.T)
+        # 3. Text similarity (per top-level function/class)
+        text_similarity, definition_diffs = self._compare_definitions(expected_code, actual_code)
+        results["differences"].extend(definition_diffs)
         
         # 4. Line-by-line comparison
         expected_lines = expected_code.strip().split('\n')
@@ -419,6 +827,94 @@ class ScientificReproducibilityChecker:
         
         return final_score, results
     
+    def _extract_definitions(self, code: str) -> Dict[str, str]:
+        """Splits code into top-level definitions with normalized source"""
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            # Fall back to treating the whole file as one unit
+            return {'<module>': code.strip()}
+        
+        definitions = {}
+        module_body = []
+        for node in tree.body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                # ast.unparse drops comments and formatting differences
+                definitions[node.name] = ast.unparse(node)
+            else:
+                module_body.append(ast.unparse(node))
+        
+        if module_body:
+            definitions['<module>'] = '\n'.join(module_body)
+        return definitions
+    
+    def _embed_definitions(self, sources: List[str]) -> List[np.ndarray]:
+        """Embeds definition sources, only encoding ones not seen before"""
+        keys = [hashlib.sha256(src.encode('utf-8')).hexdigest() for src in sources]
+        found, missing = {}, {}
+        for key, src in zip(keys, sources):
+            emb = self._definition_embeddings.get(key)
+            if emb is None:
+                missing[key] = src
+            else:
+                found[key] = emb
+        
+        if missing:
+            embeddings = self.text_model.encode(
+                list(missing.values()), normalize_embeddings=True
+            )
+            for key, emb in zip(missing.keys(), embeddings):
+                self._definition_embeddings.put(key, emb)
+                found[key] = emb
+        
+        # Looked up once, so eviction within this call can't drop a result
+        return [found[key] for key in keys]
+    
+    def _compare_definitions(self, expected_code: str, actual_code: str) -> Tuple[float, List[str]]:
+        """Similarity of matched top-level definitions, weighted by size"""
+        expected_defs = self._extract_definitions(expected_code)
+        actual_defs = self._extract_definitions(actual_code)
+        differences = []
+        
+        missing = [name for name in expected_defs if name not in actual_defs]
+        extra = [name for name in actual_defs if name not in expected_defs]
+        if missing:
+            differences.append(f"Missing definitions: {missing}")
+        if extra:
+            differences.append(f"Extra definitions: {extra}")
+        
+        # Identical definitions score 1.0 without touching the model
+        matched = [name for name in expected_defs if name in actual_defs]
+        changed = [name for name in matched if expected_defs[name] != actual_defs[name]]
+        if changed:
+            differences.append(f"Changed definitions: {changed}")
+            emb_expected = self._embed_definitions([expected_defs[name] for name in changed])
+            emb_actual = self._embed_definitions([actual_defs[name] for name in changed])
+            changed_scores = {
+                name: float(np.clip(e @ a, 0.0, 1.0))
+                for name, e, a in zip(changed, emb_expected, emb_actual)
+            }
+        else:
+            changed_scores = {}
+        
+        # Unmatched definitions count as zero similarity
+        total_weight = 0.0
+        weighted_score = 0.0
+        for name in set(expected_defs) | set(actual_defs):
+            weight = max(len(expected_defs.get(name, '')), len(actual_defs.get(name, '')))
+            if name in changed_scores:
+                score = changed_scores[name]
+            elif name in matched:
+                score = 1.0
+            else:
+                score = 0.0
+            total_weight += weight
+            weighted_score += weight * score
+        
+        if total_weight == 0:
+            return 1.0, differences
+        return weighted_score / total_weight, differences
+    
     def _compare_scalars(self, expected, actual) -> Tuple[float, Dict]:
         """Simple scalar value comparison"""
         if isinstance(expected, (float, np.floating)) and isinstance(actual, (float, np.floating)):
@@ -483,14 +979,78 @@ class ScientificReproducibilityChecker:
                 report.append("\nScore Components:")
                 for k, v in comparison['details']['score_components'].items():
                     report.append(f"- {k}: {v:.2f}")
+            
+            approximation = comparison['details'].get('approximation')
+            if approximation:
+                lower, upper = approximation['score_interval']
+                report.append("\nApproximate Comparison:")
+                report.append(
+                    f"- Sample size: {approximation['sample_size']} of {approximation['total_rows']} rows"
+                )
+                report.append(
+                    f"- Error bound: ±{approximation['error_bound']:.3f} "
+                    f"({approximation['confidence']:.0%} interval [{lower:.3f}, {upper:.3f}])"
+                )
+                report.append(
+                    f"- Decision vs threshold {approximation['threshold']:.2f}: {approximation['decision']}"
+                )
         
         return "\n".join(report)
     
-    def process_study(self, expected_path: str, actual_path: str) -> Dict:
+    def cache_config(self) -> Dict:
+        """Checker settings that results depend on, used in cache keys"""
+        return {
+            'numeric_tolerance': self.numeric_tolerance,
+            'validation_rules': self.validation_rules,
+            'approximation_params': self.approximation_params,
+            'model_name': self.model_name
+        }
+    
+    def _cached_validate(self, file_path: str) -> Tuple[bool, Dict]:
+        """validate_file, served from the result store when available"""
+        if self.result_store is None:
+            return self.validate_file(file_path)
+        
+        key = self.result_store.make_key(
+            'validation',
+            self.cache_config(),
+            os.path.splitext(file_path)[1].lower(),
+            self.result_store.file_digest(file_path)
+        )
+        cached = self.result_store.get(key)
+        if cached is not None:
+            return cached
+        
+        result = self.validate_file(file_path)
+        self.result_store.put(key, result)
+        return result
+    
+    def _cached_compare(self, expected_path: str, actual_path: str, approximate: bool) -> Tuple[float, Dict]:
+        """compare_outputs, served from the result store when available"""
+        if self.result_store is None:
+            return self.compare_outputs(expected_path, actual_path, approximate=approximate)
+        
+        key = self.result_store.make_key(
+            'comparison',
+            dict(self.cache_config(), approximate=approximate),
+            os.path.splitext(expected_path)[1].lower(),
+            self.result_store.file_digest(expected_path),
+            os.path.splitext(actual_path)[1].lower(),
+            self.result_store.file_digest(actual_path)
+        )
+        cached = self.result_store.get(key)
+        if cached is not None:
+            return cached
+        
+        result = self.compare_outputs(expected_path, actual_path, approximate=approximate)
+        self.result_store.put(key, result)
+        return result
+    
+    def process_study(self, expected_path: str, actual_path: str, approximate: bool = False) -> Dict:
         """Complete processing pipeline"""
         # Validate both files
-        expected_valid, expected_report = self.validate_file(expected_path)
-        actual_valid, actual_report = self.validate_file(actual_path)
+        expected_valid, expected_report = self._cached_validate(expected_path)
+        actual_valid, actual_report = self._cached_validate(actual_path)
         
         validation = {
             'expected': expected_report,
@@ -499,7 +1059,9 @@ class ScientificReproducibilityChecker:
         
         # Only compare if both files are valid
         if expected_valid and actual_valid:
-            score, comparison_details = self.compare_outputs(expected_path, actual_path)
+            score, comparison_details = self._cached_compare(
+                expected_path, actual_path, approximate
+            )
             comparison = {
                 'score': score,
                 'details': comparison_details
@@ -546,4 +1108,7 @@ if __name__ == "__main__":
     # result_xlsx = checker.process_study("expected.xlsx", "actual.xlsx")
     
     # Python code comparison
-    # result_py = checker.process_study("expected_analysis.py", "actual_analysis.py")
\ No newline at end of file
+    # result_py = checker.process_study("expected_analysis.py", "actual_analysis.py")
+    
+    # Whole corpus (parallel, resumable):
+    # python batch_verify.py --studies-dir studies/ --output results.jsonl
\ No newline at end of file
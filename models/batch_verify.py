@@ -0,0 +1,216 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Set
+
+from app import ScientificReproducibilityChecker
+
+# One checker per worker process, so the text model loads once per worker
+_worker_checker: Optional[ScientificReproducibilityChecker] = None
+_worker_approximate = False
+
+
+def load_manifest(manifest_path: str) -> List[Dict]:
+    """Reads (study_id, expected, actual) entries from a JSONL manifest
+
+    Relative file paths are resolved against the manifest's directory.
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    studies = []
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if 'expected' not in entry or 'actual' not in entry:
+                raise ValueError(f"Manifest line {line_number} needs 'expected' and 'actual'")
+            studies.append({
+                'study_id': str(entry.get('study_id', line_number)),
+                'expected': os.path.join(base_dir, entry['expected']),
+                'actual': os.path.join(base_dir, entry['actual'])
+            })
+    return studies
+
+
+def discover_studies(root_dir: str) -> List[Dict]:
+    """Finds study_*/expected_* + reproduced_*/actual_* pairs, one study per subdirectory"""
+    studies = []
+    for study_id in sorted(os.listdir(root_dir)):
+        study_dir = os.path.join(root_dir, study_id)
+        if not os.path.isdir(study_dir):
+            continue
+        files = sorted(os.listdir(study_dir))
+        expected = [f for f in files if f.startswith('expected')]
+        actual = [f for f in files if f.startswith(('reproduced', 'actual'))]
+        if len(expected) == 1 and len(actual) == 1:
+            studies.append({
+                'study_id': study_id,
+                'expected': os.path.join(study_dir, expected[0]),
+                'actual': os.path.join(study_dir, actual[0])
+            })
+    return studies
+
+
+def latest_records(output_path: str) -> Dict[str, Dict]:
+    """The last record per study ID in an output file
+
+    A retried study has one line per attempt; only the latest counts.
+    """
+    records = {}
+    if not os.path.exists(output_path):
+        return records
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Partial line from an interrupted run
+                continue
+            records[record['study_id']] = record
+    return records
+
+
+def completed_study_ids(output_path: str) -> Set[str]:
+    """Study IDs already recorded in an output file (failed runs are retried)"""
+    return {
+        study_id for study_id, record in latest_records(output_path).items()
+        if record.get('status') != 'error'
+    }
+
+
+def truncate_partial_line(output_path: str, block_size: int = 65536):
+    """Cut an interrupted run's unterminated last line, so appended records
+    start on a line of their own"""
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(position - block_size, 0)
+            f.seek(start)
+            block = f.read(position - start)
+            newline = block.rfind(b'\n')
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            f.truncate(position)
+
+
+def _init_worker(numeric_tolerance: float, model_name: str, cache_dir: Optional[str], approximate: bool):
+    global _worker_checker, _worker_approximate
+    _worker_checker = ScientificReproducibilityChecker(
+        numeric_tolerance=numeric_tolerance,
+        model_name=model_name,
+        cache_dir=cache_dir
+    )
+    _worker_approximate = approximate
+
+
+def _verify_study(study: Dict) -> Dict:
+    """Runs process_study for one study, isolating any failure"""
+    start = time.time()
+    record = dict(study)
+    try:
+        result = _worker_checker.process_study(
+            study['expected'], study['actual'], approximate=_worker_approximate
+        )
+        record['status'] = result['status']
+        record['score'] = result['comparison']['score'] if result['comparison'] else None
+        record['details'] = result['comparison']['details'] if result['comparison'] else None
+        record['errors'] = {
+            side: report['errors'] for side, report in result['validation'].items()
+        }
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = f"{type(e).__name__}: {str(e)}"
+    record['elapsed_s'] = time.time() - start
+    return record
+
+
+def run_batch(
+    studies: List[Dict],
+    output_path: str,
+    workers: Optional[int] = None,
+    numeric_tolerance: float = 1e-6,
+    model_name: str = 'all-MiniLM-L6-v2',
+    cache_dir: Optional[str] = None,
+    approximate: bool = False,
+    resume: bool = True
+) -> Dict:
+    """Verifies studies on a process pool, appending results to a JSONL file"""
+    if resume:
+        done = completed_study_ids(output_path)
+        truncate_partial_line(output_path)
+        pending = [s for s in studies if s['study_id'] not in done]
+    else:
+        done = set()
+        pending = studies
+        open(output_path, 'w').close()
+
+    print(f"{len(pending)} studies to verify ({len(done)} already done)", file=sys.stderr)
+    counts = {'success': 0, 'validation_failed': 0, 'error': 0}
+    start = time.time()
+
+    with open(output_path, 'a', encoding='utf-8') as out, ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(numeric_tolerance, model_name, cache_dir, approximate)
+    ) as pool:
+        futures = [pool.submit(_verify_study, study) for study in pending]
+        for finished, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            # Flush every record so an interrupted run can resume from here
+            out.write(json.dumps(record, default=str) + '\n')
+            out.flush()
+            counts[record['status']] = counts.get(record['status'], 0) + 1
+
+            elapsed = time.time() - start
+            rate = finished / elapsed if elapsed > 0 else 0.0
+            eta = (len(pending) - finished) / rate if rate > 0 else 0.0
+            score = f"{record['score']:.3f}" if record.get('score') is not None else '-'
+            print(
+                f"[{finished}/{len(pending)}] {record['study_id']}: {record['status']} "
+                f"score={score} | {rate:.2f} studies/s | ETA {int(eta // 60)}m{int(eta % 60):02d}s",
+                file=sys.stderr
+            )
+
+    return {'verified': len(pending), 'skipped': len(done), 'counts': counts,
+            'elapsed_s': time.time() - start}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Re-verify many studies in parallel")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--manifest', help="JSONL file of {study_id, expected, actual}")
+    source.add_argument('--studies-dir', help="Directory with one subdirectory per study")
+    parser.add_argument('--output', required=True, help="JSONL file results are appended to")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--tolerance', type=float, default=1e-6, help="Numeric tolerance")
+    parser.add_argument('--model', default='all-MiniLM-L6-v2', help="Sentence embedding model")
+    parser.add_argument('--cache-dir', default=None, help="Result store directory")
+    parser.add_argument('--approximate', action='store_true', help="Sampled comparison for large tables")
+    parser.add_argument('--no-resume', action='store_true', help="Overwrite output instead of resuming")
+    args = parser.parse_args(argv)
+
+    studies = load_manifest(args.manifest) if args.manifest else discover_studies(args.studies_dir)
+    summary = run_batch(
+        studies,
+        args.output,
+        workers=args.workers,
+        numeric_tolerance=args.tolerance,
+        model_name=args.model,
+        cache_dir=args.cache_dir,
+        approximate=args.approximate,
+        resume=not args.no_resume
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# Single-pass static analysis of uploaded Python analysis scripts
+
+import io
+import re
+import ast
+import tokenize
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+def normalize_keyword(text: str) -> str:
+    """Lowercase and drop separators, so 't-test' matches 'ttest_ind'"""
+    return re.sub(r'[^a-z0-9]', '', text.lower())
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton: finds every keyword in one scan of the text"""
+
+    def __init__(self, patterns: Dict[str, List[Tuple[str, str]]]):
+        # patterns: normalized pattern -> labels it reports
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[Tuple[str, str]]] = [[]]
+
+        for pattern, labels in patterns.items():
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].extend(labels)
+
+        # Breadth-first failure links; outputs inherit their suffix matches
+        # (children of the root keep failing back to the root)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def search(self, words: Iterable[str]) -> Set[Tuple[str, str]]:
+        """Labels of all patterns occurring inside any of the words"""
+        found = set()
+        for word in words:
+            state = 0
+            for char in word:
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                state = self.goto[state].get(char, 0)
+                if self.output[state]:
+                    found.update(self.output[state])
+        return found
+
+
+def dotted_name(node: ast.AST) -> Optional[str]:
+    """'stats.pearsonr' for stats.pearsonr(...), 'df.groupby().mean' for chained calls"""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = dotted_name(node.value)
+        return f"{base}.{node.attr}" if base else node.attr
+    if isinstance(node, ast.Call):
+        base = dotted_name(node.func)
+        return f"{base}()" if base else None
+    return None
+
+
+class CodeAnalyzer(ast.NodeVisitor):
+    """Collects functions, imports, assignments, identifiers and call sites in one walk"""
+
+    def __init__(self):
+        self.functions: List[Dict] = []
+        self.imports: List[str] = []
+        self.identifiers: Set[str] = set()
+        self.call_sites: Dict[str, int] = {}
+        # (lineno, col, end_lineno, end_col) of every string literal, for comments
+        self.string_spans: List[Tuple[int, int, int, int]] = []
+        self._variables: List[Tuple[int, int, str]] = []
+        self._depth = 0
+        self._dispatch: Dict[type, object] = {}
+
+    def visit(self, node: ast.AST):
+        # NodeVisitor.visit looks the method up by name on every node
+        method = self._dispatch.get(node.__class__)
+        if method is None:
+            method = getattr(self, 'visit_' + node.__class__.__name__, self.generic_visit)
+            self._dispatch[node.__class__] = method
+        return method(node)
+
+    def generic_visit(self, node: ast.AST):
+        for child in ast.iter_child_nodes(node):
+            self.visit(child)
+
+    @property
+    def variables(self) -> List[str]:
+        # Outer scopes first, as module-level names matter most
+        return [name for _, _, name in sorted(self._variables)]
+
+    def _visit_scope(self, node: ast.AST):
+        self._depth += 1
+        self.generic_visit(node)
+        self._depth -= 1
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        self.functions.append({
+            'name': node.name,
+            'docstring': ast.get_docstring(node) or '',
+            'parameters': [arg.arg for arg in node.args.args],
+            'line_number': node.lineno
+        })
+        self.identifiers.add(node.name)
+        self.identifiers.update(arg.arg for arg in node.args.args)
+        self._visit_scope(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self.identifiers.add(node.name)
+        self._visit_scope(node)
+
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            self.imports.append(alias.name)
+            self.identifiers.update(alias.name.split('.'))
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        module = node.module or ''
+        for alias in node.names:
+            self.imports.append(f"{module}.{alias.name}")
+            self.identifiers.add(alias.name)
+        self.identifiers.update(part for part in module.split('.') if part)
+
+    def visit_Assign(self, node: ast.Assign):
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                self._variables.append((self._depth, len(self._variables), target.id))
+        self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name):
+        self.identifiers.add(node.id)
+
+    def visit_Attribute(self, node: ast.Attribute):
+        self.identifiers.add(node.attr)
+        self.generic_visit(node)
+
+    def visit_keyword(self, node: ast.keyword):
+        if node.arg:
+            self.identifiers.add(node.arg)
+        self.generic_visit(node)
+
+    def visit_Constant(self, node: ast.Constant):
+        if isinstance(node.value, (str, bytes)):
+            self.string_spans.append((node.lineno, node.col_offset, node.end_lineno, node.end_col_offset))
+
+    def visit_JoinedStr(self, node: ast.JoinedStr):
+        self.string_spans.append((node.lineno, node.col_offset, node.end_lineno, node.end_col_offset))
+        self.generic_visit(node)
+
+    def visit_Call(self, node: ast.Call):
+        name = dotted_name(node.func)
+        if name:
+            self.call_sites[name] = self.call_sites.get(name, 0) + 1
+        self.generic_visit(node)
+
+
+def extract_comments(content: str, string_spans: List[Tuple[int, int, int, int]]) -> List[Dict]:
+    """Comments with line numbers, ignoring '#' inside string literals
+
+    Uses the string spans from CodeAnalyzer rather than the tokenize module,
+    which is pure Python and dominated runtime on large exported notebooks.
+    """
+    lines = content.split('\n')
+    candidates = {i + 1 for i, line in enumerate(lines) if '#' in line}
+    if not candidates:
+        return []
+
+    # Byte ranges per line covered by strings (AST offsets are UTF-8 bytes)
+    covered: Dict[int, List[Tuple[int, float]]] = {}
+    for lineno, col, end_lineno, end_col in string_spans:
+        for line in range(lineno, end_lineno + 1):
+            if line in candidates:
+                start = col if line == lineno else 0
+                end = end_col if line == end_lineno else float('inf')
+                covered.setdefault(line, []).append((start, end))
+
+    comments = []
+    for line in sorted(candidates):
+        raw = lines[line - 1].encode('utf-8')
+        position = raw.find(b'#')
+        while position != -1:
+            if not any(start <= position < end for start, end in covered.get(line, [])):
+                comments.append({
+                    'line': line,
+                    'text': raw[position + 1:].decode('utf-8').strip()
+                })
+                break
+            position = raw.find(b'#', position + 1)
+    return comments
+
+
+# Token types that carry layout or commentary, not code
+_LAYOUT_TOKENS = {
+    tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE,
+    tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER
+}
+
+
+def code_shingles(content: str, size: int = 5) -> List[str]:
+    """Overlapping runs of size normalized tokens, for near-duplicate detection
+
+    Comments and layout are dropped and string and number literals become
+    STR and NUM, so reformatting, re-commenting or changing constants
+    barely changes the set.
+    """
+    tokens = []
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(content).readline):
+            if token.type in _LAYOUT_TOKENS:
+                continue
+            if token.type == tokenize.STRING:
+                tokens.append('STR')
+            elif token.type == tokenize.NUMBER:
+                tokens.append('NUM')
+            else:
+                tokens.append(token.string)
+    except (tokenize.TokenError, SyntaxError):
+        pass
+    if len(tokens) <= size:
+        return [' '.join(tokens)] if tokens else []
+    return [' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
@@ -0,0 +1,101 @@
+# Assembles retrieved chunks into a compact, token-budgeted LLM context
+
+from __future__ import annotations
+
+import numpy as np
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+if TYPE_CHECKING:
+    from langchain.schema import Document
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+
+def _source_key(doc: Document) -> Tuple:
+    metadata = doc.metadata
+    return (metadata.get('study_id'), metadata.get('chunk_type'), metadata.get('filename'))
+
+
+def _overlap(left: str, right: str, max_overlap: int) -> int:
+    """Length of the longest suffix of left that is a prefix of right"""
+    for size in range(min(len(left), len(right), max_overlap), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_adjacent(docs: List[Document], max_overlap: int = 400) -> List[Tuple[int, Document]]:
+    """Merge chunks that are neighbours in the same source document
+
+    Chunks with consecutive chunk_index from the same study, chunk type and
+    file are joined into one block, dropping the text the splitter repeated
+    between them. Returns (best rank among the merged chunks, block), in rank order.
+    """
+    runs: Dict[Tuple, List[Tuple[int, Document]]] = {}
+    for rank, doc in enumerate(docs):
+        runs.setdefault(_source_key(doc), []).append((rank, doc))
+
+    blocks = []
+    for key, ranked in runs.items():
+        if None in key[1:] or any('chunk_index' not in doc.metadata for _, doc in ranked):
+            blocks.extend(ranked)
+            continue
+        ranked.sort(key=lambda item: item[1].metadata['chunk_index'])
+        rank, doc = ranked[0]
+        text, last_index = doc.page_content, doc.metadata['chunk_index']
+        for next_rank, next_doc in ranked[1:]:
+            index = next_doc.metadata['chunk_index']
+            if index == last_index:
+                continue
+            if index == last_index + 1:
+                overlap = _overlap(text, next_doc.page_content, max_overlap)
+                text += next_doc.page_content[overlap:] if overlap else "\n" + next_doc.page_content
+                rank = min(rank, next_rank)
+            else:
+                blocks.append((rank, type(doc)(page_content=text, metadata=doc.metadata)))
+                rank, doc, text = next_rank, next_doc, next_doc.page_content
+            last_index = index
+        blocks.append((rank, type(doc)(page_content=text, metadata=doc.metadata)))
+
+    blocks.sort(key=lambda item: item[0])
+    return blocks
+
+
+def drop_near_duplicates(docs: List[Document], embeddings: np.ndarray, threshold: float = 0.95) -> List[Document]:
+    """Keep a document only if it is below threshold cosine similarity to every
+    better-ranked document already kept"""
+    if len(docs) == 0:
+        return []
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms > 0, norms, 1)
+
+    kept = []
+    for i, doc in enumerate(docs):
+        if kept and float(np.max(vectors[kept] @ vectors[i])) >= threshold:
+            continue
+        kept.append(i)
+    return [docs[i] for i in kept]
+
+
+def pack_context(docs: List[Document], token_budget: int) -> List[Document]:
+    """Greedily keep the best-ranked documents that fit the token budget
+
+    A document that does not fit is skipped in favour of smaller ones further
+    down; if not even the best one fits, it is truncated to the budget.
+    """
+    packed, used = [], 0
+    for doc in docs:
+        tokens = estimate_tokens(doc.page_content)
+        if used + tokens <= token_budget:
+            packed.append(doc)
+            used += tokens
+    if not packed and docs:
+        packed.append(type(docs[0])(
+            page_content=docs[0].page_content[:token_budget * 4],
+            metadata=docs[0].metadata
+        ))
+    return packed
@@ -0,0 +1,12 @@
+# File hashing shared by the result cache and snapshots
+
+import hashlib
+
+
+def file_digest(file_path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's contents, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
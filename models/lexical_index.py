@@ -0,0 +1,166 @@
+# In-process BM25 inverted index over chunk text and code/dataset identifiers
+
+import re
+import math
+import heapq
+import threading
+from collections import Counter
+from typing import Callable, Dict, Hashable, Iterable, List, Set, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+# Question words that would otherwise match every chunk
+STOPWORDS = frozenset("""
+a an and are as at be by can do does did for from has have how i in is it its
+me of on or show tell that the their there these this to use used uses using
+was what when where which who why with
+""".split())
+
+# Chunk metadata holding function, column and import names (comma separated)
+IDENTIFIER_FIELDS = ("function_name", "columns", "imports")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; snake_case identifiers also yield their parts,
+    so `analyze_bmi_vitamin_correlation` matches both itself and 'bmi'"""
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if "_" in token:
+            terms.extend(part for part in token.split("_") if part and part not in STOPWORDS)
+    return terms
+
+
+def identifier_names(metadata: Dict) -> List[str]:
+    names = []
+    for key in IDENTIFIER_FIELDS:
+        if metadata.get(key):
+            names.extend(str(metadata[key]).split(", "))
+    return names
+
+
+def _whole_words(text: str) -> Set[str]:
+    return {token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS}
+
+
+def reciprocal_rank_fusion(rankings: List[List], key: Callable[[object], Hashable], k: int = 60) -> List:
+    """Merge ranked lists by summing 1 / (k + rank) per item; an item's first
+    occurrence is kept"""
+    scores: Dict[Hashable, float] = {}
+    items: Dict[Hashable, object] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            item_key = key(item)
+            scores[item_key] = scores.get(item_key, 0.0) + 1.0 / (k + rank)
+            items.setdefault(item_key, item)
+    return [items[item_key] for item_key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class BM25Index:
+    """Okapi BM25 over chunks, keyed by chunk ID
+
+    A chunk's identifier terms (function, column and import names from its
+    metadata) count identifier_weight times as much as words in its text.
+    Only term counts are kept; callers fetch documents from the vector store.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, identifier_weight: float = 3.0):
+        self.k1 = k1
+        self.b = b
+        self.identifier_weight = identifier_weight
+        # chunk_id -> (weighted term frequencies, whole identifier words, length)
+        self._chunks: Dict[str, Tuple[Dict[str, float], Set[str], float]] = {}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._named: Dict[str, Set[str]] = {}  # whole identifier word -> chunk IDs
+        self._total_length = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def add(self, chunk_ids: Iterable[str], texts: Iterable[str], metadatas: Iterable[Dict]):
+        """Index chunks, replacing any already indexed under the same ID"""
+        with self._lock:
+            for chunk_id, text, metadata in zip(chunk_ids, texts, metadatas):
+                if chunk_id in self._chunks:
+                    self._remove(chunk_id)
+                names = identifier_names(metadata)
+                frequencies: Dict[str, float] = Counter(tokenize(text))
+                for term in tokenize(" ".join(names)):
+                    frequencies[term] += self.identifier_weight
+                words = _whole_words(" ".join(names))
+                length = float(sum(frequencies.values()))
+                self._chunks[chunk_id] = (dict(frequencies), words, length)
+                for term, frequency in frequencies.items():
+                    self._postings.setdefault(term, {})[chunk_id] = frequency
+                for word in words:
+                    self._named.setdefault(word, set()).add(chunk_id)
+                self._total_length += length
+
+    def remove(self, chunk_ids: Iterable[str]):
+        with self._lock:
+            for chunk_id in chunk_ids:
+                if chunk_id in self._chunks:
+                    self._remove(chunk_id)
+
+    def _remove(self, chunk_id: str):
+        frequencies, words, length = self._chunks.pop(chunk_id)
+        for term in frequencies:
+            postings = self._postings[term]
+            del postings[chunk_id]
+            if not postings:
+                del self._postings[term]
+        for word in words:
+            self._named[word].discard(chunk_id)
+            if not self._named[word]:
+                del self._named[word]
+        self._total_length -= length
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Top k (chunk_id, score) for query, best first"""
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or not self._chunks:
+                return []
+            num_chunks = len(self._chunks)
+            average_length = self._total_length / num_chunks
+            idf = {}
+            for term in terms:
+                df = len(self._postings.get(term, ()))
+                if df:
+                    idf[term] = math.log(1 + (num_chunks - df + 0.5) / (df + 0.5))
+
+            # Rarest terms first; once the terms left could not lift an unseen
+            # chunk into the top k, only chunks already seen are scored
+            scores: Dict[str, float] = {}
+            remaining = sum(idf.values()) * (self.k1 + 1)
+            for term in sorted(idf, key=idf.get, reverse=True):
+                if len(scores) >= k and remaining < heapq.nlargest(k, scores.values())[-1]:
+                    candidates = [(chunk_id, self._chunks[chunk_id][0].get(term)) for chunk_id in scores]
+                else:
+                    candidates = self._postings[term].items()
+                for chunk_id, frequency in candidates:
+                    if frequency:
+                        scores[chunk_id] = scores.get(chunk_id, 0.0) + self._term_score(
+                            idf[term], frequency, self._chunks[chunk_id][2], average_length
+                        )
+                remaining -= idf[term] * (self.k1 + 1)
+
+            return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def uniquely_named(self, query: str) -> Set[str]:
+        """Chunks that are the only one carrying a function, column or import
+        name the query spells out in full"""
+        unique = set()
+        with self._lock:
+            for word in _whole_words(query):
+                chunk_ids = self._named.get(word, ())
+                if len(chunk_ids) == 1:
+                    unique.update(chunk_ids)
+        return unique
+
+    def _term_score(self, idf: float, frequency: float, length: float, average_length: float) -> float:
+        norm = self.k1 * (1 - self.b + self.b * length / average_length)
+        return idf * frequency * (self.k1 + 1) / (frequency + norm)
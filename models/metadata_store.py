@@ -0,0 +1,692 @@
+import re
+import json
+import zlib
+import hashlib
+import queue
+import base64
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class ConnectionPool:
+    """Thread-safe pool of SQLite connections to one database file
+
+    Connections are opened lazily up to max_size and handed to one thread at
+    a time, so they can be shared across threads without check_same_thread.
+    """
+
+    def __init__(self, db_path: str, max_size: int = 4, timeout: float = 30):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Safe with WAL: a crash can lose the last commits but never corrupts
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection; commits on success, rolls back on error"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.max_size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                conn = self._idle.get(timeout=self.timeout)
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+def pack(value: Any) -> bytes:
+    """Compact JSON, zlib-compressed"""
+    return zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'), 6)
+
+
+def unpack(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+class MetadataStore:
+    """Study metadata in SQLite: pooled connections, WAL, indexed listings
+
+    Listings are ordered newest first and paginated with an opaque keyset
+    cursor over (uploaded_at, study_id), so every page costs an index seek
+    instead of an OFFSET scan, however deep the page.
+
+    The studies table holds only the small header fields. Dataset summaries
+    are stored one row per column (study_columns) and every other summary
+    field as its own compressed blob (study_fields), so callers can fetch
+    just the fields they need and listings never touch the heavy payloads.
+
+    Titles, descriptions and the function, import and column names kept in
+    study_symbols are full-text indexed by an FTS5 table (study_search) that
+    triggers keep in sync, so search() ranks studies without loading them.
+    Its owner column holds the hex-encoded user_id as a single token, so a
+    per-user search is a doclist intersection rather than a join.
+
+    MinHash signatures of each study's dataset rows and code tokens are
+    banded into locality-sensitive hash buckets (study_lsh), so similar()
+    finds near-duplicates by bucket lookups instead of a corpus scan.
+
+    A study may also have a precomputed digest (study_digests), a compact
+    summary that answers stock questions with a single key lookup.
+    """
+
+    LIST_FIELDS = ['study_id', 'title', 'description', 'uploaded_at']
+    HEADER_FIELDS = LIST_FIELDS + ['file_paths', 'user_id']
+    # Parts of csv_summary reconstructed from the per-column rows
+    COLUMN_FIELDS = ['columns', 'column_types', 'numeric_stats', 'categorical_stats', 'missing_values']
+    SUMMARY_FIELDS = ['csv_summary', 'python_analysis']
+    # bm25() weight of each searchable study_search column, in table order
+    SEARCH_WEIGHTS = {'title': 10.0, 'description': 2.0, 'functions': 5.0, 'imports': 2.0, 'columns': 3.0}
+    # Summary field holding each kind of MinHash signature
+    MINHASH_FIELDS = {'dataset': 'csv_summary.row_minhash', 'code': 'python_analysis.code_minhash'}
+    # 32 bands of 4 slots (of 128): a pair at Jaccard 0.5 shares a bucket
+    # with probability ~0.87, at 0.8 ~1.0 and at 0.2 ~0.05
+    LSH_BANDS = 32
+
+    def __init__(self, db_path: str, pool_size: int = 4):
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path, max_size=pool_size)
+
+        with self.pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS studies (
+                    study_id TEXT PRIMARY KEY,
+                    title TEXT,
+                    description TEXT,
+                    uploaded_at TEXT,
+                    file_paths TEXT,
+                    user_id TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS study_columns (
+                    study_id TEXT,
+                    position INTEGER,
+                    name TEXT,
+                    dtype TEXT,
+                    missing INTEGER,
+                    kind TEXT,
+                    stats BLOB,
+                    PRIMARY KEY (study_id, position)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS study_fields (
+                    study_id TEXT,
+                    field TEXT,
+                    data BLOB,
+                    PRIMARY KEY (study_id, field)
+                ) WITHOUT ROWID
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_studies_uploaded ON studies (uploaded_at, study_id)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_studies_user ON studies (user_id, uploaded_at, study_id)"
+            )
+            # Plain-text symbol lists for full-text search; the integer
+            # rowid keys study_search and survives REPLACE and VACUUM
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS study_symbols (
+                    rowid INTEGER PRIMARY KEY,
+                    study_id TEXT UNIQUE,
+                    functions TEXT,
+                    imports TEXT,
+                    columns TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS study_lsh (
+                    kind TEXT,
+                    band INTEGER,
+                    bucket INTEGER,
+                    study_id TEXT,
+                    PRIMARY KEY (kind, band, bucket, study_id)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_lsh_study ON study_lsh (study_id)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS study_digests (
+                    study_id TEXT PRIMARY KEY,
+                    data BLOB
+                )
+            """)
+            # The search triggers must exist before migrating, so migrated
+            # studies are indexed as their symbols are written
+            self.full_text_search = self._create_search_index(conn)
+            self._migrate_json_blobs(conn)
+            if self.full_text_search:
+                self._backfill_search(conn)
+
+    def _create_search_index(self, conn: sqlite3.Connection) -> bool:
+        """Create study_search and its sync triggers; False if SQLite lacks FTS5"""
+        try:
+            conn.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS study_search
+                USING fts5({', '.join(self.SEARCH_WEIGHTS)}, owner)
+            """)
+        except sqlite3.OperationalError:
+            return False
+
+        set_header = """
+            UPDATE study_search SET title = new.title, description = new.description, owner = lower(hex(new.user_id))
+            WHERE rowid = (SELECT rowid FROM study_symbols WHERE study_id = new.study_id);
+        """
+        set_symbols = """
+            UPDATE study_search SET functions = new.functions, imports = new.imports, columns = new.columns
+            WHERE rowid = new.rowid;
+        """
+        triggers = {
+            "study_symbols_search_insert": ("AFTER INSERT ON study_symbols", """
+                INSERT INTO study_search (rowid, title, description, functions, imports, columns, owner)
+                SELECT new.rowid, s.title, s.description, new.functions, new.imports, new.columns,
+                       lower(hex(s.user_id))
+                FROM (SELECT 1) LEFT JOIN studies s ON s.study_id = new.study_id;
+            """),
+            "study_symbols_search_update": ("AFTER UPDATE ON study_symbols", set_symbols),
+            "study_symbols_search_delete": ("AFTER DELETE ON study_symbols", """
+                DELETE FROM study_search WHERE rowid = old.rowid;
+            """),
+            "studies_search_insert": ("AFTER INSERT ON studies", set_header),
+            "studies_search_update": ("AFTER UPDATE OF title, description, user_id ON studies", set_header),
+        }
+        for name, (event, body) in triggers.items():
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+        return True
+
+    def _backfill_search(self, conn: sqlite3.Connection):
+        """Index studies stored before study_search existed, and symbol rows
+        that never got a search row (migrations used to run before the
+        triggers existed)"""
+        self._backfill_symbols(conn)
+        # Row counts of the two tables are cheap; the anti-join only runs on a mismatch
+        symbols, searchable = conn.execute(
+            "SELECT (SELECT count(*) FROM study_symbols), (SELECT count(*) FROM study_search_docsize)"
+        ).fetchone()
+        if symbols != searchable:
+            conn.execute("""
+                INSERT INTO study_search (rowid, title, description, functions, imports, columns, owner)
+                SELECT y.rowid, s.title, s.description, y.functions, y.imports, y.columns, lower(hex(s.user_id))
+                FROM study_symbols y LEFT JOIN studies s ON s.study_id = y.study_id
+                WHERE y.rowid NOT IN (SELECT rowid FROM study_search)
+            """)
+
+    def _backfill_symbols(self, conn: sqlite3.Connection, batch_size: int = 500):
+        """Fill study_symbols (and so study_search) for studies stored before it existed"""
+        studies, symbols = conn.execute(
+            "SELECT (SELECT count(*) FROM studies), (SELECT count(*) FROM study_symbols)"
+        ).fetchone()
+        if studies == symbols:
+            return
+        while True:
+            study_ids = [row[0] for row in conn.execute("""
+                SELECT study_id FROM studies
+                WHERE study_id NOT IN (SELECT study_id FROM study_symbols) LIMIT ?
+            """, (batch_size,))]
+            if not study_ids:
+                break
+            for study_id in study_ids:
+                python_analysis = self._read_summary(conn, study_id, 'python_analysis', {'functions', 'imports'})
+                self._write_symbols(
+                    conn, study_id,
+                    python_analysis.get('functions', []),
+                    python_analysis.get('imports', []),
+                    self._read_columns(conn, study_id, {'columns'})['columns']
+                )
+
+    def _migrate_json_blobs(self, conn: sqlite3.Connection, batch_size: int = 500):
+        """Move summaries out of the old csv_summary/python_analysis JSON columns"""
+        legacy = {row[1] for row in conn.execute("PRAGMA table_info(studies)")}
+        if 'csv_summary' not in legacy:
+            return
+        while True:
+            rows = conn.execute("""
+                SELECT study_id, csv_summary, python_analysis FROM studies
+                WHERE csv_summary IS NOT NULL LIMIT ?
+            """, (batch_size,)).fetchall()
+            if not rows:
+                break
+            for study_id, csv_summary, python_analysis in rows:
+                self._write_summaries(conn, study_id, json.loads(csv_summary), json.loads(python_analysis))
+            conn.executemany(
+                "UPDATE studies SET csv_summary = NULL, python_analysis = NULL WHERE study_id = ?",
+                [(row[0],) for row in rows]
+            )
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            conn.execute("ALTER TABLE studies DROP COLUMN csv_summary")
+            conn.execute("ALTER TABLE studies DROP COLUMN python_analysis")
+
+    def _write_summaries(self, conn: sqlite3.Connection, study_id: str, csv_summary: Dict, python_analysis: Dict):
+        conn.execute("DELETE FROM study_columns WHERE study_id = ?", (study_id,))
+        conn.execute("DELETE FROM study_fields WHERE study_id = ?", (study_id,))
+
+        numeric_stats = csv_summary['numeric_stats']
+        categorical_stats = csv_summary['categorical_stats']
+        column_rows = []
+        for position, name in enumerate(csv_summary['columns']):
+            if name in numeric_stats:
+                kind, stats = 'numeric', pack(numeric_stats[name])
+            elif name in categorical_stats:
+                kind, stats = 'categorical', pack(categorical_stats[name])
+            else:
+                kind, stats = None, None
+            column_rows.append((
+                study_id, position, name, csv_summary['column_types'].get(name),
+                csv_summary['missing_values'].get(name, 0), kind, stats
+            ))
+        conn.executemany("INSERT INTO study_columns VALUES (?, ?, ?, ?, ?, ?, ?)", column_rows)
+
+        field_rows = [
+            (study_id, f"csv_summary.{key}", pack(value))
+            for key, value in csv_summary.items() if key not in self.COLUMN_FIELDS
+        ]
+        field_rows.extend(
+            (study_id, f"python_analysis.{key}", pack(value))
+            for key, value in python_analysis.items()
+        )
+        conn.executemany("INSERT INTO study_fields VALUES (?, ?, ?)", field_rows)
+        self._write_symbols(
+            conn, study_id, python_analysis['functions'], python_analysis['imports'], csv_summary['columns']
+        )
+        self._write_lsh(conn, study_id, {
+            'dataset': csv_summary.get('row_minhash'),
+            'code': python_analysis.get('code_minhash')
+        })
+
+    @staticmethod
+    def _write_symbols(conn: sqlite3.Connection,
+                       study_id: str,
+                       functions: List[Dict],
+                       imports: List[str],
+                       columns: List[str]):
+        # An upsert keeps the row's rowid, so the study keeps its study_search row
+        conn.execute("""
+            INSERT INTO study_symbols (study_id, functions, imports, columns) VALUES (?, ?, ?, ?)
+            ON CONFLICT (study_id) DO UPDATE SET
+                functions = excluded.functions, imports = excluded.imports, columns = excluded.columns
+        """, (
+            study_id,
+            ", ".join(function['name'] for function in functions),
+            ", ".join(name for name in imports if name),
+            ", ".join(str(name) for name in columns)
+        ))
+
+    @classmethod
+    def _lsh_buckets(cls, signature: List[int]) -> List[Tuple[int, int]]:
+        """(band, bucket) per band of a signature; the bucket is a 64-bit hash of the band's slots"""
+        rows = len(signature) // cls.LSH_BANDS
+        buckets = []
+        for band in range(cls.LSH_BANDS):
+            values = ",".join(map(str, signature[band * rows:(band + 1) * rows]))
+            digest = hashlib.blake2b(values.encode(), digest_size=8).digest()
+            buckets.append((band, int.from_bytes(digest, 'big', signed=True)))
+        return buckets
+
+    @classmethod
+    def _write_lsh(cls, conn: sqlite3.Connection, study_id: str, signatures: Dict[str, Optional[List[int]]]):
+        conn.execute("DELETE FROM study_lsh WHERE study_id = ?", (study_id,))
+        conn.executemany("INSERT INTO study_lsh VALUES (?, ?, ?, ?)", [
+            (kind, band, bucket, study_id)
+            for kind, signature in signatures.items() if signature
+            for band, bucket in cls._lsh_buckets(signature)
+        ])
+
+    def put_many(self, records: List[Dict]):
+        """Insert or replace many study records in one transaction
+
+        A record's optional 'digest' replaces the study's digest; without
+        one, any earlier digest is removed, as it would describe old files.
+        """
+        with self.pool.connection() as conn:
+            conn.executemany(f"""
+                INSERT OR REPLACE INTO studies ({', '.join(self.HEADER_FIELDS)})
+                VALUES ({', '.join('?' * len(self.HEADER_FIELDS))})
+            """, [
+                tuple(
+                    json.dumps(record[name]) if name == 'file_paths' else record[name]
+                    for name in self.HEADER_FIELDS
+                )
+                for record in records
+            ])
+            for record in records:
+                self._write_summaries(conn, record['study_id'], record['csv_summary'], record['python_analysis'])
+            conn.executemany("DELETE FROM study_digests WHERE study_id = ?", [
+                (record['study_id'],) for record in records if record.get('digest') is None
+            ])
+            conn.executemany("INSERT OR REPLACE INTO study_digests VALUES (?, ?)", [
+                (record['study_id'], pack(record['digest'])) for record in records if record.get('digest') is not None
+            ])
+
+    def get(self, study_id: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict]:
+        """One study, or None
+
+        fields selects what to load: header fields ('title'), whole summaries
+        ('csv_summary') or single summary fields ('csv_summary.columns',
+        'python_analysis.functions'). Everything is loaded by default.
+        """
+        fields = list(fields) if fields is not None else self.HEADER_FIELDS + self.SUMMARY_FIELDS
+        header = [name for name in fields if name in self.HEADER_FIELDS]
+        summary_parts = {}  # summary -> None (all of it) or a set of its fields
+        for name in fields:
+            if name in self.HEADER_FIELDS:
+                continue
+            summary, _, part = name.partition('.')
+            if summary not in self.SUMMARY_FIELDS:
+                raise ValueError(f"Unknown field: {name}")
+            if not part:
+                summary_parts[summary] = None
+            elif summary_parts.get(summary, set()) is not None:
+                summary_parts.setdefault(summary, set()).add(part)
+
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(['study_id'] + header)} FROM studies WHERE study_id = ?",
+                (study_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            record = dict(zip(['study_id'] + header, row))
+            if 'file_paths' in record:
+                record['file_paths'] = json.loads(record['file_paths'])
+
+            for summary, parts in summary_parts.items():
+                record[summary] = self._read_summary(conn, study_id, summary, parts)
+        return record
+
+    def _read_summary(self, conn: sqlite3.Connection, study_id: str, summary: str, parts: Optional[set]) -> Dict:
+        """Decode the requested parts of one summary (all of them if parts is None)"""
+        if parts is None:
+            rows = conn.execute(
+                "SELECT field, data FROM study_fields WHERE study_id = ? AND field LIKE ?",
+                (study_id, f"{summary}.%")
+            ).fetchall()
+        elif parts - set(self.COLUMN_FIELDS):
+            wanted = [f"{summary}.{part}" for part in parts - set(self.COLUMN_FIELDS)]
+            rows = conn.execute(
+                f"SELECT field, data FROM study_fields WHERE study_id = ? AND field IN ({', '.join('?' * len(wanted))})",
+                [study_id] + wanted
+            ).fetchall()
+        else:
+            rows = []
+        result = {field.split('.', 1)[1]: unpack(data) for field, data in rows}
+
+        if summary == 'csv_summary':
+            column_parts = set(self.COLUMN_FIELDS) if parts is None else parts & set(self.COLUMN_FIELDS)
+            if column_parts:
+                result.update(self._read_columns(conn, study_id, column_parts))
+        return result
+
+    def _read_columns(self, conn: sqlite3.Connection, study_id: str, parts: set) -> Dict:
+        """Reassemble csv_summary's per-column fields, decoding stats only when asked"""
+        with_stats = bool(parts & {'numeric_stats', 'categorical_stats'})
+        rows = conn.execute(f"""
+            SELECT name, dtype, missing, kind, {'stats' if with_stats else 'NULL'}
+            FROM study_columns WHERE study_id = ? ORDER BY position
+        """, (study_id,)).fetchall()
+
+        result = {}
+        if 'columns' in parts:
+            result['columns'] = [name for name, *_ in rows]
+        if 'column_types' in parts:
+            result['column_types'] = {name: dtype for name, dtype, *_ in rows}
+        if 'missing_values' in parts:
+            result['missing_values'] = {name: missing for name, _, missing, *_ in rows if missing > 0}
+        for kind in ['numeric', 'categorical']:
+            if f"{kind}_stats" in parts:
+                result[f"{kind}_stats"] = {
+                    name: unpack(stats) for name, _, _, row_kind, stats in rows if row_kind == kind
+                }
+        return result
+
+    def delete(self, study_id: str) -> bool:
+        """Remove a study; True if it existed"""
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM study_columns WHERE study_id = ?", (study_id,))
+            conn.execute("DELETE FROM study_fields WHERE study_id = ?", (study_id,))
+            conn.execute("DELETE FROM study_symbols WHERE study_id = ?", (study_id,))
+            conn.execute("DELETE FROM study_lsh WHERE study_id = ?", (study_id,))
+            conn.execute("DELETE FROM study_digests WHERE study_id = ?", (study_id,))
+            return conn.execute("DELETE FROM studies WHERE study_id = ?", (study_id,)).rowcount > 0
+
+    def count(self, user_id: Optional[str] = None) -> int:
+        with self.pool.connection() as conn:
+            if user_id:
+                row = conn.execute("SELECT COUNT(*) FROM studies WHERE user_id = ?", (user_id,)).fetchone()
+            else:
+                row = conn.execute("SELECT COUNT(*) FROM studies").fetchone()
+        return row[0]
+
+    @staticmethod
+    def _encode_cursor(sort_key: Any, tie_breaker: Any) -> str:
+        payload = json.dumps([sort_key, tie_breaker]).encode('utf-8')
+        return base64.urlsafe_b64encode(payload).decode('ascii')
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[Any, Any]:
+        try:
+            sort_key, tie_breaker = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except (ValueError, TypeError):
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+        return sort_key, tie_breaker
+
+    def list_page(self,
+                  user_id: Optional[str] = None,
+                  limit: int = 50,
+                  cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """One page of study listings and the cursor of the next page (None at the end)"""
+        clauses, params = [], []
+        if user_id:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        if cursor:
+            clauses.append("(uploaded_at, study_id) < (?, ?)")
+            params.extend(self._decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT {', '.join(self.LIST_FIELDS)} FROM studies {where}
+                ORDER BY uploaded_at DESC, study_id DESC
+                LIMIT ?
+            """, params + [limit + 1]).fetchall()
+
+        # One extra row tells whether another page follows
+        studies = [dict(zip(self.LIST_FIELDS, row)) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = studies[-1]
+            next_cursor = self._encode_cursor(last['uploaded_at'], last['study_id'])
+        return studies, next_cursor
+
+    def iter_studies(self, user_id: Optional[str] = None, batch_size: int = 1000) -> Iterator[Dict]:
+        """Stream study listings page by page, holding no connection between pages"""
+        cursor = None
+        while True:
+            studies, cursor = self.list_page(user_id=user_id, limit=batch_size, cursor=cursor)
+            yield from studies
+            if cursor is None:
+                return
+
+    @classmethod
+    def _match_expression(cls, query: str, user_id: Optional[str] = None) -> Optional[str]:
+        """FTS5 query requiring every word of free text in the searchable
+        columns; FTS5 syntax in the text is not interpreted, so user input
+        can't produce a query error"""
+        words = re.findall(r"\w+", query)
+        if not words:
+            return None
+        phrases = ' '.join('"' + word + '"' for word in words)
+        expression = f"{{{' '.join(cls.SEARCH_WEIGHTS)}}} : ({phrases})"
+        if user_id:
+            expression += f' AND owner : "{user_id.encode("utf-8").hex()}"'
+        return expression
+
+    def search(self,
+               query: str,
+               user_id: Optional[str] = None,
+               limit: int = 20,
+               cursor: Optional[str] = None,
+               highlight: Tuple[str, str] = ('[', ']')) -> Tuple[List[Dict], Optional[str]]:
+        """Studies matching every word of query, best first, and the next page's cursor
+
+        Results carry the listing fields plus a relevance score (higher is
+        better) and a snippet of the best-matching text with matches wrapped
+        in highlight. Pages use a keyset cursor over (bm25 rank, rowid).
+        """
+        if not self.full_text_search:
+            raise RuntimeError("Full-text search needs SQLite with FTS5")
+        match = self._match_expression(query, user_id)
+        if match is None:
+            return [], None
+
+        rank = f"bm25(study_search, {', '.join(str(weight) for weight in self.SEARCH_WEIGHTS.values())}, 0.0)"
+        clauses, params = ["study_search MATCH ?"], [match]
+        if cursor:
+            clauses.append(f"({rank} > ? OR ({rank} = ? AND rowid > ?))")
+            last_rank, last_doc = self._decode_cursor(cursor)
+            params.extend([last_rank, last_rank, last_doc])
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT rowid, {rank} AS score FROM study_search
+                WHERE {' AND '.join(clauses)}
+                ORDER BY score, rowid
+                LIMIT ?
+            """, params + [limit + 1]).fetchall()
+            page = rows[:limit]
+            # Snippets and listing fields only for the page
+            details = {}
+            if page:
+                details = {row[0]: row[1:] for row in conn.execute(f"""
+                    SELECT study_search.rowid, {', '.join(f's.{name}' for name in self.LIST_FIELDS)},
+                           snippet(study_search, -1, ?, ?, '...', 12)
+                    FROM study_search
+                    JOIN study_symbols sy ON sy.rowid = study_search.rowid
+                    JOIN studies s ON s.study_id = sy.study_id
+                    WHERE study_search MATCH ? AND study_search.rowid IN ({', '.join('?' * len(page))})
+                """, [highlight[0], highlight[1], match] + [doc for doc, _ in page])}
+
+        studies = []
+        for doc, score in page:
+            if doc in details:
+                *fields, snippet = details[doc]
+                studies.append(dict(zip(self.LIST_FIELDS, fields), score=-score, snippet=snippet))
+        next_cursor = None
+        if len(rows) > limit:
+            last_doc, last_rank = page[-1]
+            next_cursor = self._encode_cursor(last_rank, last_doc)
+        return studies, next_cursor
+
+    def get_digest(self, study_id: str) -> Optional[Dict]:
+        """A study's precomputed digest, or None"""
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT data FROM study_digests WHERE study_id = ?", (study_id,)).fetchone()
+        return unpack(row[0]) if row else None
+
+    def _read_signatures(self, conn: sqlite3.Connection, study_ids: Iterable[str]) -> Dict[str, Dict[str, List[int]]]:
+        """study_id -> {kind: MinHash signature} for the studies that have one"""
+        kinds = {field: kind for kind, field in self.MINHASH_FIELDS.items()}
+        study_ids = list(study_ids)
+        signatures: Dict[str, Dict[str, List[int]]] = {}
+        for start in range(0, len(study_ids), 500):
+            batch = study_ids[start:start + 500]
+            rows = conn.execute(f"""
+                SELECT study_id, field, data FROM study_fields
+                WHERE study_id IN ({', '.join('?' * len(batch))}) AND field IN ({', '.join('?' * len(kinds))})
+            """, batch + list(kinds))
+            for study_id, field, data in rows:
+                signature = unpack(data)
+                if signature:
+                    signatures.setdefault(study_id, {})[kinds[field]] = signature
+        return signatures
+
+    def similar(self, study_id: str, threshold: float = 0.5, limit: int = 10) -> List[Dict]:
+        """Near-duplicates of a study by MinHash-LSH, most similar first
+
+        Candidates are the studies sharing at least one band bucket with the
+        study's dataset or code signature; each is scored by the fraction of
+        equal signature slots, an estimate of Jaccard similarity, and kept if
+        either score reaches threshold. A score is None when either study
+        lacks that signature (e.g. stored before signatures were computed).
+        """
+        with self.pool.connection() as conn:
+            signatures = self._read_signatures(conn, [study_id]).get(study_id, {})
+            candidates = set()
+            for kind, signature in signatures.items():
+                for band, bucket in self._lsh_buckets(signature):
+                    candidates.update(row[0] for row in conn.execute(
+                        "SELECT study_id FROM study_lsh WHERE kind = ? AND band = ? AND bucket = ?",
+                        (kind, band, bucket)
+                    ))
+            candidates.discard(study_id)
+
+            scored = []
+            for candidate, theirs in self._read_signatures(conn, candidates).items():
+                scores = {
+                    kind: sum(a == b for a, b in zip(signature, theirs[kind])) / len(signature)
+                    if kind in theirs and len(theirs[kind]) == len(signature) else None
+                    for kind, signature in signatures.items()
+                }
+                known = [score for score in scores.values() if score is not None]
+                if known and max(known) >= threshold:
+                    scored.append(((max(known), sum(known)), candidate, scores))
+            scored.sort(key=lambda item: (-item[0][0], -item[0][1], item[1]))
+            scored = scored[:limit]
+
+            titles = dict(conn.execute(
+                f"SELECT study_id, title FROM studies WHERE study_id IN ({', '.join('?' * len(scored))})",
+                [candidate for _, candidate, _ in scored]
+            )) if scored else {}
+        return [
+            {
+                'study_id': candidate,
+                'title': titles.get(candidate),
+                'dataset_similarity': scores.get('dataset'),
+                'code_similarity': scores.get('code')
+            }
+            for _, candidate, scores in scored
+        ]
+
+    def backup_to(self, path: str):
+        """Consistent copy of the database (SQLite online backup), safe while in use"""
+        with self.pool.connection() as conn:
+            target = sqlite3.connect(path)
+            conn.backup(target)
+            target.close()
+
+    def close(self):
+        self.pool.close()
@@ -1,86 +1,157 @@
-# Medical RAG System with LLM Integration - Google Colab Setup
+# Medical RAG System with LLM Integration
 # This system stores code/dataset info in vector DB and uses LLM to explain based on queries
+#
+# Importing this module has no side effects. LangChain, Chroma, sentence
+# transformers and Gemini are imported on first use, so services and tests
+# can import it cheaply. See rag_demo.py for the end-to-end demo.
 
-# ==================== CELL 1: Setup and Installation ====================
+from __future__ import annotations
 
-
-# Mount Google Drive
-
-# Create directory structure in Google Drive
-import os
-os.makedirs('/content/drive/MyDrive/medical_rag_system', exist_ok=True)
-os.makedirs('/content/drive/MyDrive/medical_rag_system/models', exist_ok=True)
-os.makedirs('/content/drive/MyDrive/medical_rag_system/data', exist_ok=True)
-
-# ==================== CELL 2: LLM Integration Classes ====================
 import os
+import re
 import ast
+import copy
 import json
 import uuid
+import time
+import asyncio
+import hashlib
+import threading
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Optional, Tuple, Any, Union
-from dataclasses import dataclass, asdict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Any, Union, Iterator
+from dataclasses import dataclass, asdict, field
 from datetime import datetime
-import sqlite3
 from pathlib import Path
 import pickle
-import joblib
+import shutil
 from abc import ABC, abstractmethod
+from sketches import ColumnProfile, MinHash, profile_shared_columns, row_hashes
+from metadata_store import MetadataStore
+from query_cache import TTLCache, SemanticAnswerCache
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from study_digest import DIGEST_VERSION, build_digest, classify_intent, render_answer
+from context_packing import estimate_tokens, merge_adjacent, drop_near_duplicates, pack_context
+from snapshot import SnapshotError, copy_out, write_manifest, read_manifest, publish
+from code_analysis import CodeAnalyzer, KeywordAutomaton, code_shingles, extract_comments, normalize_keyword
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
 
-# Vector database and embeddings
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-
-# LLM integration
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
-from langchain.vectorstores import Chroma
-from langchain.embeddings import SentenceTransformerEmbeddings
+# LangChain (and with it Chroma, sentence transformers and torch) is imported
+# inside the methods that need it; annotations naming Document stay strings.
+if TYPE_CHECKING:
+    from langchain.schema import Document
 
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except:
-    GEMINI_AVAILABLE = False
 
-try:
-    from transformers import pipeline
-    HF_AVAILABLE = True
-except:
-    HF_AVAILABLE = False
+def _import_genai():
+    """google.generativeai, imported on first use by GeminiLLM"""
+    try:
+        import google.generativeai as genai
+    except ImportError:
+        raise ImportError("Google Generative AI package not installed")
+    return genai
 
 class BaseLLM(ABC):
-    """Base class for LLM integrations"""
+    """Base class for LLM integrations
+    
+    Subclasses must implement generate_response; the streaming and async
+    variants fall back to it unless overridden with native support.
+    """
     
     @abstractmethod
     def generate_response(self, prompt: str, max_tokens: int = 500) -> str:
         pass
     
+    def generate_stream(self, prompt: str, max_tokens: int = 500) -> Iterator[str]:
+        """Yield the response in pieces as they are generated; failures raise"""
+        yield self.generate_response(prompt, max_tokens)
+    
+    async def agenerate_response(self, prompt: str, max_tokens: int = 500) -> str:
+        """Async variant; by default runs generate_response in a worker thread"""
+        return await asyncio.to_thread(self.generate_response, prompt, max_tokens)
+    
 class GeminiLLM(BaseLLM):
     """Google Gemini integration"""
     
     def __init__(self, api_key: str, model: str = "gemini-pro"):
-        if not GEMINI_AVAILABLE:
-            raise ImportError("Google Generative AI package not installed")
+        self.genai = _import_genai()
         
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model)
+        self.genai.configure(api_key=api_key)
+        self.model = self.genai.GenerativeModel(model)
+    
+    def _generation_config(self, max_tokens: int):
+        return self.genai.types.GenerationConfig(
+            max_output_tokens=max_tokens,
+            temperature=0.7
+        )
     
     def generate_response(self, prompt: str, max_tokens: int = 500) -> str:
         try:
             response = self.model.generate_content(
                 prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=max_tokens,
-                    temperature=0.7
-                )
+                generation_config=self._generation_config(max_tokens)
+            )
+            return response.text.strip()
+        except Exception as e:
+            return f"Error generating response: {str(e)}"
+    
+    def generate_stream(self, prompt: str, max_tokens: int = 500) -> Iterator[str]:
+        # Failures are raised, not yielded: text already sent would make an
+        # error message indistinguishable from the end of a real answer
+        response = self.model.generate_content(
+            prompt,
+            generation_config=self._generation_config(max_tokens),
+            stream=True
+        )
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+    
+    async def agenerate_response(self, prompt: str, max_tokens: int = 500) -> str:
+        try:
+            response = await self.model.generate_content_async(
+                prompt,
+                generation_config=self._generation_config(max_tokens)
             )
             return response.text.strip()
         except Exception as e:
             return f"Error generating response: {str(e)}"
 
+class StubLLM(BaseLLM):
+    """Deterministic local LLM for tests and benchmarks
+    
+    The answer depends only on the prompt; optional delays simulate the
+    latency before the first token and between tokens of a real model.
+    """
+    
+    def __init__(self, answer_tokens: int = 50, first_token_delay: float = 0.0, token_delay: float = 0.0):
+        self.answer_tokens = answer_tokens
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+    
+    def _tokens(self, prompt: str, max_tokens: int) -> List[str]:
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        question = re.search(r"User Question: (.*)", prompt)
+        words = ["Stub", "answer", f"{digest[:8]}:"] + (question.group(1).split() if question else [])
+        words += [f"token{i}" for i in range(self.answer_tokens - len(words))]
+        return [word + " " for word in words[:min(self.answer_tokens, max_tokens)]]
+    
+    def generate_response(self, prompt: str, max_tokens: int = 500) -> str:
+        return "".join(self.generate_stream(prompt, max_tokens)).strip()
+    
+    def generate_stream(self, prompt: str, max_tokens: int = 500) -> Iterator[str]:
+        time.sleep(self.first_token_delay)
+        for i, token in enumerate(self._tokens(prompt, max_tokens)):
+            if i:
+                time.sleep(self.token_delay)
+            yield token
+    
+    async def agenerate_response(self, prompt: str, max_tokens: int = 500) -> str:
+        tokens = self._tokens(prompt, max_tokens)
+        await asyncio.sleep(self.first_token_delay + self.token_delay * max(len(tokens) - 1, 0))
+        return "".join(tokens).strip()
+
 @dataclass
 class StudyMetadata:
     """Core metadata for a research study"""
@@ -104,6 +175,7 @@ class CSVSummary:
     sample_rows: List[Dict]
     potential_identifiers: List[str]  # columns that might be patient IDs
     date_columns: List[str]
+    row_minhash: List[int] = field(default_factory=list)  # MinHash of the distinct rows
 
 @dataclass
 class PythonAnalysis:
@@ -116,11 +188,39 @@ class PythonAnalysis:
     data_operations: List[str]  # filtering, grouping, etc.
     visualizations: List[str]  # plot types detected
     variables: List[str]  # important variable names
+    call_sites: List[str] = field(default_factory=list)  # e.g. 'stats.pearsonr'
+    code_minhash: List[int] = field(default_factory=list)  # MinHash of normalized token shingles
 
 class MedicalDataProcessor:
     """Processes and extracts information from uploaded files"""
     
-    def __init__(self):
+    # Datasets at least this wide are profiled on a worker pool
+    PARALLEL_MIN_COLUMNS = 64
+    
+    # Rows read up front to infer column types
+    SCHEMA_SAMPLE_ROWS = 1000
+    
+    # Slots in the row and code MinHash signatures used for near-duplicate search
+    MINHASH_PERMUTATIONS = 128
+    
+    # Tokens per code shingle
+    CODE_SHINGLE_TOKENS = 5
+    
+    # Candidate date formats, tried in order on text columns
+    DATE_FORMATS = [
+        '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M',
+        '%Y/%m/%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%m-%d-%Y', '%d.%m.%Y',
+        '%d %b %Y', '%b %d %Y', '%d %B %Y', '%B %d %Y'
+    ]
+    
+    def __init__(self, profile_workers: int = 1):
+        # Worker processes for wide datasets; parallel profiling is opt-in
+        # (e.g. os.cpu_count()), the default profiles serially
+        self.profile_workers = max(profile_workers, 1)
+        
+        # Date format per column-name pattern, reused across ingests
+        self.date_format_cache: Dict[str, str] = {}
+        
         self.statistical_keywords = [
             't-test', 'chi-square', 'anova', 'regression', 'correlation',
             'mann-whitney', 'wilcoxon', 'fisher', 'pearson', 'spearman',
@@ -136,70 +236,254 @@ class MedicalDataProcessor:
             'plot', 'scatter', 'histogram', 'boxplot', 'barplot',
             'heatmap', 'violin', 'kde', 'distribution'
         ]
+        
+        # Library spellings that don't contain the keyword itself
+        self.keyword_aliases = {
+            'chi-square': ['chi2'],
+            'anova': ['f_oneway']
+        }
+        
+        self.keyword_automaton = self._build_keyword_automaton()
+    
+    def _build_keyword_automaton(self) -> KeywordAutomaton:
+        """One automaton for every keyword category, matched on identifiers"""
+        patterns: Dict[str, List[Tuple[str, str]]] = {}
+        for category, keywords in [('statistical', self.statistical_keywords),
+                                   ('data_operation', self.data_operation_keywords),
+                                   ('visualization', self.viz_keywords)]:
+            for keyword in keywords:
+                for spelling in [keyword] + self.keyword_aliases.get(keyword, []):
+                    patterns.setdefault(normalize_keyword(spelling), []).append((category, keyword))
+        return KeywordAutomaton(patterns)
     
-    def process_csv(self, file_path: str, sample_size: int = 5) -> CSVSummary:
-        """Extract comprehensive CSV metadata"""
-        df = pd.read_csv(file_path)
+    def process_csv(self, file_path: str, sample_size: int = 5, chunk_size: int = 100_000) -> CSVSummary:
+        """Extract comprehensive CSV metadata
         
-        # Basic info
+        Reads the file once in chunks, keeping mergeable per-column sketches
+        (exact moments, t-digest quantiles, HyperLogLog distinct counts and
+        heavy hitters), so memory is bounded by column count, not row count.
+        """
         filename = os.path.basename(file_path)
-        shape = df.shape
-        columns = df.columns.tolist()
-        column_types = df.dtypes.astype(str).to_dict()
+        schema = self.infer_schema(file_path)
+        
+        try:
+            columns, profiles, sample_rows, row_minhash = self._profile_chunks(
+                file_path, sample_size, chunk_size, schema['dtypes']
+            )
+        except ValueError:
+            # A sampled type did not hold further down the file; let pandas infer
+            columns, profiles, sample_rows, row_minhash = self._profile_chunks(
+                file_path, sample_size, chunk_size, None
+            )
+        
+        summary = self._summarize_profiles(
+            filename, columns, profiles, sample_rows, schema['date_columns']
+        )
+        summary.row_minhash = row_minhash.tolist()
+        return summary
+    
+    def infer_schema(self, file_path: str) -> Dict:
+        """Infer read dtypes and date columns from a sample in one vectorized pass
+        
+        Returns {'dtypes': column -> dtype for pd.read_csv, 'date_columns': [...]}.
+        Integer columns are left to the parser, since missing values further
+        down the file would not fit an int64.
+        """
+        sample = pd.read_csv(file_path, nrows=self.SCHEMA_SAMPLE_ROWS)
+        dtypes = {}
+        text_cols = []
+        for col in sample.columns:
+            dtype = sample[col].dtype
+            if pd.api.types.is_integer_dtype(dtype):
+                continue
+            dtypes[col] = dtype
+            if not (pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype)):
+                text_cols.append(col)
+        
+        return {
+            'dtypes': dtypes,
+            'date_columns': self._detect_date_columns(sample[text_cols])
+        }
+    
+    @staticmethod
+    def _column_pattern(column: str) -> str:
+        """Column-name pattern for the format cache, e.g. 'Visit_Date_2' -> 'visit_date_#'"""
+        return re.sub(r'\d+', '#', str(column).strip().lower())
+    
+    def _detect_date_columns(self, sample: pd.DataFrame) -> List[str]:
+        """Date columns of a text sample, checking explicit formats on all columns at once"""
+        # Long form: one row per non-null cell, labelled by column
+        values = sample.stack().astype(str)
+        if values.empty:
+            return []
+        labels = values.index.get_level_values(1)
+        
+        # Dates contain digits; drop columns where any value has none
+        has_digit = values.str.contains(r'\d', regex=True).groupby(labels).all()
+        remaining = set(has_digit[has_digit].index)
+        formats = {}
+        
+        # Formats cached for this column-name pattern are checked first
+        for col in list(remaining):
+            fmt = self.date_format_cache.get(self._column_pattern(col))
+            if fmt is not None:
+                col_values = values[labels == col]
+                if pd.to_datetime(col_values, format=fmt, errors='coerce').notna().all():
+                    formats[col] = fmt
+                    remaining.discard(col)
+        
+        for fmt in self.DATE_FORMATS:
+            if not remaining:
+                break
+            mask = labels.isin(remaining)
+            parsed = pd.to_datetime(values[mask], format=fmt, errors='coerce')
+            matches = parsed.notna().groupby(labels[mask]).all()
+            for col in matches[matches].index:
+                formats[col] = fmt
+                remaining.discard(col)
+        
+        for col, fmt in formats.items():
+            self.date_format_cache[self._column_pattern(col)] = fmt
+        return [col for col in sample.columns if col in formats]
+    
+    def _profile_chunks(self,
+                        file_path: str,
+                        sample_size: int,
+                        chunk_size: int,
+                        dtypes: Optional[Dict]) -> Tuple[List[str], Dict[str, ColumnProfile], List[Dict], MinHash]:
+        """Stream the CSV once, updating a ColumnProfile per column and a
+        MinHash over whole-row hashes"""
+        columns = None
+        profiles: Dict[str, ColumnProfile] = {}
+        sample_rows = []
+        row_minhash = MinHash(self.MINHASH_PERMUTATIONS)
+        pool = None
+        
+        try:
+            for chunk in pd.read_csv(file_path, chunksize=chunk_size, dtype=dtypes):
+                if columns is None:
+                    columns = chunk.columns.tolist()
+                    profiles = {col: ColumnProfile() for col in columns}
+                    sample_rows = chunk.head(sample_size).to_dict('records')
+                    if self.profile_workers > 1 and len(columns) >= self.PARALLEL_MIN_COLUMNS:
+                        # Spawned, not forked: the caller may already hold
+                        # torch or tokenizer threads that don't survive a fork.
+                        # Workers inherit a running resource tracker, so one
+                        # of their own can't unlink the shared blocks on exit
+                        resource_tracker.ensure_running()
+                        pool = ProcessPoolExecutor(
+                            max_workers=self.profile_workers,
+                            mp_context=multiprocessing.get_context('spawn')
+                        )
+                
+                if pool is not None:
+                    self._profile_chunk_parallel(pool, chunk, profiles)
+                else:
+                    for col in columns:
+                        profiles[col].update(chunk[col])
+                
+                row_minhash.update(np.unique(row_hashes(chunk)))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        
+        # Columns parsed as numbers in some chunks and text in others only
+        # have the text chunks in their value counts; re-read those as text
+        mixed = [col for col in columns or [] if profiles[col].is_mixed]
+        if mixed:
+            for col, profile in self._profile_as_text(file_path, mixed, chunk_size).items():
+                profile.dtype = profiles[col].dtype  # as merged from the chunks
+                profiles[col] = profile
+        
+        return columns or [], profiles, sample_rows, row_minhash
+    
+    @staticmethod
+    def _profile_as_text(file_path: str, columns: List[str], chunk_size: int) -> Dict[str, ColumnProfile]:
+        profiles = {col: ColumnProfile() for col in columns}
+        for chunk in pd.read_csv(file_path, usecols=columns, chunksize=chunk_size, dtype=str):
+            for col in columns:
+                profiles[col].update(chunk[col])
+        return profiles
+    
+    def _profile_chunk_parallel(self,
+                                pool: ProcessPoolExecutor,
+                                chunk: pd.DataFrame,
+                                profiles: Dict[str, ColumnProfile]):
+        """Profile numeric column groups on the pool via shared memory"""
+        numeric_cols = [
+            col for col in chunk.columns
+            if pd.api.types.is_numeric_dtype(chunk[col]) and not pd.api.types.is_bool_dtype(chunk[col])
+        ]
+        numeric_set = set(numeric_cols)
+        other_cols = [col for col in chunk.columns if col not in numeric_set]
+        
+        # Column-major float64 block so every column is one contiguous buffer
+        shape = (len(chunk), len(numeric_cols))
+        shm = shared_memory.SharedMemory(create=True, size=max(shape[0] * shape[1] * 8, 1))
+        try:
+            block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf, order='F')
+            for j, col in enumerate(numeric_cols):
+                block[:, j] = chunk[col].to_numpy(dtype=float, na_value=np.nan)
+            del block
+            
+            groups = np.array_split(np.arange(len(numeric_cols)), self.profile_workers)
+            futures = [
+                pool.submit(
+                    profile_shared_columns,
+                    shm.name,
+                    shape,
+                    group.tolist(),
+                    [str(chunk[numeric_cols[j]].dtype) for j in group]
+                )
+                for group in groups if len(group)
+            ]
+            
+            # Text columns are profiled here while the workers run
+            for col in other_cols:
+                profiles[col].update(chunk[col])
+            
+            for future in futures:
+                for j, profile in future.result():
+                    profiles[numeric_cols[j]].merge(profile)
+        finally:
+            shm.close()
+            shm.unlink()
+    
+    def _summarize_profiles(self,
+                            filename: str,
+                            columns: List[str],
+                            profiles: Dict[str, ColumnProfile],
+                            sample_rows: List[Dict],
+                            date_columns: List[str]) -> CSVSummary:
+        """Build a CSVSummary from merged per-column profiles"""
+        n_rows = profiles[columns[0]].rows if columns else 0
+        column_types = {col: profiles[col].dtype for col in columns}
         
         # Numeric statistics
-        numeric_stats = {}
-        numeric_cols = df.select_dtypes(include=[np.number]).columns
-        for col in numeric_cols:
-            stats = df[col].describe()
-            numeric_stats[col] = {
-                'mean': float(stats['mean']) if not pd.isna(stats['mean']) else None,
-                'std': float(stats['std']) if not pd.isna(stats['std']) else None,
-                'min': float(stats['min']) if not pd.isna(stats['min']) else None,
-                'max': float(stats['max']) if not pd.isna(stats['max']) else None,
-                'median': float(df[col].median()) if not pd.isna(df[col].median()) else None,
-                'q25': float(stats['25%']) if not pd.isna(stats['25%']) else None,
-                'q75': float(stats['75%']) if not pd.isna(stats['75%']) else None
-            }
+        numeric_stats = {
+            col: profiles[col].numeric_stats()
+            for col in columns if profiles[col].is_numeric
+        }
         
         # Categorical statistics
-        categorical_stats = {}
-        categorical_cols = df.select_dtypes(include=['object', 'category']).columns
-        for col in categorical_cols:
-            value_counts = df[col].value_counts()
-            categorical_stats[col] = {
-                'unique_count': int(df[col].nunique()),
-                'top_values': value_counts.head(10).to_dict(),
-                'most_common': str(value_counts.index[0]) if len(value_counts) > 0 else None
-            }
+        categorical_stats = {
+            col: profiles[col].categorical_stats()
+            for col in columns if profiles[col].is_categorical
+        }
         
         # Missing values
-        missing_values = df.isnull().sum().to_dict()
-        missing_values = {k: int(v) for k, v in missing_values.items() if v > 0}
-        
-        # Sample rows
-        sample_rows = df.head(sample_size).to_dict('records')
+        missing_values = {col: profiles[col].missing for col in columns if profiles[col].missing > 0}
         
         # Detect potential identifiers (high cardinality, unique values)
         potential_identifiers = []
         for col in columns:
-            unique_ratio = df[col].nunique() / len(df)
+            unique_ratio = profiles[col].distinct.count() / n_rows if n_rows else 0.0
             if unique_ratio > 0.95 or 'id' in col.lower() or 'patient' in col.lower():
                 potential_identifiers.append(col)
         
-        # Detect date columns
-        date_columns = []
-        for col in df.columns:
-            if df[col].dtype == 'object':
-                try:
-                    pd.to_datetime(df[col].dropna().head(100))
-                    date_columns.append(col)
-                except:
-                    pass
-        
         return CSVSummary(
             filename=filename,
-            shape=shape,
+            shape=(n_rows, len(columns)),
             columns=columns,
             column_types=column_types,
             numeric_stats=numeric_stats,
@@ -217,86 +501,62 @@ class MedicalDataProcessor:
         
         filename = os.path.basename(file_path)
         
-        # Parse AST
+        # Parse AST and collect everything in a single walk
         tree = ast.parse(content)
+        analyzer = CodeAnalyzer()
+        analyzer.visit(tree)
         
-        # Extract functions
-        functions = []
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                func_info = {
-                    'name': node.name,
-                    'docstring': ast.get_docstring(node) or '',
-                    'parameters': [arg.arg for arg in node.args.args],
-                    'line_number': node.lineno
-                }
-                functions.append(func_info)
+        # Extract comments
+        comments = extract_comments(content, analyzer.string_spans)
         
-        # Extract imports
-        imports = []
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                imports.extend([alias.name for alias in node.names])
-            elif isinstance(node, ast.ImportFrom):
-                module = node.module or ''
-                imports.extend([f"{module}.{alias.name}" for alias in node.names])
+        # Detect statistical methods, data operations and visualizations
+        # from identifiers and call names (not strings or comments)
+        found = self.keyword_automaton.search(
+            normalize_keyword(name) for name in analyzer.identifiers
+        )
+        statistical_methods = [k for k in self.statistical_keywords if ('statistical', k) in found]
+        data_operations = [k for k in self.data_operation_keywords if ('data_operation', k) in found]
+        visualizations = [k for k in self.viz_keywords if ('visualization', k) in found]
         
-        # Extract comments
-        comments = []
-        lines = content.split('\n')
-        for i, line in enumerate(lines):
-            stripped = line.strip()
-            if stripped.startswith('#'):
-                comments.append({
-                    'line': i + 1,
-                    'text': stripped[1:].strip()
-                })
-        
-        # Detect statistical methods
-        content_lower = content.lower()
-        statistical_methods = []
-        for method in self.statistical_keywords:
-            if method in content_lower:
-                statistical_methods.append(method)
-        
-        # Detect data operations
-        data_operations = []
-        for operation in self.data_operation_keywords:
-            if operation in content_lower:
-                data_operations.append(operation)
-        
-        # Detect visualizations
-        visualizations = []
-        for viz in self.viz_keywords:
-            if viz in content_lower:
-                visualizations.append(viz)
-        
-        # Extract important variables (assignments to DataFrames, etc.)
-        variables = []
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Assign):
-                for target in node.targets:
-                    if isinstance(target, ast.Name):
-                        variables.append(target.id)
+        # Signature of the normalized token stream, for near-duplicate search
+        code_minhash = MinHash(self.MINHASH_PERMUTATIONS)
+        shingles = code_shingles(content, self.CODE_SHINGLE_TOKENS)
+        if shingles:
+            code_minhash.update(pd.util.hash_array(np.array(shingles, dtype=object)))
         
         return PythonAnalysis(
             filename=filename,
-            functions=functions,
-            imports=imports,
+            functions=analyzer.functions,
+            imports=analyzer.imports,
             comments=[c['text'] for c in comments],
             statistical_methods=statistical_methods,
             data_operations=data_operations,
             visualizations=visualizations,
-            variables=variables[:20]  # Limit to avoid noise
+            variables=analyzer.variables[:20],  # Limit to avoid noise
+            call_sites=list(analyzer.call_sites),
+            code_minhash=code_minhash.tolist()
         )
 
+def _process_study_files(processor: MedicalDataProcessor,
+                         python_file: str,
+                         csv_file: str) -> Tuple[CSVSummary, PythonAnalysis]:
+    """Worker entry point for bulk ingestion: parse one study's files"""
+    return processor.process_csv(csv_file), processor.process_python(python_file)
+
 class MedicalRAGSystem:
     """Complete RAG system with LLM integration for medical research queries"""
     
+    # Budget for one column-group chunk (about the embedding model's input length)
+    COLUMN_CHUNK_CHARS = 1000
+    
     def __init__(self, 
                  base_path: str = "/content/drive/MyDrive/medical_rag_system",
                  embedding_model: str = "all-MiniLM-L6-v2",
-                 llm: Optional[BaseLLM] = None):
+                 llm: Optional[BaseLLM] = None,
+                 vector_backend: str = "chroma"):
+        
+        from langchain.embeddings import SentenceTransformerEmbeddings
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
         
         self.base_path = base_path
         self.chroma_path = os.path.join(base_path, "chroma_db")
@@ -308,15 +568,64 @@ class MedicalRAGSystem:
         
         # Initialize vector store
         os.makedirs(self.chroma_path, exist_ok=True)
-        self.vectorstore = Chroma(
-            persist_directory=self.chroma_path,
-            embedding_function=self.embeddings,
-            collection_name="medical_studies"
-        )
+        self.vector_backend = vector_backend
+        if vector_backend == "chroma":
+            from langchain.vectorstores import Chroma
+            self.vectorstore = Chroma(
+                persist_directory=self.chroma_path,
+                embedding_function=self.embeddings,
+                collection_name="medical_studies"
+            )
+        elif vector_backend == "mmap_hnsw":
+            # In-process index: no client round trips, per-study posting lists
+            from vector_index import MmapHNSWStore
+            self.vectorstore = MmapHNSWStore(
+                persist_directory=os.path.join(base_path, "vector_index"),
+                embedding_function=self.embeddings
+            )
+        else:
+            raise ValueError(f"Unknown vector backend: {vector_backend}")
         
         # Initialize LLM
         self.llm = llm
         
+        # Query caches; retrieval keys include a per-study index version
+        self.cache_params = {
+            'embedding_entries': 1024,
+            'retrieval_entries': 1024,
+            'answer_entries': 512,
+            'ttl_seconds': 3600,
+            'answer_similarity': 0.95  # cosine similarity for reusing an answer
+        }
+        self._init_query_caches()
+        
+        # Context assembly: retrieved chunks are de-duplicated, merged and packed
+        self.context_params = {
+            'token_budget': 1500,
+            'duplicate_similarity': 0.95,
+            'max_overlap': 400  # longest repeated text looked for between neighbouring chunks
+        }
+        
+        # Lexical (BM25) retrieval, fused with vector search; a decisive
+        # lexical match answers without embedding the question at all
+        self.lexical_params = {
+            'enabled': True,
+            'identifier_weight': 3.0,  # function/column/import names vs body text
+            'rrf_k': 60
+        }
+        # Whole-corpus index for unfiltered queries; built in the background
+        # on first use (see build_lexical_index), then kept in step with the store
+        self._lexical_index: Optional[BM25Index] = None
+        self._lexical_pending: Optional[List[Tuple]] = None  # writes made during a build
+        self._lexical_lock = threading.Lock()
+        
+        # Stock questions about a study (methods, dataset shape, missing data,
+        # functions) are answered from its precomputed digest, skipping
+        # retrieval and the LLM
+        self.digest_params = {
+            'enabled': True
+        }
+        
         # Initialize metadata database
         self.init_metadata_db()
         
@@ -330,34 +639,55 @@ class MedicalRAGSystem:
     def set_llm(self, llm: BaseLLM):
         """Set or change the LLM"""
         self.llm = llm
+        # Cached answers came from the previous LLM
+        self.answer_cache.clear()
+    
+    def _init_query_caches(self):
+        params = self.cache_params
+        self.embedding_cache = TTLCache(params['embedding_entries'], params['ttl_seconds'])
+        self.retrieval_cache = TTLCache(params['retrieval_entries'], params['ttl_seconds'])
+        self.answer_cache = SemanticAnswerCache(
+            params['answer_entries'], params['ttl_seconds'], params['answer_similarity']
+        )
+        # Per-study BM25 indexes with the study's chunks, built from the vector store
+        self.lexical_cache = TTLCache(params['retrieval_entries'], params['ttl_seconds'])
+        self._index_versions: Dict[Optional[str], int] = {}
+    
+    def _invalidate_query_caches(self, study_ids: List[str]):
+        """Called whenever studies are (re-)indexed or removed"""
+        # Unfiltered queries (study_id None) search every study
+        affected = list(study_ids) + [None]
+        for study_id in affected:
+            self._index_versions[study_id] = self._index_versions.get(study_id, 0) + 1
+        self.retrieval_cache.invalidate(lambda key: key[1] in affected)
+        self.lexical_cache.invalidate(lambda key: key[0] in affected)
+        self.answer_cache.invalidate(affected)
+    
+    def cache_stats(self) -> Dict:
+        """Hit statistics of the query caches"""
+        return {
+            "embeddings": self.embedding_cache.stats(),
+            "retrieval": self.retrieval_cache.stats(),
+            "lexical": self.lexical_cache.stats(),
+            "answers": self.answer_cache.stats()
+        }
     
     def init_metadata_db(self):
         """Initialize SQLite database for study metadata"""
         self.db_path = os.path.join(self.chroma_path, "studies.db")
-        
-        conn = sqlite3.connect(self.db_path)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS studies (
-                study_id TEXT PRIMARY KEY,
-                title TEXT,
-                description TEXT,
-                uploaded_at TEXT,
-                file_paths TEXT,
-                user_id TEXT,
-                csv_summary TEXT,
-                python_analysis TEXT
-            )
-        """)
-        conn.commit()
-        conn.close()
+        self.metadata_store = MetadataStore(self.db_path)
     
     def ingest_study(self, 
                     python_file: str,
                     csv_file: str,
                     title: str,
                     description: str,
-                    user_id: str) -> str:
-        """Complete study ingestion pipeline"""
+                    user_id: str,
+                    digest: bool = True) -> str:
+        """Complete study ingestion pipeline
+        
+        digest=True also stores a study digest for answering stock questions.
+        """
         
         # Generate unique study ID
         study_id = str(uuid.uuid4())
@@ -381,20 +711,223 @@ class MedicalRAGSystem:
             study_metadata, csv_summary, python_analysis
         )
         
-        # Add to vector store
-        self.vectorstore.add_documents(documents)
+        # Add to vector store under content-hash IDs
+        documents, ids = self._with_chunk_ids(documents)
+        self.vectorstore.add_documents(documents, ids=ids)
         self.vectorstore.persist()  # Persist to disk
+        self._update_lexical_index(documents, ids)
+        self._invalidate_query_caches([study_id])
         
         # Store metadata in database
-        self._store_metadata(study_metadata, csv_summary, python_analysis)
+        self._store_metadata(study_metadata, csv_summary, python_analysis, digest=digest)
         
         return study_id
     
+    def ingest_studies(self,
+                       studies: List[Dict],
+                       workers: Optional[int] = None,
+                       batch_size: int = 512,
+                       progress: bool = True,
+                       digest: bool = True) -> List[Dict]:
+        """Bulk ingestion for backfills
+        
+        Each study is a dict with python_file, csv_file, title, description
+        and user_id. Files are parsed on a process pool, chunks are embedded
+        in large batches, metadata is written in one transaction (study by
+        study if that fails) and the vector store is persisted once. A
+        failing study is reported in its result entry ({'study_id', 'status',
+        'error'}) without affecting the rest.
+        """
+        results: List[Dict] = [None] * len(studies)
+        prepared = []  # (index, study_metadata, csv_summary, python_analysis)
+        
+        # Workers profile serially; the pool already spreads studies over cores
+        worker_processor = copy.copy(self.processor)
+        worker_processor.profile_workers = 1
+        
+        # Step 1: Parse files concurrently. Spawned, not forked: the embedding
+        # model may already have started torch or tokenizer threads
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {
+                pool.submit(_process_study_files, worker_processor, study['python_file'], study['csv_file']): i
+                for i, study in enumerate(studies)
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                study = studies[i]
+                try:
+                    csv_summary, python_analysis = future.result()
+                except Exception as e:
+                    results[i] = {'study_id': None, 'status': 'error', 'error': f"{type(e).__name__}: {str(e)}"}
+                else:
+                    study_metadata = StudyMetadata(
+                        study_id=str(uuid.uuid4()),
+                        title=study['title'],
+                        description=study['description'],
+                        uploaded_at=datetime.now(),
+                        file_paths={'python': study['python_file'], 'csv': study['csv_file']},
+                        user_id=study['user_id']
+                    )
+                    prepared.append((i, study_metadata, csv_summary, python_analysis))
+                if progress:
+                    print(f"Parsed {done}/{len(studies)} studies")
+        
+        # Step 2: Embed all chunks in large batches
+        documents = []
+        for i, study_metadata, csv_summary, python_analysis in prepared:
+            documents.extend(self._create_document_chunks(study_metadata, csv_summary, python_analysis))
+        documents, ids = self._with_chunk_ids(documents)
+        
+        failed = {}  # study_id -> error
+        added: Dict[str, List[str]] = {}  # study_id -> chunk IDs stored so far
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start:start + batch_size]
+            batch_ids = ids[start:start + batch_size]
+            try:
+                self.vectorstore.add_documents(batch, ids=batch_ids)
+                for doc, chunk_id in zip(batch, batch_ids):
+                    added.setdefault(doc.metadata['study_id'], []).append(chunk_id)
+            except Exception:
+                # Retry study by study so one bad study doesn't sink the batch
+                by_study: Dict[str, Tuple[List[Document], List[str]]] = {}
+                for doc, chunk_id in zip(batch, batch_ids):
+                    study_docs, study_ids = by_study.setdefault(doc.metadata['study_id'], ([], []))
+                    study_docs.append(doc)
+                    study_ids.append(chunk_id)
+                for study_id, (study_docs, study_ids) in by_study.items():
+                    try:
+                        self.vectorstore.add_documents(study_docs, ids=study_ids)
+                        added.setdefault(study_id, []).extend(study_ids)
+                    except Exception as e:
+                        failed[study_id] = f"{type(e).__name__}: {str(e)}"
+            if progress:
+                print(f"Embedded {min(start + batch_size, len(documents))}/{len(documents)} chunks")
+        
+        # Step 3: Store metadata in a single transaction, retrying study by
+        # study so one bad record doesn't sink the rest
+        stored = [item[1:] for item in prepared if item[1].study_id not in failed]
+        try:
+            self._store_metadata_many(stored, digest=digest)
+        except Exception:
+            for item in stored:
+                try:
+                    self._store_metadata_many([item], digest=digest)
+                except Exception as e:
+                    failed[item[0].study_id] = f"{type(e).__name__}: {str(e)}"
+        
+        # A failed study's chunks may span batches; drop those that made it in,
+        # since the study has no metadata and they would be orphans
+        orphans = [chunk_id for study_id in failed for chunk_id in added.get(study_id, [])]
+        if orphans:
+            self.vectorstore.delete(ids=orphans)
+        self.vectorstore.persist()  # Persist once for the whole batch
+        indexed = [(doc, chunk_id) for doc, chunk_id in zip(documents, ids) if doc.metadata['study_id'] not in failed]
+        self._update_lexical_index([doc for doc, _ in indexed], [chunk_id for _, chunk_id in indexed])
+        self._invalidate_query_caches([study_metadata.study_id for _, study_metadata, _, _ in prepared])
+        
+        for i, study_metadata, _, _ in prepared:
+            if study_metadata.study_id in failed:
+                results[i] = {'study_id': None, 'status': 'error', 'error': failed[study_metadata.study_id]}
+            else:
+                results[i] = {'study_id': study_metadata.study_id, 'status': 'success', 'error': None}
+        
+        if progress:
+            succeeded = sum(1 for result in results if result['status'] == 'success')
+            print(f"Ingested {succeeded}/{len(studies)} studies")
+        return results
+    
+    def update_study(self,
+                     study_id: str,
+                     python_file: str,
+                     csv_file: str,
+                     title: Optional[str] = None,
+                     description: Optional[str] = None,
+                     digest: bool = True) -> Dict:
+        """Re-index a re-uploaded study, embedding only new or changed chunks
+        
+        Chunks carry content-hash IDs, so the new chunk set is diffed against
+        what is indexed for the study: unchanged chunks are kept, new ones are
+        embedded and stale ones deleted.
+        """
+        existing = self.get_study_details(study_id, fields=['title', 'description', 'uploaded_at', 'user_id'])
+        if existing is None:
+            raise ValueError(f"Unknown study: {study_id}")
+        
+        # Process files
+        csv_summary = self.processor.process_csv(csv_file)
+        python_analysis = self.processor.process_python(python_file)
+        
+        study_metadata = StudyMetadata(
+            study_id=study_id,
+            title=title if title is not None else existing['title'],
+            description=description if description is not None else existing['description'],
+            uploaded_at=datetime.fromisoformat(existing['uploaded_at']),
+            file_paths={'python': python_file, 'csv': csv_file},
+            user_id=existing['user_id']
+        )
+        
+        documents, ids = self._with_chunk_ids(
+            self._create_document_chunks(study_metadata, csv_summary, python_analysis)
+        )
+        indexed_ids = set(self.vectorstore.get(where={"study_id": study_id})['ids'])
+        
+        new_chunks = [(doc, chunk_id) for doc, chunk_id in zip(documents, ids) if chunk_id not in indexed_ids]
+        stale_ids = list(indexed_ids - set(ids))
+        
+        if new_chunks:
+            self.vectorstore.add_documents(
+                [doc for doc, _ in new_chunks],
+                ids=[chunk_id for _, chunk_id in new_chunks]
+            )
+        if stale_ids:
+            self.vectorstore.delete(ids=stale_ids)
+        self.vectorstore.persist()
+        self._update_lexical_index(
+            [doc for doc, _ in new_chunks], [chunk_id for _, chunk_id in new_chunks], removed_ids=stale_ids
+        )
+        
+        self._store_metadata(study_metadata, csv_summary, python_analysis, digest=digest)
+        self._invalidate_query_caches([study_id])
+        
+        return {
+            "study_id": study_id,
+            "added": len(new_chunks),
+            "deleted": len(stale_ids),
+            "unchanged": len(ids) - len(new_chunks)
+        }
+    
+    def delete_study(self, study_id: str) -> bool:
+        """Remove a study's chunks from the vector store and its metadata"""
+        indexed_ids = self.vectorstore.get(where={"study_id": study_id})['ids']
+        if indexed_ids:
+            self.vectorstore.delete(ids=indexed_ids)
+            self.vectorstore.persist()
+            self._update_lexical_index(removed_ids=indexed_ids)
+        self._invalidate_query_caches([study_id])
+        
+        return self.metadata_store.delete(study_id)
+    
+    @staticmethod
+    def _chunk_id(document: Document) -> str:
+        """Stable ID from chunk content and metadata (chunk_index excluded,
+        so an inserted chunk doesn't change the IDs of the ones after it)"""
+        metadata = {k: v for k, v in document.metadata.items() if k != 'chunk_index'}
+        payload = json.dumps({'content': document.page_content, 'metadata': metadata}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _with_chunk_ids(self, documents: List[Document]) -> Tuple[List[Document], List[str]]:
+        """Content-hash IDs for documents, dropping exact duplicates"""
+        unique: Dict[str, Document] = {}
+        for doc in documents:
+            unique.setdefault(self._chunk_id(doc), doc)
+        return list(unique.values()), list(unique.keys())
+    
     def _create_document_chunks(self, 
                               study_metadata: StudyMetadata,
                               csv_summary: CSVSummary,
                               python_analysis: PythonAnalysis) -> List[Document]:
         """Create embeddings-ready document chunks"""
+        from langchain.schema import Document
         
         documents = []
         
@@ -416,43 +949,38 @@ class MedicalRAGSystem:
             }
         ))
         
-        # 2. Dataset summary chunks
+        # 2. Dataset summary chunks: one overview, then compact per-column
+        # descriptions packed into column groups (a column never straddles chunks)
         dataset_text = f"""
         Dataset Information:
         Filename: {csv_summary.filename}
         Dataset Shape: {csv_summary.shape[0]} rows and {csv_summary.shape[1]} columns
-        
-        Columns in Dataset: {', '.join(csv_summary.columns)}
-        
-        Column Data Types:
-        {json.dumps(csv_summary.column_types, indent=2)}
-        
-        Numeric Columns Statistical Summary:
-        {json.dumps(csv_summary.numeric_stats, indent=2)}
-        
-        Categorical Columns Summary:
-        {json.dumps(csv_summary.categorical_stats, indent=2)}
-        
-        Missing Values Analysis:
-        {json.dumps(csv_summary.missing_values, indent=2)}
-        
-        Potential Patient Identifiers: {', '.join(csv_summary.potential_identifiers)}
-        Date Columns Detected: {', '.join(csv_summary.date_columns)}
-        
-        Sample Data Rows:
-        {json.dumps(csv_summary.sample_rows, indent=2)}
+        Numeric Columns: {len(csv_summary.numeric_stats)}, Categorical Columns: {len(csv_summary.categorical_stats)}
+        Columns with Missing Values: {self._name_list([f"{col} ({n})" for col, n in csv_summary.missing_values.items()]) or 'none'}
+        Potential Patient Identifiers: {self._name_list(csv_summary.potential_identifiers)}
+        Date Columns Detected: {self._name_list(csv_summary.date_columns)}
         """
         
-        # Split large dataset descriptions
-        dataset_chunks = self.text_splitter.split_text(dataset_text)
-        for i, chunk in enumerate(dataset_chunks):
+        documents.append(Document(
+            page_content=dataset_text,
+            metadata={
+                "study_id": study_metadata.study_id,
+                "chunk_type": "dataset",
+                "chunk_index": 0,
+                "filename": csv_summary.filename
+            }
+        ))
+        
+        for i, (columns, lines) in enumerate(self._column_groups(csv_summary), 1):
             documents.append(Document(
-                page_content=chunk,
+                page_content=f"Dataset {csv_summary.filename} columns:\n" + "\n".join(lines),
                 metadata={
                     "study_id": study_metadata.study_id,
                     "chunk_type": "dataset",
                     "chunk_index": i,
-                    "filename": csv_summary.filename
+                    "filename": csv_summary.filename,
+                    # Chroma metadata values must be scalars
+                    "columns": ", ".join(columns)
                 }
             ))
         
@@ -461,8 +989,7 @@ class MedicalRAGSystem:
         Python Analysis Script Information:
         Script Filename: {python_analysis.filename}
         
-        Functions Defined in Code:
-        {json.dumps(python_analysis.functions, indent=2)}
+        Functions Defined in Code: {', '.join(func['name'] for func in python_analysis.functions)}
         
         Libraries and Imports Used: {', '.join(python_analysis.imports)}
         
@@ -474,21 +1001,24 @@ class MedicalRAGSystem:
         
         Important Variables: {', '.join(python_analysis.variables)}
         
+        Function Calls: {', '.join(python_analysis.call_sites)}
+        
         Code Comments and Documentation:
         {chr(10).join(python_analysis.comments)}
         """
         
         code_chunks = self.text_splitter.split_text(code_text)
         for i, chunk in enumerate(code_chunks):
-            documents.append(Document(
-                page_content=chunk,
-                metadata={
-                    "study_id": study_metadata.study_id,
-                    "chunk_type": "code_analysis",
-                    "chunk_index": i,
-                    "filename": python_analysis.filename
-                }
-            ))
+            metadata = {
+                "study_id": study_metadata.study_id,
+                "chunk_type": "code_analysis",
+                "chunk_index": i,
+                "filename": python_analysis.filename
+            }
+            if i == 0:
+                # The import list leads the code analysis text
+                metadata["imports"] = ", ".join(python_analysis.imports)
+            documents.append(Document(page_content=chunk, metadata=metadata))
         
         # 4. Individual function chunks (for detailed code questions)
         for func in python_analysis.functions:
@@ -514,51 +1044,267 @@ class MedicalRAGSystem:
         
         return documents
     
+    @staticmethod
+    def _name_list(names: List[str], limit: int = 20) -> str:
+        # Per-column details live in the column chunks; keep the overview short
+        if len(names) <= limit:
+            return ', '.join(names)
+        return f"{', '.join(names[:limit])} (+{len(names) - limit} more)"
+    
+    @staticmethod
+    def _format_value(value) -> str:
+        if isinstance(value, float):
+            return f"{value:.4g}"
+        return str(value)
+    
+    def _describe_column(self, csv_summary: CSVSummary, col: str) -> str:
+        """One line per column: type, statistics, missing count and sample values"""
+        parts = [f"{col} ({csv_summary.column_types.get(col)})"]
+        if col in csv_summary.numeric_stats:
+            stats = csv_summary.numeric_stats[col]
+            parts.append(", ".join(
+                f"{key} {self._format_value(stats[key])}"
+                for key in ['mean', 'std', 'min', 'q25', 'median', 'q75', 'max']
+                if stats.get(key) is not None
+            ))
+        elif col in csv_summary.categorical_stats:
+            stats = csv_summary.categorical_stats[col]
+            top_values = list(stats['top_values'].items())[:5]
+            if top_values and top_values[0][1] > 1:
+                # Past the summary's capacity the counts are lower bounds
+                bound = "" if stats.get('top_values_exact', True) else "at least "
+                top = ", ".join(f"{value} ({bound}{count})" for value, count in top_values)
+                parts.append(f"{stats['unique_count']} unique; top {top}")
+            else:
+                parts.append(f"{stats['unique_count']} unique")
+        if csv_summary.missing_values.get(col):
+            parts.append(f"missing {csv_summary.missing_values[col]}")
+        samples = [
+            self._format_value(row[col]) for row in csv_summary.sample_rows
+            if col in row and row[col] is not None
+        ]
+        if samples:
+            parts.append(f"e.g. {', '.join(samples[:3])}")
+        return ": ".join(parts[:2]) + "".join(f"; {part}" for part in parts[2:])
+    
+    def _column_groups(self, csv_summary: CSVSummary) -> List[Tuple[List[str], List[str]]]:
+        """Pack column descriptions into groups of at most COLUMN_CHUNK_CHARS"""
+        groups = []
+        columns, lines, size = [], [], 0
+        for col in csv_summary.columns:
+            line = self._describe_column(csv_summary, col)
+            if lines and size + len(line) > self.COLUMN_CHUNK_CHARS:
+                groups.append((columns, lines))
+                columns, lines, size = [], [], 0
+            columns.append(col)
+            lines.append(line)
+            size += len(line) + 1
+        if lines:
+            groups.append((columns, lines))
+        return groups
+    
     def _store_metadata(self, 
                        study_metadata: StudyMetadata,
                        csv_summary: CSVSummary,
-                       python_analysis: PythonAnalysis):
+                       python_analysis: PythonAnalysis,
+                       digest: bool = True):
         """Store study metadata in SQLite database"""
+        self._store_metadata_many([(study_metadata, csv_summary, python_analysis)], digest=digest)
+    
+    def _store_metadata_many(self,
+                             studies: List[Tuple[StudyMetadata, CSVSummary, PythonAnalysis]],
+                             digest: bool = True):
+        """Store metadata (and optionally digests) for many studies in one transaction"""
+        records = []
+        for study_metadata, csv_summary, python_analysis in studies:
+            record = {
+                "study_id": study_metadata.study_id,
+                "title": study_metadata.title,
+                "description": study_metadata.description,
+                "uploaded_at": study_metadata.uploaded_at.isoformat(),
+                "file_paths": study_metadata.file_paths,
+                "user_id": study_metadata.user_id,
+                "csv_summary": asdict(csv_summary),
+                "python_analysis": asdict(python_analysis)
+            }
+            if digest:
+                record["digest"] = build_digest(record["csv_summary"], record["python_analysis"])
+            records.append(record)
+        self.metadata_store.put_many(records)
+    
+    def _new_lexical_index(self, ids: List[str], texts: List[str], metadatas: List[Dict]) -> BM25Index:
+        index = BM25Index(identifier_weight=self.lexical_params['identifier_weight'])
+        index.add(ids, texts, metadatas)
+        return index
+    
+    def build_lexical_index(self) -> int:
+        """Build the whole-corpus lexical index now; returns the number of chunks
         
-        conn = sqlite3.connect(self.db_path)
-        conn.execute("""
-            INSERT INTO studies 
-            (study_id, title, description, uploaded_at, file_paths, user_id, csv_summary, python_analysis)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            study_metadata.study_id,
-            study_metadata.title,
-            study_metadata.description,
-            study_metadata.uploaded_at.isoformat(),
-            json.dumps(study_metadata.file_paths),
-            study_metadata.user_id,
-            json.dumps(asdict(csv_summary)),
-            json.dumps(asdict(python_analysis))
-        ))
-        conn.commit()
-        conn.close()
+        Unfiltered queries otherwise start this in the background and use
+        vector search alone until it is ready. Study-filtered queries don't
+        need it.
+        """
+        with self._lexical_lock:
+            if self._lexical_pending is None:
+                self._lexical_pending = []
+        try:
+            index = self._new_lexical_index([], [], [])
+            offset, batch_size = 0, 10_000
+            while True:
+                batch = self.vectorstore.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+                if not batch["ids"]:
+                    break
+                index.add(batch["ids"], batch["documents"], batch["metadatas"])
+                offset += len(batch["ids"])
+        except Exception:
+            with self._lexical_lock:
+                self._lexical_pending = None
+            raise
+        with self._lexical_lock:
+            # Replay ingests and deletes that raced with the scan
+            for documents, ids, removed_ids in self._lexical_pending or []:
+                index.remove(removed_ids)
+                index.add(ids, [doc.page_content for doc in documents], [doc.metadata for doc in documents])
+            self._lexical_index, self._lexical_pending = index, None
+        return len(index)
     
-    def query_study(self, 
-                   question: str, 
-                   study_id: Optional[str] = None,
-                   top_k: int = 5) -> Dict:
-        """Query the RAG system with LLM-generated explanations"""
+    def _update_lexical_index(self,
+                              documents: List[Document] = (),
+                              ids: List[str] = (),
+                              removed_ids: List[str] = ()):
+        """Mirror vector store writes into the whole-corpus lexical index"""
+        with self._lexical_lock:
+            if self._lexical_index is not None:
+                self._lexical_index.remove(removed_ids)
+                self._lexical_index.add(ids, [doc.page_content for doc in documents], [doc.metadata for doc in documents])
+            elif self._lexical_pending is not None:
+                self._lexical_pending.append((documents, ids, removed_ids))
+    
+    def _study_lexical_index(self, study_id: str) -> Tuple[BM25Index, Dict[str, Document]]:
+        """BM25 index over one study's chunks, and the chunks by ID"""
+        key = (study_id, self._index_versions.get(study_id, 0))
+        cached = self.lexical_cache.get(key)
+        if cached is None:
+            from langchain.schema import Document
+            stored = self.vectorstore.get(where={"study_id": study_id})
+            index = self._new_lexical_index(stored["ids"], stored["documents"], stored["metadatas"])
+            cached = (index, {
+                chunk_id: Document(page_content=text, metadata=metadata)
+                for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+            })
+            self.lexical_cache.put(key, cached)
+        return cached
+    
+    def _lexical_search(self, question: str, study_id: Optional[str], top_k: int) -> Tuple[List[Document], bool]:
+        """BM25 matches for the question, and whether the best one is decisive
         
-        # Step 1: Retrieve relevant context from vector database
-        search_kwargs = {"k": top_k}
+        The best match is decisive when the question spells out a function,
+        column or import name that only that chunk carries, e.g. "what does
+        `analyze_bmi_vitamin_correlation` do".
+        """
         if study_id:
-            search_kwargs["filter"] = {"study_id": study_id}
-        
-        retriever = self.vectorstore.as_retriever(search_kwargs=search_kwargs)
-        relevant_docs = retriever.get_relevant_documents(question)
-        
-        # Step 2: Prepare context for LLM
-        context = "\n\n".join([
+            index, by_id = self._study_lexical_index(study_id)
+        else:
+            with self._lexical_lock:
+                index = self._lexical_index
+                start_build = index is None and self._lexical_pending is None
+                if start_build:
+                    self._lexical_pending = []
+            if index is None:
+                if start_build:
+                    threading.Thread(target=self.build_lexical_index, daemon=True).start()
+                return [], False
+            by_id = None
+        
+        hits = index.search(question, top_k)
+        if not hits:
+            return [], False
+        decisive = hits[0][0] in index.uniquely_named(question)
+        
+        ids = [chunk_id for chunk_id, _ in hits]
+        if by_id is None:
+            from langchain.schema import Document
+            stored = self.vectorstore.get(ids=ids, include=["documents", "metadatas"])
+            by_id = {
+                chunk_id: Document(page_content=text, metadata=metadata)
+                for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+            }
+        return [by_id[chunk_id] for chunk_id in ids if chunk_id in by_id], decisive
+    
+    def _embed_question(self, question: str, question_hash: str, use_cache: bool = True) -> List[float]:
+        embedding = self.embedding_cache.get(question_hash) if use_cache else None
+        if embedding is None:
+            embedding = self.embeddings.embed_query(question)
+            if use_cache:
+                self.embedding_cache.put(question_hash, embedding)
+        return embedding
+    
+    def _retrieve(self,
+                  question_hash: str,
+                  embedding: List[float],
+                  study_id: Optional[str],
+                  top_k: int,
+                  use_cache: bool = True,
+                  lexical_docs: List[Document] = ()) -> List[Document]:
+        """Vector search results, fused with lexical_docs by reciprocal rank
+        
+        Only the vector results are cached; fusion runs on every call, so a
+        lexical index that becomes ready later is used straight away.
+        """
+        key = (question_hash, study_id, top_k, self._index_versions.get(study_id, 0))
+        docs = self.retrieval_cache.get(key) if use_cache else None
+        if docs is None:
+            docs = self.vectorstore.similarity_search_by_vector(
+                embedding, k=top_k, filter={"study_id": study_id} if study_id else None
+            )
+            if use_cache:
+                self.retrieval_cache.put(key, docs)
+        if lexical_docs:
+            docs = reciprocal_rank_fusion(
+                [docs, lexical_docs], key=self._chunk_id, k=self.lexical_params['rrf_k']
+            )[:top_k]
+        return docs
+    
+    @staticmethod
+    def _format_context(docs: List[Document]) -> str:
+        return "\n\n".join([
             f"Source {i+1}:\n{doc.page_content}" 
-            for i, doc in enumerate(relevant_docs)
+            for i, doc in enumerate(docs)
         ])
+    
+    def _chunk_embeddings(self, docs: List[Document]) -> np.ndarray:
+        """Stored embeddings of retrieved chunks, embedding only those not found"""
+        ids = [self._chunk_id(doc) for doc in docs]
+        stored = self.vectorstore.get(ids=ids, include=["embeddings"])
+        by_id = dict(zip(stored["ids"], stored["embeddings"]))
+        missing = [i for i, chunk_id in enumerate(ids) if chunk_id not in by_id]
+        if missing:
+            # Chunks indexed before content-hash IDs
+            for i, embedding in zip(missing, self.embeddings.embed_documents([docs[i].page_content for i in missing])):
+                by_id[ids[i]] = embedding
+        return np.array([by_id[chunk_id] for chunk_id in ids], dtype=np.float32)
+    
+    def _assemble_context(self, relevant_docs: List[Document]) -> Tuple[List[Document], Dict]:
+        """Drop near-duplicate chunks, merge neighbouring ones and pack them into the token budget"""
+        params = self.context_params
+        docs = relevant_docs
+        if len(docs) > 1:
+            docs = drop_near_duplicates(docs, self._chunk_embeddings(docs), params['duplicate_similarity'])
+        docs = [doc for _, doc in merge_adjacent(docs, params['max_overlap'])]
+        packed = pack_context(docs, params['token_budget'])
+        
+        retrieved_tokens = estimate_tokens(self._format_context(relevant_docs))
+        packed_tokens = estimate_tokens(self._format_context(packed))
+        return packed, {
+            "retrieved": retrieved_tokens,
+            "packed": packed_tokens,
+            "saved": retrieved_tokens - packed_tokens
+        }
+    
+    def _build_prompt(self, question: str, context_docs: List[Document]) -> Tuple[str, str]:
+        """Context text and full LLM prompt for the assembled context documents"""
+        context = self._format_context(context_docs)
         
-        # Step 3: Create prompt for LLM
         prompt = f"""You are a medical research assistant. Based on the following context retrieved from a medical research database, please answer the user's question.
 
 Context from Research Database:
@@ -575,79 +1321,240 @@ Instructions:
 - Focus on providing accurate, detailed explanations based on the retrieved information
 
 Answer:"""
-        
-        # Step 4: Generate response using LLM
-        llm_response = self.llm.generate_response(prompt, max_tokens=500)
-        
-        # Step 5: Return comprehensive result
+        return context, prompt
+    
+    @staticmethod
+    def _source_documents(relevant_docs: List[Document]) -> List[Dict]:
+        return [
+            {
+                "content": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
+                "metadata": doc.metadata,
+                "chunk_type": doc.metadata.get("chunk_type", "unknown")
+            }
+            for doc in relevant_docs
+        ]
+    
+    def _digest_answer(self, question: str, study_id: Optional[str]) -> Optional[Dict]:
+        """Templated result for a stock question about one study, or None
+        when the question is not a stock one or the study has no digest"""
+        if not self.digest_params['enabled'] or study_id is None:
+            return None
+        intent = classify_intent(question)
+        if intent is None:
+            return None
+        digest = self.metadata_store.get_digest(study_id)
+        if digest is None or digest.get('version') != DIGEST_VERSION:
+            return None
         return {
             "question": question,
-            "answer": llm_response,
-            "context_used": context,
-            "source_documents": [
-                {
-                    "content": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
-                    "metadata": doc.metadata,
-                    "chunk_type": doc.metadata.get("chunk_type", "unknown")
-                }
-                for doc in relevant_docs
-            ],
-            "num_sources": len(relevant_docs),
+            "answer": render_answer(intent, digest),
+            "context_used": "",
+            "context_tokens": 0,
+            "source_documents": [],
+            "num_sources": 0,
+            "retrieval": "digest",
+            "intent": intent,
             "study_id_filter": study_id
         }
     
-    def list_studies(self, user_id: Optional[str] = None) -> List[Dict]:
-        """List all studies or studies for a specific user"""
-        
-        conn = sqlite3.connect(self.db_path)
-        
-        if user_id:
-            cursor = conn.execute(
-                "SELECT study_id, title, description, uploaded_at FROM studies WHERE user_id = ?",
-                (user_id,)
-            )
+    def _prepare_query(self,
+                       question: str,
+                       study_id: Optional[str],
+                       top_k: int,
+                       use_cache: bool) -> Dict:
+        """Steps shared by every query mode: retrieve, check the answer cache, build the prompt"""
+        # A digest answer is returned as is, like a cached one
+        answer = self._digest_answer(question, study_id)
+        if answer is not None:
+            return {"cached": answer}
+        
+        question_hash = hashlib.sha256(question.encode('utf-8')).hexdigest()
+        
+        # Exact lookups (a function or column name) are settled lexically,
+        # without embedding the question or searching vectors
+        lexical_docs, decisive = [], False
+        if self.lexical_params['enabled']:
+            lexical_docs, decisive = self._lexical_search(question, study_id, top_k)
+        embedding = None if decisive else self._embed_question(question, question_hash, use_cache)
+        
+        if use_cache:
+            cached = self.answer_cache.get(study_id, embedding, question=question)
+            if cached is not None:
+                matched_question, result = cached
+                return {"cached": dict(result, question=question, cached_from=matched_question)}
+        
+        if decisive:
+            relevant_docs = lexical_docs
         else:
-            cursor = conn.execute(
-                "SELECT study_id, title, description, uploaded_at FROM studies"
-            )
-        
-        studies = []
-        for row in cursor.fetchall():
-            studies.append({
-                "study_id": row[0],
-                "title": row[1],
-                "description": row[2],
-                "uploaded_at": row[3]
-            })
-        
-        conn.close()
-        return studies
+            # Retrieve relevant context from vector database
+            relevant_docs = self._retrieve(question_hash, embedding, study_id, top_k, use_cache, lexical_docs)
+        context_docs, context_tokens = self._assemble_context(relevant_docs)
+        context, prompt = self._build_prompt(question, context_docs)
+        return {
+            "cached": None,
+            "embedding": embedding,
+            "relevant_docs": relevant_docs,
+            "context": context,
+            "context_tokens": context_tokens,
+            "retrieval": "lexical" if decisive else "hybrid" if lexical_docs else "vector",
+            "prompt": prompt
+        }
     
-    def get_study_details(self, study_id: str) -> Optional[Dict]:
-        """Get detailed information about a specific study"""
+    def _finish_query(self,
+                      question: str,
+                      study_id: Optional[str],
+                      prepared: Dict,
+                      llm_response: str,
+                      use_cache: bool) -> Dict:
+        result = {
+            "question": question,
+            "answer": llm_response,
+            "context_used": prepared["context"],
+            "context_tokens": prepared["context_tokens"],
+            "source_documents": self._source_documents(prepared["relevant_docs"]),
+            "num_sources": len(prepared["relevant_docs"]),
+            "retrieval": prepared["retrieval"],
+            "study_id_filter": study_id
+        }
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.execute(
-            "SELECT * FROM studies WHERE study_id = ?",
-            (study_id,)
-        )
+        # GeminiLLM reports failures as text; don't serve those from cache
+        if use_cache and not llm_response.startswith("Error generating response"):
+            self.answer_cache.put(study_id, question, prepared["embedding"], result)
+        return result
+    
+    def query_study(self, 
+                   question: str, 
+                   study_id: Optional[str] = None,
+                   top_k: int = 5,
+                   use_cache: bool = True,
+                   stream: bool = False):
+        """Query the RAG system with LLM-generated explanations
+        
+        Stock questions about one study (statistical methods, dataset shape,
+        missing data, functions) are answered from its digest without
+        retrieval or the LLM; see digest_params.
+        
+        Chunks are retrieved by BM25 and vector search fused by reciprocal
+        rank; when the BM25 match is decisive (see _lexical_search) the
+        question is not embedded at all. Question embeddings and retrieval
+        results are cached exactly; answers are reused for the same question,
+        or any earlier question about the same study whose embedding is
+        within cache_params['answer_similarity'].
+        
+        With stream=True, returns a generator of events instead of a result:
+        {"type": "sources", ...} first, then {"type": "token", "text": ...}
+        as the LLM produces them, then {"type": "done", "result": ...}.
+        """
+        if stream:
+            return self._query_study_stream(question, study_id, top_k, use_cache)
         
-        row = cursor.fetchone()
-        conn.close()
+        prepared = self._prepare_query(question, study_id, top_k, use_cache)
+        if prepared["cached"] is not None:
+            return prepared["cached"]
         
-        if not row:
-            return None
+        llm_response = self.llm.generate_response(prepared["prompt"], max_tokens=500)
+        return self._finish_query(question, study_id, prepared, llm_response, use_cache)
+    
+    def _query_study_stream(self,
+                            question: str,
+                            study_id: Optional[str],
+                            top_k: int,
+                            use_cache: bool) -> Iterator[Dict]:
+        prepared = self._prepare_query(question, study_id, top_k, use_cache)
+        
+        cached = prepared["cached"]
+        if cached is not None:
+            yield {"type": "sources", "source_documents": cached["source_documents"],
+                   "num_sources": cached["num_sources"]}
+            yield {"type": "token", "text": cached["answer"]}
+            yield {"type": "done", "result": cached}
+            return
+        
+        # Sources are known before generation starts, so send them right away
+        yield {"type": "sources", "source_documents": self._source_documents(prepared["relevant_docs"]),
+               "num_sources": len(prepared["relevant_docs"])}
+        
+        pieces = []
+        failed = False
+        try:
+            for text in self.llm.generate_stream(prepared["prompt"], max_tokens=500):
+                pieces.append(text)
+                yield {"type": "token", "text": text}
+        except Exception as e:
+            # The answer so far is partial: report the error, but never cache it
+            failed = True
+            error = f"Error generating response: {str(e)}"
+            pieces.append(f"\n{error}" if pieces else error)
+            yield {"type": "token", "text": pieces[-1]}
+        
+        yield {"type": "done",
+               "result": self._finish_query(question, study_id, prepared, "".join(pieces).strip(),
+                                            use_cache and not failed)}
+    
+    async def aquery_study(self,
+                           question: str,
+                           study_id: Optional[str] = None,
+                           top_k: int = 5,
+                           use_cache: bool = True) -> Dict:
+        """Async query_study, so several queries can wait on the LLM at once"""
+        # Embedding and retrieval are CPU/disk bound; keep them off the event loop
+        prepared = await asyncio.to_thread(self._prepare_query, question, study_id, top_k, use_cache)
+        if prepared["cached"] is not None:
+            return prepared["cached"]
+        
+        llm_response = await self.llm.agenerate_response(prepared["prompt"], max_tokens=500)
+        return self._finish_query(question, study_id, prepared, llm_response, use_cache)
+    
+    def list_studies(self, user_id: Optional[str] = None) -> List[Dict]:
+        """List all studies or studies for a specific user, newest first"""
+        return list(self.metadata_store.iter_studies(user_id=user_id))
+    
+    def list_studies_page(self,
+                          user_id: Optional[str] = None,
+                          limit: int = 50,
+                          cursor: Optional[str] = None) -> Dict:
+        """One page of studies; pass next_cursor back in to get the following page"""
+        studies, next_cursor = self.metadata_store.list_page(user_id=user_id, limit=limit, cursor=cursor)
+        return {"studies": studies, "next_cursor": next_cursor}
+    
+    def search_studies(self,
+                       query: str,
+                       user_id: Optional[str] = None,
+                       limit: int = 20,
+                       cursor: Optional[str] = None) -> Dict:
+        """Full-text search over study titles, descriptions, function, import
+        and column names, best match first, with a highlighted snippet per study
+    
+        Served from the metadata database alone; the vector store and
+        embedding model are not used. Paginate like list_studies_page.
+        """
+        studies, next_cursor = self.metadata_store.search(query, user_id=user_id, limit=limit, cursor=cursor)
+        return {"studies": studies, "next_cursor": next_cursor}
+    
+    def find_similar_studies(self,
+                             study_id: str,
+                             threshold: float = 0.5,
+                             limit: int = 10) -> List[Dict]:
+        """Candidate near-duplicates of a study, most similar first
+        
+        Candidates come from MinHash-LSH buckets over dataset rows and
+        normalized code tokens, so the cost depends on the number of
+        colliding studies rather than the corpus size. Each result carries
+        estimated Jaccard similarities for the dataset and the code.
+        """
+        return self.metadata_store.similar(study_id, threshold=threshold, limit=limit)
+    
+    def iter_studies(self, user_id: Optional[str] = None, batch_size: int = 1000):
+        """Stream studies without loading the whole listing into memory"""
+        return self.metadata_store.iter_studies(user_id=user_id, batch_size=batch_size)
+    
+    def get_study_details(self, study_id: str, fields: Optional[List[str]] = None) -> Optional[Dict]:
+        """Get detailed information about a specific study
         
-        return {
-            "study_id": row[0],
-            "title": row[1],
-            "description": row[2],
-            "uploaded_at": row[3],
-            "file_paths": json.loads(row[4]),
-            "user_id": row[5],
-            "csv_summary": json.loads(row[6]),
-            "python_analysis": json.loads(row[7])
-        }
+        fields limits what is loaded, e.g. ['title', 'csv_summary.columns'];
+        see MetadataStore.get.
+        """
+        return self.metadata_store.get(study_id, fields=fields)
     
     def save_model(self):
         """Save the RAG system state"""
@@ -657,6 +1564,7 @@ Answer:"""
             "chroma_path": self.chroma_path,
             "db_path": self.db_path,
             "llm_type": type(self.llm).__name__,
+            "vector_backend": self.vector_backend,
             "saved_at": datetime.now().isoformat()
         }
         
@@ -683,7 +1591,8 @@ Answer:"""
         instance = cls(
             base_path=base_path,
             embedding_model=model_info["embedding_model_name"],
-            llm=llm
+            llm=llm,
+            vector_backend=model_info.get("vector_backend", "chroma")
         )
         
         # Load the processor
@@ -692,117 +1601,101 @@ Answer:"""
         
         print(f"Model loaded from {base_path}")
         return instance
-
-# ==================== CELL 3: Create Sample Data for Testing ====================
-
-# Create sample CSV data
-sample_csv_data = """patient_id,age,gender,bmi,vitamin_d,blood_pressure,diabetes,cholesterol
-P001,45,M,28.5,25.3,140/90,0,220
-P002,52,F,31.2,18.7,150/95,1,280
-P003,38,M,24.1,32.8,120/80,0,180
-P004,61,F,29.8,15.2,160/100,1,320
-P005,33,M,22.3,28.9,110/70,0,160
-P006,47,F,35.6,12.4,170/110,1,340
-P007,29,M,26.7,30.1,125/85,0,190
-P008,55,F,28.9,19.8,145/92,1,290
-P009,42,M,25.4,26.7,135/88,0,200
-P010,36,F,30.2,21.5,155/98,1,250"""
-
-# Create sample Python analysis code
-sample_python_code = '''
-import pandas as pd
-import numpy as np
-from scipy import stats
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-# Load patient data for BMI and Vitamin D correlation study
-df = pd.read_csv("patient_data.csv")
-
-def analyze_bmi_vitamin_correlation():
-    """
-    Analyze correlation between BMI and Vitamin D levels in patients
-    Uses Pearson correlation coefficient
-    Returns correlation coefficient and p-value for statistical significance
-    """
-    # Filter out missing values for clean analysis
-    df_clean = df.dropna(subset=["bmi", "vitamin_d"])
-    correlation, p_value = stats.pearsonr(df_clean["bmi"], df_clean["vitamin_d"])
-    return correlation, p_value
-def plot_bmi_distribution():
-    """ 
-    Plot distribution of BMI values in the dataset
-    """
-    plt.figure(figsize=(10, 6))
-    sns.histplot(df["bmi"], bins=20, kde=True)
-    plt.title("BMI Distribution")
-    plt.xlabel("BMI")
-    plt.ylabel("Frequency")
-    plt.show()
-def plot_vitamin_d_distribution():
-    """
-
-    Plot distribution of Vitamin D levels in the dataset
-    """
-    plt.figure(figsize=(10, 6))
-    sns.histplot(df["vitamin_d"], bins=20, kde=True)
-    plt.title("Vitamin D Distribution")
-    plt.xlabel("Vitamin D Level")
-    plt.ylabel("Frequency")
-    plt.show()
-def main():
-    # Perform analysis and plot distributions
-    correlation, p_value = analyze_bmi_vitamin_correlation()
-    print(f"Correlation between BMI and Vitamin D: {correlation}, p-value: {p_value}")
-    plot_bmi_distribution()
-    plot_vitamin_d_distribution()
-if __name__ == "__main__":
-    main()
-'''
-# Save sample data to files
-with open('/content/drive/MyDrive/medical_rag_system/data/sample_data.csv', 'w') as f:
-    f.write(sample_csv_data)
-with open('/content/drive/MyDrive/medical_rag_system/data/sample_analysis.py', 'w') as f:
-    f.write(sample_python_code)
-# ==================== CELL 4: Initialize and Test the RAG System ====================
-# Initialize the RAG system
-rag_system = MedicalRAGSystem(
-    base_path='/content/drive/MyDrive/medical_rag_system',
-    embedding_model='all-MiniLM-L6-v2',
-    llm=GeminiLLM(apikey= "YOUR_GEMINI_API_KEY")
-)
-# Ingest sample study
-study_id = rag_system.ingest_study(
-    python_file='/content/drive/MyDrive/medical_rag_system/data/sample_analysis.py',
-    csv_file='/content/drive/MyDrive/medical_rag_system/data/sample_data.csv',
-    title='BMI and Vitamin D Correlation Study',
-    description='A study analyzing the correlation between BMI and Vitamin D levels in patients.',
-    user_id='user_123'
-)
-print(f"Study ingested with ID: {study_id}")
-# Query the system
-query_result = rag_system.query_study(
-    question="What statistical methods were used in the analysis?",
-    study_id=study_id
-)
-print("Query Result:")
-print(json.dumps(query_result, indent=2))
-# List all studies
-studies = rag_system.list_studies()
-print("All Studies:")
-print(json.dumps(studies, indent=2))
-# Get details of a specific study
-study_details = rag_system.get_study_details(study_id)
-print("Study Details:")
-print(json.dumps(study_details, indent=2))
-# Save the model state
-model_info = rag_system.save_model()
-print("Model saved with info:")
-print(json.dumps(model_info, indent=2))
-# Load the model
-loaded_rag_system = MedicalRAGSystem.load_model(
-    base_path='/content/drive/MyDrive/medical_rag_system',
-    llm=GeminiLLM(apikey= "YOUR_GEMINI_API_KEY")
-)
-print("Loaded RAG system:")
-print(json.dumps(loaded_rag_system.save_model(), indent=2))
\ No newline at end of file
+    
+    def save_snapshot(self, snapshot_dir: str, batch_size: int = 10_000) -> Dict:
+        """Write a self-contained, versioned and checksummed snapshot of the index
+        
+        The snapshot is laid out as a base_path for the mmap_hnsw backend, so
+        restore_snapshot serves it as is: vectors are memory-mapped, and
+        nothing is re-embedded or re-parsed. It cannot be written inside
+        this system's own base_path, whose files are open, nor over the
+        snapshot this system was restored from, whose vectors it maps.
+        """
+        from langchain.schema import Document
+        from vector_index import MmapHNSWStore
+        
+        base_path = os.path.realpath(self.base_path)
+        target = os.path.realpath(snapshot_dir)
+        if os.path.commonpath([base_path, target]) in (base_path, target):
+            raise SnapshotError(f"Snapshot directory {snapshot_dir} overlaps the live index at {self.base_path}")
+        base_directory = getattr(self.vectorstore, "base_directory", None)
+        if base_directory and os.path.commonpath([os.path.realpath(base_directory), target]) == target:
+            raise SnapshotError(f"Snapshot directory {snapshot_dir} holds the vectors this index was restored from")
+        
+        staging = f"{snapshot_dir}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        index_dir = os.path.join(staging, "vector_index")
+        
+        if isinstance(self.vectorstore, MmapHNSWStore):
+            self.vectorstore.snapshot_to(index_dir)
+            num_chunks = len(self.vectorstore)
+        else:
+            # Copy chunks together with their stored embeddings
+            store = MmapHNSWStore(index_dir, self.embeddings)
+            offset = 0
+            while True:
+                batch = self.vectorstore.get(
+                    include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=offset
+                )
+                if not batch["ids"]:
+                    break
+                store.add_embeddings(
+                    batch["ids"],
+                    [Document(page_content=text, metadata=metadata)
+                     for text, metadata in zip(batch["documents"], batch["metadatas"])],
+                    batch["embeddings"]
+                )
+                offset += len(batch["ids"])
+            store.persist()
+            num_chunks = len(store)
+            store.close()
+        
+        os.makedirs(os.path.join(staging, "chroma_db"))
+        self.metadata_store.backup_to(os.path.join(staging, "chroma_db", "studies.db"))
+        with open(os.path.join(staging, "processor.pkl"), "wb") as f:
+            pickle.dump(self.processor, f)
+        
+        manifest = write_manifest(staging, {
+            "embedding_model_name": self.embedding_model_name,
+            "vector_backend": "mmap_hnsw",
+            "num_chunks": num_chunks,
+            "num_studies": self.metadata_store.count()
+        })
+        publish(staging, snapshot_dir)
+        print(f"Snapshot saved to {snapshot_dir}")
+        return manifest
+    
+    @classmethod
+    def restore_snapshot(cls,
+                         snapshot_dir: str,
+                         base_path: str,
+                         llm: Optional[BaseLLM] = None,
+                         verify: bool = False):
+        """Serve a RAG system from a snapshot written by save_snapshot
+        
+        The snapshot's vectors and graph are mapped read-only from the
+        snapshot, which must stay in place; its other files are copied into
+        base_path (which must be new or empty). Later ingests write only to
+        base_path, never to the snapshot. The format version and file sizes
+        are always checked; verify=True also re-hashes every file first.
+        """
+        from vector_index import MmapHNSWStore
+        
+        manifest = read_manifest(snapshot_dir, checksums=verify)
+        index_dir = os.path.join(snapshot_dir, "vector_index")
+        copy_out(
+            snapshot_dir,
+            manifest,
+            base_path,
+            shared=[os.path.join("vector_index", name) for name in MmapHNSWStore.BASE_FILES],
+            prepare=lambda staging: MmapHNSWStore.link_base(os.path.join(staging, "vector_index"), index_dir)
+        )
+        instance = cls(
+            base_path=base_path,
+            embedding_model=manifest["embedding_model_name"],
+            llm=llm,
+            vector_backend=manifest["vector_backend"]
+        )
+        with open(os.path.join(base_path, "processor.pkl"), "rb") as f:
+            instance.processor = pickle.load(f)
+        return instance
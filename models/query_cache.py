@@ -0,0 +1,129 @@
+# In-memory caches for the RAG query path
+
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ttl seconds"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def peek_items(self, predicate: Callable[[Hashable], bool]) -> List[Tuple[Hashable, Any]]:
+        """Live entries whose key matches predicate, without touching LRU order or stats"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (key, value) for key, (stored_at, value) in self._entries.items()
+                if now - stored_at <= self.ttl and predicate(key)
+            ]
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches predicate; returns how many"""
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+class SemanticAnswerCache:
+    """Answers keyed by question embedding, per study
+
+    A lookup hits when a cached question for the same study has cosine
+    similarity of at least threshold with the new one, so rephrasings of a
+    common question reuse its answer.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600, threshold: float = 0.95):
+        self.threshold = threshold
+        # key: (study_id, question) -> (unit embedding or None, answer)
+        self._cache = TTLCache(max_entries=max_entries, ttl=ttl)
+
+    @staticmethod
+    def _unit(embedding: Optional[List[float]]) -> Optional[np.ndarray]:
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def get(self,
+            study_id: Optional[str],
+            embedding: Optional[List[float]],
+            question: Optional[str] = None) -> Optional[Tuple[str, Any]]:
+        """(cached question, answer) for the same question, else the closest
+        match above threshold, or None
+
+        Without an embedding only the exact question can match.
+        """
+        candidates = self._cache.peek_items(lambda key: key[0] == study_id)
+        best_key = next((key for key, _ in candidates if key[1] == question), None)
+        if best_key is None and embedding is not None:
+            candidates = [(key, vector) for key, (vector, _) in candidates if vector is not None]
+            if candidates:
+                scores = np.stack([vector for _, vector in candidates]) @ self._unit(embedding)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    best_key = candidates[best][0]
+        if best_key is None:
+            self._cache.misses += 1
+            return None
+        # get() refreshes the match's LRU position and counts the hit
+        cached = self._cache.get(best_key)
+        if cached is None:
+            return None
+        return best_key[1], cached[1]
+
+    def put(self, study_id: Optional[str], question: str, embedding: Optional[List[float]], answer: Any):
+        self._cache.put((study_id, question), (self._unit(embedding), answer))
+
+    def invalidate(self, study_ids: List[Optional[str]]) -> int:
+        return self._cache.invalidate(lambda key: key[0] in study_ids)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict:
+        return self._cache.stats()
@@ -0,0 +1,151 @@
+# End-to-end demo of the medical RAG system (formerly cells 3-4 of the Colab notebook)
+#
+#   python rag_demo.py --api-key YOUR_GEMINI_API_KEY
+#   python rag_demo.py --stub-llm --base-path /tmp/medical_rag_system
+
+import os
+import json
+import argparse
+from typing import List, Optional, Tuple
+
+from model import MedicalRAGSystem, GeminiLLM, StubLLM
+
+SAMPLE_CSV_DATA = """patient_id,age,gender,bmi,vitamin_d,blood_pressure,diabetes,cholesterol
+P001,45,M,28.5,25.3,140/90,0,220
+P002,52,F,31.2,18.7,150/95,1,280
+P003,38,M,24.1,32.8,120/80,0,180
+P004,61,F,29.8,15.2,160/100,1,320
+P005,33,M,22.3,28.9,110/70,0,160
+P006,47,F,35.6,12.4,170/110,1,340
+P007,29,M,26.7,30.1,125/85,0,190
+P008,55,F,28.9,19.8,145/92,1,290
+P009,42,M,25.4,26.7,135/88,0,200
+P010,36,F,30.2,21.5,155/98,1,250"""
+
+SAMPLE_PYTHON_CODE = '''
+import pandas as pd
+import numpy as np
+from scipy import stats
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+# Load patient data for BMI and Vitamin D correlation study
+df = pd.read_csv("patient_data.csv")
+
+def analyze_bmi_vitamin_correlation():
+    """
+    Analyze correlation between BMI and Vitamin D levels in patients
+    Uses Pearson correlation coefficient
+    Returns correlation coefficient and p-value for statistical significance
+    """
+    # Filter out missing values for clean analysis
+    df_clean = df.dropna(subset=["bmi", "vitamin_d"])
+    correlation, p_value = stats.pearsonr(df_clean["bmi"], df_clean["vitamin_d"])
+    return correlation, p_value
+def plot_bmi_distribution():
+    """ 
+    Plot distribution of BMI values in the dataset
+    """
+    plt.figure(figsize=(10, 6))
+    sns.histplot(df["bmi"], bins=20, kde=True)
+    plt.title("BMI Distribution")
+    plt.xlabel("BMI")
+    plt.ylabel("Frequency")
+    plt.show()
+def plot_vitamin_d_distribution():
+    """
+
+    Plot distribution of Vitamin D levels in the dataset
+    """
+    plt.figure(figsize=(10, 6))
+    sns.histplot(df["vitamin_d"], bins=20, kde=True)
+    plt.title("Vitamin D Distribution")
+    plt.xlabel("Vitamin D Level")
+    plt.ylabel("Frequency")
+    plt.show()
+def main():
+    # Perform analysis and plot distributions
+    correlation, p_value = analyze_bmi_vitamin_correlation()
+    print(f"Correlation between BMI and Vitamin D: {correlation}, p-value: {p_value}")
+    plot_bmi_distribution()
+    plot_vitamin_d_distribution()
+if __name__ == "__main__":
+    main()
+'''
+
+
+def write_sample_data(data_dir: str) -> Tuple[str, str]:
+    """Writes the sample dataset and analysis script, returning (python_file, csv_file)"""
+    os.makedirs(data_dir, exist_ok=True)
+    csv_file = os.path.join(data_dir, 'sample_data.csv')
+    python_file = os.path.join(data_dir, 'sample_analysis.py')
+    with open(csv_file, 'w') as f:
+        f.write(SAMPLE_CSV_DATA)
+    with open(python_file, 'w') as f:
+        f.write(SAMPLE_PYTHON_CODE)
+    return python_file, csv_file
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Ingest and query a sample study")
+    parser.add_argument('--base-path', default='/content/drive/MyDrive/medical_rag_system',
+                        help="Directory for the vector store, metadata and sample data")
+    parser.add_argument('--api-key', default=os.environ.get('GEMINI_API_KEY'),
+                        help="Gemini API key (default: $GEMINI_API_KEY)")
+    parser.add_argument('--stub-llm', action='store_true', help="Use the offline StubLLM instead of Gemini")
+    args = parser.parse_args(argv)
+
+    if not args.stub_llm and not args.api_key:
+        parser.error("--api-key (or $GEMINI_API_KEY) is required unless --stub-llm is given")
+
+    def make_llm():
+        return StubLLM() if args.stub_llm else GeminiLLM(api_key=args.api_key)
+
+    os.makedirs(os.path.join(args.base_path, 'models'), exist_ok=True)
+    python_file, csv_file = write_sample_data(os.path.join(args.base_path, 'data'))
+
+    # Initialize the RAG system
+    rag_system = MedicalRAGSystem(
+        base_path=args.base_path,
+        embedding_model='all-MiniLM-L6-v2',
+        llm=make_llm()
+    )
+    # Ingest sample study
+    study_id = rag_system.ingest_study(
+        python_file=python_file,
+        csv_file=csv_file,
+        title='BMI and Vitamin D Correlation Study',
+        description='A study analyzing the correlation between BMI and Vitamin D levels in patients.',
+        user_id='user_123'
+    )
+    print(f"Study ingested with ID: {study_id}")
+    # Query the system
+    query_result = rag_system.query_study(
+        question="What statistical methods were used in the analysis?",
+        study_id=study_id
+    )
+    print("Query Result:")
+    print(json.dumps(query_result, indent=2))
+    # List all studies
+    studies = rag_system.list_studies()
+    print("All Studies:")
+    print(json.dumps(studies, indent=2))
+    # Get details of a specific study
+    study_details = rag_system.get_study_details(study_id)
+    print("Study Details:")
+    print(json.dumps(study_details, indent=2))
+    # Save the model state
+    model_info = rag_system.save_model()
+    print("Model saved with info:")
+    print(json.dumps(model_info, indent=2))
+    # Load the model
+    loaded_rag_system = MedicalRAGSystem.load_model(
+        base_path=args.base_path,
+        llm=make_llm()
+    )
+    print("Loaded RAG system:")
+    print(json.dumps(loaded_rag_system.save_model(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
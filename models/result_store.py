@@ -0,0 +1,137 @@
+import os
+import json
+import pickle
+import sqlite3
+import hashlib
+import weakref
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from hashing import file_digest
+
+
+class ResultStore:
+    """Content-addressed on-disk cache for validation and comparison results
+
+    Entries are keyed by hashes of the input file contents plus the checker
+    configuration, so a result stays valid for as long as neither changes.
+    Backed by SQLite in WAL mode, which makes it safe to share between processes.
+    """
+
+    # Bump when the cached result format or scoring logic changes
+    FORMAT_VERSION = 1
+
+    # Per-entry hit counts are kept in memory and written once this many
+    # hits are pending (or by flush_hits/stats), so a hit is a read only
+    HIT_FLUSH_EVERY = 256
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.db_path = os.path.join(cache_dir, "results.db")
+        self.hits = 0
+        self.misses = 0
+        self._pending_hits: Counter = Counter()
+        self._hits_lock = threading.Lock()
+        # Hits still pending when the store is collected or the process exits
+        weakref.finalize(self, self._write_hits, self.db_path, self._pending_hits, self._hits_lock)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                kind TEXT,
+                value BLOB,
+                created_at REAL DEFAULT (julianday('now')),
+                hits INTEGER DEFAULT 0
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Generous timeout so concurrent writers wait instead of failing
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    file_digest = staticmethod(file_digest)
+
+    def make_key(self, kind: str, config: Dict, *parts: str) -> str:
+        """Builds a cache key from the result kind, configuration and input hashes"""
+        payload = json.dumps(
+            {'version': self.FORMAT_VERSION, 'kind': kind, 'config': config, 'parts': parts},
+            sort_keys=True,
+            default=str
+        )
+        return f"{kind}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def get(self, key: str) -> Optional[Any]:
+        """Returns the cached value for key, or None on a miss"""
+        conn = self._connect()
+        row = conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        conn.close()
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self._hits_lock:
+            self._pending_hits[key] += 1
+            flush = sum(self._pending_hits.values()) >= self.HIT_FLUSH_EVERY
+        if flush:
+            self.flush_hits()
+        return pickle.loads(row[0])
+
+    def flush_hits(self):
+        """Adds the hits counted in memory to the per-entry totals on disk"""
+        self._write_hits(self.db_path, self._pending_hits, self._hits_lock)
+
+    @staticmethod
+    def _write_hits(db_path: str, pending_hits: Counter, lock: threading.Lock):
+        with lock:
+            pending = list(pending_hits.items())
+            pending_hits.clear()
+        if not pending:
+            return
+        conn = sqlite3.connect(db_path, timeout=30)
+        conn.executemany("UPDATE results SET hits = hits + ? WHERE key = ?", [
+            (count, key) for key, count in pending
+        ])
+        conn.commit()
+        conn.close()
+
+    def put(self, key: str, value: Any):
+        """Stores value under key, replacing any previous entry"""
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO results (key, kind, value) VALUES (?, ?, ?)",
+            (key, key.split(':', 1)[0], pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        )
+        conn.commit()
+        conn.close()
+
+    def clear(self):
+        """Removes every cached entry"""
+        conn = self._connect()
+        conn.execute("DELETE FROM results")
+        conn.commit()
+        conn.close()
+
+    def stats(self) -> Dict:
+        """Hit statistics for this process plus totals stored on disk"""
+        self.flush_hits()
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT kind, COUNT(*), COALESCE(SUM(hits), 0) FROM results GROUP BY kind"
+        ).fetchall()
+        conn.close()
+
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': {kind: count for kind, count, _ in rows},
+            'lifetime_hits': {kind: hits for kind, _, hits in rows}
+        }
@@ -0,0 +1,384 @@
+# Mergeable streaming sketches for single-pass dataset profiling
+#
+# Every sketch supports update(chunk) and merge(other), so a file can be
+# profiled chunk by chunk (or column group by column group) in memory that
+# grows with the number of columns, not the number of rows.
+
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class Moments:
+    """Exact count, mean, variance, min and max (Chan et al. parallel merge)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values: np.ndarray):
+        if len(values) == 0:
+            return
+        other = Moments()
+        other.count = len(values)
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other: 'Moments'):
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self) -> Optional[float]:
+        # Sample standard deviation, as in pandas.describe()
+        if self.count < 2:
+            return None
+        return float(np.sqrt(self.m2 / (self.count - 1)))
+
+
+class TDigest:
+    """Merging t-digest for approximate quantiles
+
+    Centroids are re-bucketed with the arcsine scale function after every
+    update, fully vectorized. Small inputs stay as singleton centroids, so
+    quantiles are exact (pandas' linear interpolation) until compression kicks in.
+    """
+
+    def __init__(self, compression: float = 100):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+    def update(self, values: np.ndarray):
+        if len(values) == 0:
+            return
+        self._compress(
+            np.concatenate((self.means, values.astype(float))),
+            np.concatenate((self.weights, np.ones(len(values))))
+        )
+
+    def merge(self, other: 'TDigest'):
+        if len(other.means) == 0:
+            return
+        self._compress(
+            np.concatenate((self.means, other.means)),
+            np.concatenate((self.weights, other.weights))
+        )
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+
+        # Bucket each centroid by the scale function at its quantile midpoint;
+        # buckets are narrow at the tails and wide around the median
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        buckets = np.floor(k).astype(np.int64)
+        starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+
+        merged_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / merged_weights
+        self.weights = merged_weights
+
+    def quantile(self, q: float, lo: float, hi: float) -> Optional[float]:
+        """Approximate q-quantile, given the exact min/max of the data"""
+        if len(self.means) == 0:
+            return None
+        n = self.weights.sum()
+        # 0-based row index at the centre of each centroid
+        centers = np.cumsum(self.weights) - (self.weights + 1) / 2
+        positions = np.concatenate(([0.0], centers, [n - 1]))
+        values = np.concatenate(([lo], self.means, [hi]))
+        return float(np.interp((n - 1) * q, positions, values))
+
+
+class HyperLogLog:
+    """HyperLogLog distinct-count sketch over pandas' vectorized value hashes"""
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values: pd.Series):
+        if len(values) == 0:
+            return
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+        # Rank = position of the leftmost 1-bit in the remaining 64 - p bits
+        _, exponent = np.frexp(rest.astype(float))
+        rank = np.where(rest == 0, 64 - p + 1, 64 - p - exponent + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: 'HyperLogLog'):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(2.0 ** -self.registers.astype(float))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is far more accurate for small cardinalities
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+class MinHash:
+    """MinHash signature of a set of 64-bit hashes (mergeable)
+
+    Slot i keeps the minimum of (a_i * x + b_i) mod p over the set, with x
+    the input hash folded to 32 bits, so the fraction of equal slots between
+    two signatures estimates the Jaccard similarity of their sets. The
+    coefficients come from a fixed seed, so signatures built in different
+    processes are comparable.
+    """
+
+    PRIME = 4294967291  # largest prime below 2**32; a * x + b fits in uint64
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, self.PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, self.PRIME, size=num_perm, dtype=np.uint64)
+        self.signature = np.full(num_perm, self.PRIME, dtype=np.uint64)
+
+    def update(self, hashes: np.ndarray, batch_size: int = 4096):
+        if len(hashes) == 0:
+            return
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        folded = (hashes >> np.uint64(32)) ^ (hashes & np.uint64(0xFFFFFFFF))
+        # Batched so the (num_perm, batch) block stays a few MB
+        for start in range(0, len(folded), batch_size):
+            x = folded[start:start + batch_size]
+            values = (self.a[:, None] * x[None, :] + self.b[:, None]) % np.uint64(self.PRIME)
+            np.minimum(self.signature, values.min(axis=1), out=self.signature)
+
+    def merge(self, other: 'MinHash'):
+        np.minimum(self.signature, other.signature, out=self.signature)
+
+    @property
+    def is_empty(self) -> bool:
+        return bool(np.all(self.signature == self.PRIME))
+
+    def jaccard(self, other: 'MinHash') -> float:
+        return float(np.mean(self.signature == other.signature))
+
+    def tolist(self) -> List[int]:
+        """Plain ints for storage; empty when nothing was added"""
+        return [] if self.is_empty else self.signature.tolist()
+
+
+def row_hashes(frame: pd.DataFrame) -> np.ndarray:
+    """64-bit hash per row of a canonical form of its values
+
+    Numbers hash as float64 whatever their chunk was parsed as (int64,
+    float64 once a NaN turns up, or numeric text in an object chunk) and
+    everything else as text, so equal rows hash equally in any chunk.
+    """
+    combined = np.zeros(len(frame), dtype=np.uint64)
+    for col in frame.columns:
+        values = frame[col]
+        if pd.api.types.is_bool_dtype(values):
+            hashes = pd.util.hash_array(values.astype(str).to_numpy(dtype=object))
+        elif pd.api.types.is_numeric_dtype(values):
+            hashes = pd.util.hash_array(values.to_numpy(dtype=np.float64, na_value=np.nan))
+        else:
+            numbers = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+            is_text = np.isnan(numbers) & values.notna().to_numpy()
+            hashes = pd.util.hash_array(numbers)
+            if is_text.any():
+                hashes[is_text] = pd.util.hash_array(values[is_text].astype(str).to_numpy(dtype=object))
+        # Order-dependent mix, so swapping values between columns changes the hash
+        combined = combined * np.uint64(0x100000001B3) ^ hashes
+    return combined
+
+
+class HeavyHitters:
+    """Misra-Gries frequent-items summary (mergeable)
+
+    Counts are exact while the number of distinct values stays within
+    capacity; beyond that they are lower bounds off by at most n / capacity,
+    and exact turns False.
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.counters: Dict[Any, int] = {}
+        self.exact = True
+
+    def update(self, values: pd.Series):
+        counts = values.value_counts()
+        if len(counts) > self.capacity:
+            # Reduce the chunk to its own summary first (vectorized), which
+            # keeps the merge cheap for high-cardinality columns
+            cut = counts.iloc[self.capacity]
+            counts = counts[counts > cut] - cut
+            self.exact = False
+        self._merge_counts(counts.to_dict())
+
+    def merge(self, other: 'HeavyHitters'):
+        self.exact = self.exact and other.exact
+        self._merge_counts(other.counters)
+
+    def _merge_counts(self, counts: Dict[Any, int]):
+        for value, count in counts.items():
+            self.counters[value] = self.counters.get(value, 0) + int(count)
+        if len(self.counters) > self.capacity:
+            self.exact = False
+            ranked = sorted(self.counters.values(), reverse=True)
+            cut = ranked[self.capacity]
+            self.counters = {
+                value: count - cut
+                for value, count in self.counters.items()
+                if count > cut
+            }
+
+    def top(self, n: int) -> Dict[Any, int]:
+        ranked = sorted(self.counters.items(), key=lambda item: item[1], reverse=True)
+        return dict(ranked[:n])
+
+
+def merge_dtypes(left: Optional[str], right: str) -> str:
+    """Common dtype of a column whose chunks were inferred separately"""
+    if left is None or left == right:
+        return right
+    try:
+        left_dtype, right_dtype = np.dtype(left), np.dtype(right)
+    except TypeError:
+        return 'object'
+    if left_dtype.kind in 'iuf' and right_dtype.kind in 'iuf':
+        return str(np.result_type(left_dtype, right_dtype))
+    return 'object'
+
+
+class ColumnProfile:
+    """All sketches for one column"""
+
+    def __init__(self):
+        self.dtype: Optional[str] = None
+        self.rows = 0
+        self.missing = 0
+        self.moments = Moments()
+        self.digest = TDigest()
+        self.distinct = HyperLogLog()
+        self.heavy_hitters = HeavyHitters()
+
+    def update(self, column: pd.Series):
+        if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+            self.update_numeric(column.to_numpy(dtype=float, na_value=np.nan), str(column.dtype))
+            return
+
+        self.dtype = merge_dtypes(self.dtype, str(column.dtype))
+        self.rows += len(column)
+        values = column.dropna()
+        self.missing += len(column) - len(values)
+        self.distinct.update(values)
+        self.heavy_hitters.update(values)
+
+    def update_numeric(self, values: np.ndarray, dtype: str):
+        """Update from a float64 array (NaN = missing) of a column with the given dtype"""
+        self.dtype = merge_dtypes(self.dtype, dtype)
+        self.rows += len(values)
+        present = values[~np.isnan(values)]
+        self.missing += len(values) - len(present)
+        # Hash as float so int and float chunks of a column agree
+        self.distinct.update(pd.Series(present))
+        self.moments.update(present)
+        self.digest.update(present)
+
+    def merge(self, other: 'ColumnProfile'):
+        if other.dtype is not None:
+            self.dtype = merge_dtypes(self.dtype, other.dtype)
+        self.rows += other.rows
+        self.missing += other.missing
+        self.moments.merge(other.moments)
+        self.digest.merge(other.digest)
+        self.distinct.merge(other.distinct)
+        self.heavy_hitters.merge(other.heavy_hitters)
+
+    @property
+    def is_mixed(self) -> bool:
+        """Some chunks were numeric and others text: the numeric ones reached
+        only the numeric sketches, so the text summary misses them"""
+        return not self.is_numeric and self.moments.count > 0
+
+    @property
+    def is_numeric(self) -> bool:
+        try:
+            return np.dtype(self.dtype).kind in 'iuf'
+        except TypeError:
+            return False
+
+    @property
+    def is_categorical(self) -> bool:
+        return not self.is_numeric and self.dtype != 'bool'
+
+    def numeric_stats(self) -> Dict:
+        m = self.moments
+        if m.count == 0:
+            return {key: None for key in ['mean', 'std', 'min', 'max', 'median', 'q25', 'q75']}
+        return {
+            'mean': m.mean,
+            'std': m.std,
+            'min': m.min,
+            'max': m.max,
+            'median': self.digest.quantile(0.5, m.min, m.max),
+            'q25': self.digest.quantile(0.25, m.min, m.max),
+            'q75': self.digest.quantile(0.75, m.min, m.max)
+        }
+
+    def categorical_stats(self) -> Dict:
+        top_values = self.heavy_hitters.top(10)
+        return {
+            'unique_count': self.distinct.count(),
+            'top_values': top_values,
+            'top_values_exact': self.heavy_hitters.exact,  # else counts are lower bounds
+            'most_common': str(next(iter(top_values))) if top_values else None
+        }
+
+
+def profile_shared_columns(
+    shm_name: str,
+    shape: Tuple[int, int],
+    column_indices: List[int],
+    dtypes: List[str]
+) -> List[Tuple[int, ColumnProfile]]:
+    """Worker entry point: profiles a group of columns of a shared float64 block
+
+    The block lives in shared memory in column-major order, so each column
+    is a contiguous buffer and nothing but names and indices is pickled.
+    """
+    try:
+        shm = shared_memory.SharedMemory(name=shm_name, track=False)
+    except TypeError:
+        # Python < 3.13 has no track argument; the segment is registered
+        # again, but with the parent's resource tracker (started before the
+        # pool, see MedicalDataProcessor._profile_chunks), where it already is
+        shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf, order='F')
+        results = []
+        for j, dtype in zip(column_indices, dtypes):
+            profile = ColumnProfile()
+            profile.update_numeric(block[:, j], dtype)
+            results.append((j, profile))
+        del block
+        return results
+    finally:
+        shm.close()
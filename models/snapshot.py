@@ -0,0 +1,110 @@
+# Versioned, checksummed snapshots of a RAG index directory
+
+import os
+import json
+import shutil
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional
+
+from hashing import file_digest
+
+# Bump when the snapshot layout changes
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is missing, incompatible or corrupted"""
+
+
+def write_manifest(snapshot_dir: str, info: Dict) -> Dict:
+    """Record the format version, info and size + SHA-256 of every file in the directory"""
+    files = {}
+    for root, _, names in os.walk(snapshot_dir):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, snapshot_dir)
+            if relative == MANIFEST_NAME:
+                continue
+            files[relative] = {
+                "bytes": os.path.getsize(path),
+                "sha256": file_digest(path)
+            }
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        **info,
+        "files": files
+    }
+    with open(os.path.join(snapshot_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(snapshot_dir: str, checksums: bool = False) -> Dict:
+    """Load and check a snapshot's manifest
+
+    File sizes are always checked; checksums=True also re-hashes every file,
+    which reads the whole snapshot and so is off the cold-start path by default.
+    """
+    manifest_path = os.path.join(snapshot_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        raise SnapshotError(f"No snapshot manifest in {snapshot_dir}")
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(
+            f"Snapshot format {manifest.get('format_version')} is not supported "
+            f"(expected {SNAPSHOT_FORMAT_VERSION})"
+        )
+    for relative, expected in manifest["files"].items():
+        path = os.path.join(snapshot_dir, relative)
+        if not os.path.exists(path):
+            raise SnapshotError(f"Snapshot file missing: {relative}")
+        if os.path.getsize(path) != expected["bytes"]:
+            raise SnapshotError(f"Snapshot file has the wrong size: {relative}")
+        if checksums and file_digest(path) != expected["sha256"]:
+            raise SnapshotError(f"Snapshot file checksum mismatch: {relative}")
+    return manifest
+
+
+def copy_out(snapshot_dir: str,
+             manifest: Dict,
+             base_path: str,
+             shared: Iterable[str] = (),
+             prepare: Optional[Callable[[str], None]] = None):
+    """Copy a snapshot's files into a new working directory
+
+    The snapshot itself is never written to, so it keeps matching its
+    manifest; the working copy is what later ingests modify. Files listed
+    in shared are not copied but read from the snapshot by their owner,
+    which prepare(staging_dir) sets up before the copy is moved into place.
+    """
+    if os.path.exists(base_path) and os.listdir(base_path):
+        raise SnapshotError(f"Restore target is not empty: {base_path}")
+    staging = f"{base_path}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    shared = set(shared)
+    for relative in manifest["files"]:
+        target = os.path.join(staging, relative)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if relative not in shared:
+            shutil.copy2(os.path.join(snapshot_dir, relative), target)
+    if prepare is not None:
+        prepare(staging)
+    if os.path.exists(base_path):
+        os.rmdir(base_path)
+    os.replace(staging, base_path)
+
+
+def publish(staging_dir: str, snapshot_dir: str):
+    """Move a completed staging directory into place, replacing any old snapshot"""
+    if os.path.exists(snapshot_dir):
+        retired = f"{snapshot_dir}.old"
+        shutil.rmtree(retired, ignore_errors=True)
+        os.replace(snapshot_dir, retired)
+        os.replace(staging_dir, snapshot_dir)
+        shutil.rmtree(retired, ignore_errors=True)
+    else:
+        os.replace(staging_dir, snapshot_dir)
@@ -0,0 +1,146 @@
+# Precomputed per-study digest and templated answers to stock questions
+
+import re
+from typing import Dict, List, Optional
+
+from lexical_index import STOPWORDS
+
+# Bump when the digest layout changes; older digests are not used for answers
+DIGEST_VERSION = 1
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Question words that change what is asked ("why were these tests used?")
+# stay in, so such questions go through retrieval; "how many" and "how
+# much" just ask for a count
+INTERROGATIVES = frozenset({'how', 'when', 'where', 'who', 'why'})
+DIGEST_STOPWORDS = STOPWORDS - INTERROGATIVES
+
+# Words that say nothing about which part of the study is asked about
+GENERIC_WORDS = frozenset("""
+all any analysis applied brief briefly code csv data dataset describe file give
+here key kind kinds list main please performed python script study summarize
+summary type types were we
+""".split())
+
+# Stock intents in the order they are tried. A question is routed to an
+# intent when it contains one of its triggers and every other word is a
+# stopword, a generic word or in the intent's vocabulary, so anything more
+# specific ("which test compares bmi by gender?") goes through retrieval.
+STOCK_INTENTS = {
+    'missing': {
+        'triggers': {'missing', 'missingness', 'null', 'nulls', 'nan', 'nans', 'incomplete'},
+        'words': {'cells', 'column', 'columns', 'count', 'entries', 'gaps', 'many', 'much',
+                  'per', 'value', 'values'}
+    },
+    'functions': {
+        'triggers': {'function', 'functions'},
+        'words': {'define', 'defined', 'defines', 'important', 'names'}
+    },
+    'methods': {
+        'triggers': {'method', 'methods', 'statistical', 'statistics', 'stats', 'technique',
+                     'techniques', 'test', 'tests'},
+        'words': {'analyses', 'approach', 'approaches', 'conducted', 'ran', 'run'}
+    },
+    'shape': {
+        'triggers': {'columns', 'dimensions', 'observations', 'records', 'rows', 'shape', 'size'},
+        'words': {'big', 'contain', 'contains', 'count', 'fields', 'large', 'many', 'number',
+                  'variables'}
+    }
+}
+
+
+def classify_intent(question: str) -> Optional[str]:
+    """The stock intent a question asks about, or None"""
+    words = set(WORD_PATTERN.findall(question.lower())) - DIGEST_STOPWORDS - GENERIC_WORDS
+    if words & {'many', 'much'}:
+        words.discard('how')
+    for intent, vocabulary in STOCK_INTENTS.items():
+        if words & vocabulary['triggers'] and not words - vocabulary['triggers'] - vocabulary['words']:
+            return intent
+    return None
+
+
+def build_digest(csv_summary: Dict, python_analysis: Dict, max_items: int = 50) -> Dict:
+    """Compact structured summary of a study, from asdict() of its
+    CSVSummary and PythonAnalysis"""
+    n_rows = csv_summary['shape'][0]
+    missing = sorted(csv_summary['missing_values'].items(), key=lambda item: (-item[1], item[0]))
+    return {
+        'version': DIGEST_VERSION,
+        'csv_file': csv_summary['filename'],
+        'python_file': python_analysis['filename'],
+        'rows': n_rows,
+        'columns': len(csv_summary['columns']),
+        'column_names': [str(col) for col in csv_summary['columns'][:max_items]],
+        'date_columns': csv_summary['date_columns'],
+        'identifiers': csv_summary['potential_identifiers'],
+        'missing': [[str(col), count] for col, count in missing[:max_items]],
+        'missing_columns': len(missing),
+        'missing_cells': sum(count for _, count in missing),
+        'statistical_methods': python_analysis['statistical_methods'],
+        'data_operations': python_analysis['data_operations'],
+        'visualizations': python_analysis['visualizations'],
+        'functions': [
+            {'name': function['name'], 'summary': function['docstring'].strip().split('\n')[0]}
+            for function in python_analysis['functions'][:max_items]
+        ],
+        'function_count': len(python_analysis['functions']),
+        'imports': python_analysis['imports'][:max_items]
+    }
+
+
+def _names(names: List[str], total: int) -> str:
+    listed = ', '.join(names)
+    return f"{listed} (+{total - len(names)} more)" if total > len(names) else listed
+
+
+def render_answer(intent: str, digest: Dict) -> str:
+    """Templated answer to a stock intent from a digest"""
+    if intent == 'shape':
+        answer = (
+            f"The dataset {digest['csv_file']} has {digest['rows']:,} rows and "
+            f"{digest['columns']} columns: {_names(digest['column_names'], digest['columns'])}."
+        )
+        if digest['date_columns']:
+            answer += f" Date columns: {', '.join(digest['date_columns'])}."
+        if digest['identifiers']:
+            answer += f" Likely identifier columns: {', '.join(digest['identifiers'])}."
+        return answer
+
+    if intent == 'missing':
+        if not digest['missing_columns']:
+            return f"The dataset {digest['csv_file']} has no missing values in any of its {digest['columns']} columns."
+        rows = max(digest['rows'], 1)
+        counts = [f"{col} {count:,} ({count / rows:.1%})" for col, count in digest['missing']]
+        return (
+            f"{digest['missing_columns']} of {digest['columns']} columns in {digest['csv_file']} have "
+            f"missing values ({digest['missing_cells']:,} cells in total): "
+            f"{_names(counts, digest['missing_columns'])}."
+        )
+
+    if intent == 'methods':
+        if digest['statistical_methods']:
+            answer = f"Statistical methods detected in {digest['python_file']}: {', '.join(digest['statistical_methods'])}."
+        else:
+            answer = f"No statistical methods were detected in {digest['python_file']}."
+        if digest['data_operations']:
+            answer += f" Data operations: {', '.join(digest['data_operations'])}."
+        if digest['visualizations']:
+            answer += f" Visualizations: {', '.join(digest['visualizations'])}."
+        return answer
+
+    if intent == 'functions':
+        if not digest['function_count']:
+            return f"{digest['python_file']} defines no functions."
+        described = [
+            f"{function['name']} ({function['summary']})" if function['summary'] else function['name']
+            for function in digest['functions']
+        ]
+        return (
+            f"{digest['python_file']} defines {digest['function_count']} "
+            f"function{'s' if digest['function_count'] != 1 else ''}: "
+            f"{_names(described, digest['function_count'])}."
+        )
+
+    raise ValueError(f"Unknown intent: {intent}")
@@ -0,0 +1,40 @@
+import json
+
+from batch_verify import completed_study_ids, truncate_partial_line
+
+
+def write_lines(path, records, tail=""):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records) + tail)
+
+
+def test_latest_record_per_study_wins(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_lines(output, [
+        {"study_id": "a", "status": "error"},
+        {"study_id": "a", "status": "success"},
+        {"study_id": "b", "status": "success"},
+        {"study_id": "b", "status": "error"}
+    ])
+
+    assert completed_study_ids(str(output)) == {"a"}
+
+
+def test_partial_line_is_cut_before_appending(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_lines(output, [{"study_id": "a", "status": "success"}], tail='{"study_id": "b", "sta')
+
+    assert completed_study_ids(str(output)) == {"a"}
+    truncate_partial_line(str(output), block_size=4)
+    with open(output, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"study_id": "b", "status": "success"}) + "\n")
+
+    assert completed_study_ids(str(output)) == {"a", "b"}
+
+
+def test_partial_only_line_is_removed(tmp_path):
+    output = tmp_path / "results.jsonl"
+    output.write_text('{"study_id"')
+
+    truncate_partial_line(str(output))
+
+    assert output.read_text() == ""
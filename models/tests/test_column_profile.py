@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from model import MedicalDataProcessor
+from sketches import HeavyHitters
+
+
+def test_mixed_column_counts_every_chunk(tmp_path):
+    rng = np.random.default_rng(0)
+    values = [str(value) for value in rng.integers(0, 5, 4000)]
+    values[3900] = "unknown"  # only the last chunk parses as text
+    path = tmp_path / "mixed.csv"
+    pd.DataFrame({"grade": values}).to_csv(path, index=False)
+
+    summary = MedicalDataProcessor(profile_workers=1).process_csv(str(path), chunk_size=500)
+
+    stats = summary.categorical_stats["grade"]
+    assert "grade" not in summary.numeric_stats
+    assert sum(stats["top_values"].values()) == 4000
+    assert stats["unique_count"] == 6
+    assert stats["top_values_exact"]
+
+
+def test_counts_past_capacity_are_marked_as_lower_bounds():
+    hitters = HeavyHitters(capacity=3)
+    hitters.update(pd.Series(["a", "a", "b", "c"]))
+    assert hitters.exact
+
+    hitters.update(pd.Series(["d", "e"]))
+    assert not hitters.exact
@@ -0,0 +1,27 @@
+import numpy as np
+
+from app import ScientificReproducibilityChecker
+
+
+class CountingModel:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, sources, normalize_embeddings=True):
+        self.encoded.extend(sources)
+        return [np.full(4, len(src), dtype=np.float32) for src in sources]
+
+
+def test_definition_embeddings_are_an_lru_of_bounded_size(monkeypatch):
+    model = CountingModel()
+    monkeypatch.setattr(ScientificReproducibilityChecker, "text_model", property(lambda self: model))
+    checker = ScientificReproducibilityChecker()
+    checker._definition_embeddings.max_entries = 2
+
+    first = checker._embed_definitions(["a", "bb", "ccc"])
+    assert [float(emb[0]) for emb in first] == [1.0, 2.0, 3.0]
+    assert len(checker._definition_embeddings._entries) == 2
+
+    # "a" was evicted; "ccc" is still cached
+    checker._embed_definitions(["ccc", "a"])
+    assert model.encoded == ["a", "bb", "ccc", "a"]
@@ -0,0 +1,75 @@
+import json
+import sqlite3
+
+from metadata_store import MetadataStore
+
+
+def legacy_study(study_id, title):
+    """A studies row as written before summaries moved out of JSON columns"""
+    csv_summary = {
+        "filename": "vitamins.csv",
+        "shape": [3, 2],
+        "columns": ["bmi", "vitamin_d"],
+        "column_types": {"bmi": "float64", "vitamin_d": "float64"},
+        "numeric_stats": {"bmi": {"mean": 27.0}, "vitamin_d": {"mean": 30.0}},
+        "categorical_stats": {},
+        "missing_values": {},
+        "sample_rows": [],
+        "potential_identifiers": [],
+        "date_columns": []
+    }
+    python_analysis = {
+        "filename": "analysis.py",
+        "functions": [{"name": "analyze_bmi_vitamin_correlation", "docstring": "", "parameters": []}],
+        "imports": ["pandas", "scipy.stats"],
+        "comments": [],
+        "statistical_methods": ["correlation"],
+        "data_operations": [],
+        "visualizations": [],
+        "variables": []
+    }
+    return (study_id, title, "BMI and vitamin D", "2024-01-01T00:00:00", json.dumps({}), "u1",
+            json.dumps(csv_summary), json.dumps(python_analysis))
+
+
+def test_migrated_legacy_studies_are_searchable(tmp_path):
+    path = str(tmp_path / "studies.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE studies (
+            study_id TEXT PRIMARY KEY, title TEXT, description TEXT, uploaded_at TEXT,
+            file_paths TEXT, user_id TEXT, csv_summary TEXT, python_analysis TEXT
+        )
+    """)
+    conn.execute("INSERT INTO studies VALUES (?, ?, ?, ?, ?, ?, ?, ?)", legacy_study("s1", "Vitamin D study"))
+    conn.commit()
+    conn.close()
+
+    store = MetadataStore(path)
+    if not store.full_text_search:
+        return
+
+    studies, _ = store.search("vitamin")
+    assert [study["study_id"] for study in studies] == ["s1"]
+    studies, _ = store.search("analyze_bmi_vitamin_correlation")
+    assert [study["study_id"] for study in studies] == ["s1"]
+    assert store.get("s1", fields=["csv_summary.columns"])["csv_summary"]["columns"] == ["bmi", "vitamin_d"]
+    store.close()
+
+
+def test_symbol_rows_missing_from_the_search_index_are_repaired(tmp_path):
+    path = str(tmp_path / "studies.db")
+    store = MetadataStore(path)
+    if not store.full_text_search:
+        return
+    with store.pool.connection() as conn:
+        conn.execute("INSERT INTO studies VALUES (?, ?, ?, ?, ?, ?)", legacy_study("s1", "Vitamin D study")[:6])
+        # A symbols row without its search row, as the old migration order left them
+        conn.execute("DROP TRIGGER study_symbols_search_insert")
+        conn.execute("INSERT INTO study_symbols (study_id, functions, imports, columns) VALUES ('s1', '', '', '')")
+    store.close()
+
+    store = MetadataStore(path)
+    studies, _ = store.search("vitamin")
+    assert [study["study_id"] for study in studies] == ["s1"]
+    store.close()
@@ -0,0 +1,53 @@
+import pytest
+
+from model import BaseLLM, MedicalRAGSystem
+from query_cache import SemanticAnswerCache
+
+
+class FailingStreamLLM(BaseLLM):
+    """Yields a few tokens, then fails like a dropped Gemini stream"""
+
+    def generate_response(self, prompt: str, max_tokens: int = 500) -> str:
+        return "Complete answer"
+
+    def generate_stream(self, prompt: str, max_tokens: int = 500):
+        yield "Partial "
+        yield "answer"
+        raise RuntimeError("connection reset")
+
+
+@pytest.fixture
+def system(monkeypatch):
+    # Only the query path is exercised: no vector store or embeddings
+    system = MedicalRAGSystem.__new__(MedicalRAGSystem)
+    system.llm = FailingStreamLLM()
+    system.answer_cache = SemanticAnswerCache()
+    monkeypatch.setattr(system, "_prepare_query", lambda question, study_id, top_k, use_cache: {
+        "cached": None,
+        "embedding": [1.0, 0.0],
+        "relevant_docs": [],
+        "context": "",
+        "context_tokens": 0,
+        "retrieval": "vector",
+        "prompt": question
+    })
+    return system
+
+
+def test_stream_failure_is_reported_but_not_cached(system):
+    events = list(system.query_study("What methods?", "s1", stream=True))
+
+    assert [event["type"] for event in events] == ["sources", "token", "token", "token", "done"]
+    answer = events[-1]["result"]["answer"]
+    assert answer.startswith("Partial answer")
+    assert "Error generating response: connection reset" in answer
+    assert system.answer_cache.get("s1", [1.0, 0.0], question="What methods?") is None
+
+
+def test_complete_stream_is_cached(system):
+    system.llm.generate_stream = lambda prompt, max_tokens=500: iter(["Full ", "answer"])
+
+    events = list(system.query_study("What methods?", "s1", stream=True))
+
+    assert events[-1]["result"]["answer"] == "Full answer"
+    assert system.answer_cache.get("s1", [1.0, 0.0], question="What methods?") is not None
@@ -0,0 +1,20 @@
+from result_store import ResultStore
+
+
+def test_hits_are_counted_in_memory_and_flushed_in_batches(tmp_path):
+    store = ResultStore(str(tmp_path))
+    store.HIT_FLUSH_EVERY = 3
+    key = store.make_key("validation", {}, "digest")
+    store.put(key, {"valid": True})
+
+    assert store.get(key) == {"valid": True}
+    assert store.get(key) == {"valid": True}
+    assert ResultStore(str(tmp_path)).stats()["lifetime_hits"] == {"validation": 0}
+
+    store.get(key)
+    assert ResultStore(str(tmp_path)).stats()["lifetime_hits"] == {"validation": 3}
+
+    store.get(key)
+    assert store.stats()["lifetime_hits"] == {"validation": 4}
+    assert store.get("validation:missing") is None
+    assert (store.hits, store.misses) == (4, 1)
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+from model import MedicalRAGSystem
+from query_cache import TTLCache
+
+
+def chunk(text):
+    return SimpleNamespace(page_content=text, metadata={"study_id": "s1"})
+
+
+class FakeVectorStore:
+    def __init__(self, docs):
+        self.docs = docs
+        self.searches = 0
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None):
+        self.searches += 1
+        return self.docs[:k]
+
+
+def test_lexical_results_are_fused_after_a_cached_vector_only_search():
+    system = MedicalRAGSystem.__new__(MedicalRAGSystem)
+    system.vectorstore = FakeVectorStore([chunk("vector a"), chunk("vector b")])
+    system.retrieval_cache = TTLCache(16, 3600)
+    system.lexical_params = {"rrf_k": 60}
+    system._index_versions = {}
+
+    # While the lexical index is still building, only vector results exist
+    first = system._retrieve("q", [1.0], "s1", 2)
+    assert [doc.page_content for doc in first] == ["vector a", "vector b"]
+
+    lexical = chunk("lexical match")
+    second = system._retrieve("q", [1.0], "s1", 2, lexical_docs=[lexical, first[1]])
+    assert system.vectorstore.searches == 1
+    # "vector b" is ranked by both searches, so fusion moves it to the top
+    assert [doc.page_content for doc in second] == ["vector b", "vector a"]
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from model import MedicalDataProcessor
+
+
+def similarity(left, right):
+    return float(np.mean(np.array(left) == np.array(right)))
+
+
+@pytest.fixture
+def dataset():
+    rng = np.random.default_rng(0)
+    n = 4000
+    frame = pd.DataFrame({
+        'patient_id': np.arange(n),
+        'age': rng.integers(18, 90, n).astype(float),
+        'bmi': rng.normal(27, 4, n).round(1),
+        'group': rng.choice(['a', 'b', 'c'], n)
+    })
+    # Missing values only late in the file: those chunks parse age as
+    # float64 while the earlier ones (and the schema sample) see int64
+    frame.loc[n - 300:, 'age'] = np.nan
+    frame['age'] = frame['age'].astype('Int64')
+    return frame
+
+
+def row_minhash(path, frame):
+    frame.to_csv(path, index=False)
+    processor = MedicalDataProcessor(profile_workers=1)
+    return processor.process_csv(str(path), chunk_size=500).row_minhash
+
+
+def test_reordered_rows_have_the_same_signature(tmp_path, dataset):
+    original = row_minhash(tmp_path / "original.csv", dataset)
+    reordered = row_minhash(tmp_path / "reordered.csv", dataset.iloc[::-1])
+
+    assert similarity(original, reordered) == 1.0
+
+
+def test_subset_similarity_tracks_jaccard(tmp_path, dataset):
+    original = row_minhash(tmp_path / "original.csv", dataset)
+    half = row_minhash(tmp_path / "half.csv", dataset.sample(frac=0.5, random_state=1))
+
+    assert similarity(original, half) == pytest.approx(0.5, abs=0.15)
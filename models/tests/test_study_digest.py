@@ -0,0 +1,35 @@
+import pytest
+
+from study_digest import classify_intent
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("What statistical methods are used?", "methods"),
+    ("what statistical methods?", "methods"),
+    ("How many rows and columns does the dataset have?", "shape"),
+    ("What columns are in the dataset?", "shape"),
+    ("Which columns have missing values?", "missing"),
+    ("How much data is missing?", "missing"),
+    ("Is there missing data?", "missing"),
+    ("What are the key functions?", "functions"),
+    ("List the functions in the code", "functions"),
+])
+def test_stock_questions(question, intent):
+    assert classify_intent(question) == intent
+
+
+@pytest.mark.parametrize("question", [
+    "Why was this test used?",
+    "Why were these statistical methods used?",
+    "Why is data missing?",
+    "How was missing data handled?",
+    "When were the tests run?",
+    "Who wrote the functions?",
+    "Where is the missing data?",
+    "Which test compares bmi by gender?",
+    "What does analyze_bmi_vitamin_correlation do?",
+    "What is the mean BMI?",
+    "Summarize the study",
+])
+def test_other_questions_go_through_retrieval(question):
+    assert classify_intent(question) is None
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from app import SubmissionValidator
+
+
+def write_dataset(path):
+    rng = np.random.default_rng(0)
+    n = 2000
+    frame = pd.DataFrame({
+        "patient_id": np.arange(n),
+        "bmi": rng.normal(27, 4, n).round(1),
+        "notes": rng.choice(["ok", "follow-up,\nrecheck", 'said "fine"', None], n)
+    })
+    frame.to_csv(path, index=False)
+
+
+def test_small_blocks_match_a_single_block(tmp_path):
+    path = tmp_path / "study.csv"
+    write_dataset(path)
+
+    whole = SubmissionValidator()
+    whole.CSV_BLOCK_BYTES = 1 << 30
+    blocks = SubmissionValidator()
+    blocks.CSV_BLOCK_BYTES = 64
+
+    ok_whole, report_whole = whole.validate_file(str(path))
+    ok_blocks, report_blocks = blocks.validate_file(str(path))
+
+    assert ok_whole and ok_blocks
+    assert report_blocks["metadata"]["shape"] == report_whole["metadata"]["shape"] == (2000, 3)
+    assert report_blocks["metadata"]["dtypes"] == report_whole["metadata"]["dtypes"]
+    assert report_blocks["warnings"] == report_whole["warnings"]
+
+
+def test_unclosed_quote_is_reported_without_reading_everything(tmp_path):
+    path = tmp_path / "broken.csv"
+    rows = [f"{i},{i * 2}" for i in range(5000)]
+    rows[10] = '10,"never closed'
+    path.write_text("a,b\n" + "\n".join(rows) + "\n")
+
+    validator = SubmissionValidator()
+    validator.CSV_BLOCK_BYTES = 256
+    validator.CSV_MAX_RECORD_BYTES = 1024
+
+    ok, report = validator.validate_file(str(path))
+
+    assert not ok
+    assert any("unclosed quote" in error for error in report["errors"])
+
+
+def test_unclosed_quote_at_end_of_file(tmp_path):
+    path = tmp_path / "broken.csv"
+    path.write_text('a,b\n1,2\n3,"open\n')
+
+    ok, report = SubmissionValidator().validate_file(str(path))
+
+    assert not ok
+    assert any("unclosed quote near line 3" in error for error in report["errors"])
+
+
+def test_bare_quotes_inside_unquoted_fields_are_literal(tmp_path):
+    path = tmp_path / "inches.csv"
+    rows = [f'{i}" monitor,{100 + i}' for i in range(15, 41)]
+    rows[5] = '"24"" monitor, curved",120'
+    path.write_text("item,price\n" + "\n".join(rows) + "\n")
+
+    validator = SubmissionValidator()
+    validator.CSV_BLOCK_BYTES = 64
+
+    ok, report = validator.validate_file(str(path))
+
+    assert ok, report["errors"]
+    assert report["metadata"]["shape"] == (26, 2)
@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain")
+
+from langchain.schema import Document
+
+from snapshot import copy_out, read_manifest, write_manifest
+from vector_index import MmapHNSWStore
+
+DIM = 8
+
+
+class NoEmbeddings:
+    def embed_documents(self, texts):
+        raise AssertionError("vectors are added precomputed")
+
+
+def add(store, ids, vectors, study_id="s1"):
+    store.add_embeddings(
+        ids,
+        [Document(page_content=chunk_id, metadata={"study_id": study_id}) for chunk_id in ids],
+        vectors
+    )
+
+
+def nearest(store, vector, **kwargs):
+    return [doc.page_content for doc in store.similarity_search_by_vector(vector, k=1, **kwargs)]
+
+
+def test_restored_store_maps_the_snapshot_and_leaves_it_untouched(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, DIM)).astype(np.float32)
+    store = MmapHNSWStore(str(tmp_path / "live"), NoEmbeddings(), initial_capacity=64)
+    add(store, [f"c{i}" for i in range(50)], vectors)
+    store.snapshot_to(str(tmp_path / "snap" / "vector_index"))
+    store.close()
+    manifest = write_manifest(str(tmp_path / "snap"), {})
+
+    base = str(tmp_path / "snap" / "vector_index")
+    copy_out(
+        str(tmp_path / "snap"),
+        read_manifest(str(tmp_path / "snap")),
+        str(tmp_path / "work"),
+        shared=[os.path.join("vector_index", name) for name in MmapHNSWStore.BASE_FILES],
+        prepare=lambda staging: MmapHNSWStore.link_base(os.path.join(staging, "vector_index"), base)
+    )
+    restored = MmapHNSWStore(str(tmp_path / "work" / "vector_index"), NoEmbeddings())
+    assert nearest(restored, vectors[7]) == ["c7"]
+    assert nearest(restored, vectors[7], filter={"study_id": "s1"}) == ["c7"]
+
+    # Replacing a snapshot row and adding new ones only writes to the work copy
+    add(restored, ["c7", "new"], np.stack([-vectors[7], vectors[7]]))
+    restored.persist()
+    assert nearest(restored, vectors[7]) == ["new"]
+    assert nearest(restored, vectors[7], filter={"study_id": "s1"}) == ["new"]
+    assert read_manifest(str(tmp_path / "snap"), checksums=True) == manifest
+
+    # A snapshot of the restored store is self-contained
+    restored.snapshot_to(str(tmp_path / "snap2"))
+    restored.close()
+    copied = MmapHNSWStore(str(tmp_path / "snap2"), NoEmbeddings())
+    assert copied.base_directory is None
+    embeddings = copied.get(ids=["c3", "new"], include=["embeddings"])["embeddings"]
+    assert np.allclose(embeddings[0], vectors[3] / np.linalg.norm(vectors[3]), atol=1e-6)
+    assert np.allclose(embeddings[1], vectors[7] / np.linalg.norm(vectors[7]), atol=1e-6)
+
+
+def test_persist_compacts_once_enough_rows_are_dead(tmp_path):
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(40, DIM)).astype(np.float32)
+    store = MmapHNSWStore(str(tmp_path), NoEmbeddings(), initial_capacity=64, compact_ratio=0.4)
+    add(store, [f"a{i}" for i in range(20)], vectors[:20], study_id="a")
+    add(store, [f"b{i}" for i in range(20)], vectors[20:], study_id="b")
+    store.persist()
+
+    # Re-adding a study tombstones its old rows; below the ratio they stay
+    add(store, [f"a{i}" for i in range(10)], vectors[:10], study_id="a")
+    store.persist()
+    assert (store._next_row, len(store)) == (50, 40)
+
+    add(store, [f"b{i}" for i in range(20)], vectors[20:], study_id="b")
+    store.persist()
+    assert (store._next_row, len(store)) == (40, 40)
+    assert nearest(store, vectors[25]) == ["b5"]
+    assert nearest(store, vectors[3], filter={"study_id": "a"}) == ["a3"]
+    store.close()
+
+    reopened = MmapHNSWStore(str(tmp_path), NoEmbeddings())
+    assert (reopened._next_row, len(reopened)) == (40, 40)
+    assert nearest(reopened, vectors[25]) == ["b5"]
+    assert nearest(reopened, vectors[12], filter={"study_id": "a"}) == ["a12"]
+    assert reopened.get(where={"study_id": "b"})["ids"] == [f"b{i}" for i in range(20)]
+
+
+def test_interrupted_compaction_is_finished_on_open(tmp_path):
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(10, DIM)).astype(np.float32)
+    store = MmapHNSWStore(str(tmp_path), NoEmbeddings(), compact_ratio=1.0)
+    add(store, [f"c{i}" for i in range(10)], vectors)
+    store.delete([f"c{i}" for i in range(5)])
+    store._finish_compaction = lambda: None  # Stop right after the commit
+    store.compact()
+    store.close()
+
+    reopened = MmapHNSWStore(str(tmp_path), NoEmbeddings())
+    assert not os.path.exists(reopened.vectors_path + ".compact")
+    assert (reopened._next_row, len(reopened)) == (5, 5)
+    assert nearest(reopened, vectors[7]) == ["c7"]
@@ -0,0 +1,486 @@
+# Memory-mapped vector store with an HNSW graph index
+
+import os
+import json
+import uuid
+import shutil
+import sqlite3
+import threading
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from langchain.schema import Document
+
+try:
+    import hnswlib
+    HNSW_AVAILABLE = True
+except ImportError:
+    HNSW_AVAILABLE = False
+
+
+class MmapHNSWStore:
+    """Vector store over a memory-mapped float32 matrix
+
+    Covers the parts of LangChain's Chroma interface that MedicalRAGSystem
+    uses (add_documents, get, delete, persist, similarity_search*).
+
+    - Embeddings are L2-normalized rows of vectors.f32, mapped into memory.
+    - Chunk text and metadata live in SQLite.
+    - Unfiltered search walks an HNSW graph (hnswlib, when installed, else an
+      exact scan).
+    - Search filtered on study_id scans that study's posting list exactly, so
+      it only touches that study's vectors.
+
+    Scores are cosine distances (lower is closer). Changes become durable
+    when persist() is called, as with Chroma's persist(). Deleted and
+    replaced chunks are tombstoned until compact() rewrites the store, which
+    persist() does once compact_ratio of the rows are dead. At the default
+    of half, files stay within twice the live size and rebuilding the graph
+    costs about one insert per replaced row.
+
+    A store restored from a snapshot (link_base) maps the snapshot's vectors
+    read-only and keeps only rows added later in its own vectors.f32, so
+    restoring doesn't copy the vectors. The snapshot must outlive the store.
+    """
+
+    FILTER_KEY = 'study_id'
+
+    # Files link_base serves from the snapshot instead of copying
+    BASE_FILES = ("vectors.f32", "graph.bin")
+
+    def __init__(self,
+                 persist_directory: str,
+                 embedding_function,
+                 m: int = 16,
+                 ef_construction: int = 200,
+                 ef_search: int = 64,
+                 initial_capacity: int = 1024,
+                 compact_ratio: float = 0.5):
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.compact_ratio = compact_ratio
+        self.vectors_path = os.path.join(persist_directory, "vectors.f32")
+        self.graph_path = os.path.join(persist_directory, "graph.bin")
+        self._lock = threading.RLock()
+
+        os.makedirs(persist_directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(persist_directory, "chunks.db"), check_same_thread=False)
+        self._create_chunks_table("chunks")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_chunks_study ON chunks (study_id)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+
+        meta = dict(self._db.execute("SELECT key, value FROM store_meta").fetchall())
+        if 'compacting' in meta:
+            self._finish_compaction()
+        for path in (self.vectors_path, self.graph_path):
+            if os.path.exists(f"{path}.compact"):
+                os.remove(f"{path}.compact")  # Compaction interrupted before its commit
+        self.dim: Optional[int] = int(meta['dim']) if 'dim' in meta else None
+        self.capacity = int(meta.get('capacity', initial_capacity))
+        # Rows are only reused by compact(), so between compactions vectors
+        # of persisted rows never change
+        self._next_row = int(meta.get('next_row', 0))
+        # Rows below base_rows are read from the snapshot's vectors
+        self.base_directory: Optional[str] = meta.get('base_directory')
+        self.base_rows = int(meta.get('base_rows', 0))
+
+        # Posting lists are loaded per study on first use (idx_chunks_study),
+        # so opening a large store doesn't walk every chunk in Python
+        self._postings: Dict[Optional[str], Set[int]] = {}
+        self._alive = np.zeros(self.capacity, dtype=bool)
+        live_rows = np.array(self._db.execute("SELECT row FROM chunks").fetchall(), dtype=np.int64).ravel()
+        self._alive[live_rows] = True
+
+        self._vectors: Optional[np.memmap] = None
+        self._base: Optional[np.memmap] = None
+        self._graph = None
+        if self.dim is not None:
+            self._open_vectors()
+            self._open_graph()
+
+    def __len__(self) -> int:
+        return int(self._alive.sum())
+
+    def _create_chunks_table(self, name: str):
+        self._db.execute(f"""
+            CREATE TABLE IF NOT EXISTS {name} (
+                row INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                study_id TEXT,
+                content TEXT,
+                metadata TEXT
+            )
+        """)
+
+    @staticmethod
+    def link_base(directory: str, base_directory: str):
+        """Point the store in directory at a snapshot's store in base_directory
+
+        directory holds a copy of the snapshot's chunks.db and none of its
+        BASE_FILES; the snapshot's vectors are mapped read-only when opened.
+        """
+        db = sqlite3.connect(os.path.join(directory, "chunks.db"))
+        meta = dict(db.execute("SELECT key, value FROM store_meta").fetchall())
+        db.executemany(
+            "INSERT OR REPLACE INTO store_meta VALUES (?, ?)",
+            [('base_directory', os.path.abspath(base_directory)), ('base_rows', meta.get('next_row', '0'))]
+        )
+        db.commit()
+        db.close()
+
+    def _open_vectors(self):
+        size = self.capacity * self.dim * 4
+        # Rows below base_rows are never written here, so they stay sparse
+        with open(self.vectors_path, 'ab') as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(self.capacity, self.dim))
+        if self.base_rows and self._base is None:
+            base_path = os.path.join(self.base_directory, "vectors.f32")
+            if not os.path.exists(base_path):
+                raise FileNotFoundError(f"Snapshot vectors this store is based on are missing: {base_path}")
+            self._base = np.memmap(base_path, dtype=np.float32, mode='r', shape=(self.base_rows, self.dim))
+
+    def _rows(self, rows: np.ndarray) -> np.ndarray:
+        """Vectors of the given rows, from the snapshot base or this store's file"""
+        if self._base is None:
+            return self._vectors[rows]
+        rows = np.asarray(rows, dtype=np.int64)
+        vectors = np.empty((len(rows), self.dim), dtype=np.float32)
+        in_base = rows < self.base_rows
+        vectors[in_base] = self._base[rows[in_base]]
+        vectors[~in_base] = self._vectors[rows[~in_base]]
+        return vectors
+
+    def _open_graph(self):
+        if not HNSW_AVAILABLE:
+            return
+        # Inner product on unit vectors: distance = 1 - cosine similarity
+        self._graph = hnswlib.Index(space='ip', dim=self.dim)
+        graph_path = self.graph_path
+        if self.base_rows and not os.path.exists(graph_path):
+            # Not persisted since the restore; the graph is read into memory
+            graph_path = os.path.join(self.base_directory, "graph.bin")
+        if os.path.exists(graph_path):
+            self._graph.load_index(graph_path, max_elements=self.capacity)
+            if self._graph.get_current_count() == self._next_row:
+                self._graph.set_ef(self.ef_search)
+                return
+            # Graph saved without the matching metadata commit (interrupted persist)
+            self._graph = hnswlib.Index(space='ip', dim=self.dim)
+        self._graph.init_index(max_elements=self.capacity, ef_construction=self.ef_construction, M=self.m)
+        self._graph.set_ef(self.ef_search)
+        if self._next_row:
+            rows = np.arange(self._next_row)
+            self._graph.add_items(self._rows(rows), rows)
+            for row in rows[~self._alive[:self._next_row]]:
+                self._graph.mark_deleted(int(row))
+
+    def _grow(self, needed: int):
+        capacity = max(needed, 2 * self.capacity)
+        self._vectors.flush()
+        self._vectors = None
+        self.capacity = capacity
+        self._open_vectors()
+        self._alive = np.concatenate((self._alive, np.zeros(capacity - len(self._alive), dtype=bool)))
+        if self._graph is not None:
+            self._graph.resize_index(capacity)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None) -> List[str]:
+        """Embed and add documents; an existing ID is replaced"""
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in documents]
+        # Last occurrence wins for IDs repeated within the batch
+        batch = list({chunk_id: doc for chunk_id, doc in zip(ids, documents)}.items())
+        if not batch:
+            return []
+        embeddings = self.embedding_function.embed_documents([doc.page_content for _, doc in batch])
+        return self.add_embeddings([chunk_id for chunk_id, _ in batch], [doc for _, doc in batch], embeddings)
+
+    def add_embeddings(self, ids: List[str], documents: List[Document], embeddings) -> List[str]:
+        """Add documents whose embeddings are already computed (IDs must be unique)"""
+        batch = list(zip(ids, documents))
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if not batch:
+            return []
+
+        with self._lock:
+            self.delete([chunk_id for chunk_id, _ in batch])
+            if self.dim is None:
+                self.dim = embeddings.shape[1]
+                self._open_vectors()
+                self._open_graph()
+            start = self._next_row
+            end = start + len(batch)
+            if end > self.capacity:
+                self._grow(end)
+
+            rows = np.arange(start, end)
+            self._vectors[start:end] = self._normalize(embeddings)
+            if self._graph is not None:
+                self._graph.add_items(self._vectors[start:end], rows)
+            self._next_row = end
+
+            records = []
+            for row, (chunk_id, doc) in zip(rows.tolist(), batch):
+                study_id = doc.metadata.get(self.FILTER_KEY)
+                if study_id in self._postings:
+                    self._postings[study_id].add(row)
+                self._alive[row] = True
+                records.append((row, chunk_id, study_id, doc.page_content, json.dumps(doc.metadata)))
+            self._db.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?)", records)
+        return [chunk_id for chunk_id, _ in batch]
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[Dict]] = None, ids: Optional[List[str]] = None) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        return self.add_documents([Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas)], ids=ids)
+
+    def delete(self, ids: Optional[List[str]] = None):
+        if not ids:
+            return
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                found = self._db.execute(
+                    f"SELECT row, study_id FROM chunks WHERE id IN ({', '.join('?' * len(batch))})", batch
+                ).fetchall()
+                for row, study_id in found:
+                    if study_id in self._postings:
+                        self._postings[study_id].discard(row)
+                    self._alive[row] = False
+                    if self._graph is not None:
+                        self._graph.mark_deleted(row)
+                self._db.executemany("DELETE FROM chunks WHERE row = ?", [(row,) for row, _ in found])
+
+    def get(self,
+            ids: Optional[List[str]] = None,
+            where: Optional[Dict] = None,
+            include: Optional[List[str]] = None,
+            limit: Optional[int] = None,
+            offset: Optional[int] = None) -> Dict:
+        """Chunks by ID and/or study_id, in Chroma's get() result shape
+
+        Embeddings (unit-normalized) are only returned when include lists them.
+        """
+        clauses, params = [], []
+        if where:
+            if set(where) != {self.FILTER_KEY}:
+                raise ValueError(f"Only '{self.FILTER_KEY}' filters are supported, got {where}")
+            clauses.append("study_id = ?")
+            params.append(where[self.FILTER_KEY])
+        if ids is not None:
+            clauses.append(f"id IN ({', '.join('?' * len(ids))})")
+            params.extend(ids)
+        sql = "SELECT id, content, metadata, row FROM chunks"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            if limit is not None or offset:
+                sql += " ORDER BY row LIMIT ? OFFSET ?"
+                params.extend([-1 if limit is None else limit, offset or 0])
+            else:
+                sql += " ORDER BY row"
+            rows = self._db.execute(sql, params).fetchall()
+            result = {
+                'ids': [row[0] for row in rows],
+                'documents': [row[1] for row in rows],
+                'metadatas': [json.loads(row[2]) for row in rows]
+            }
+            if include and 'embeddings' in include:
+                result['embeddings'] = self._rows([row[3] for row in rows]).tolist()
+        return result
+
+    def persist(self):
+        """Flush vectors and graph to disk and commit chunk metadata
+
+        Compacts the store instead once compact_ratio of its rows are dead.
+        """
+        with self._lock:
+            if self._next_row and self._next_row - len(self) >= self.compact_ratio * self._next_row:
+                self.compact()
+            else:
+                self._save()
+
+    def _save(self):
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            if self._graph is not None:
+                self._graph.save_index(self.graph_path)
+            meta = {'dim': self.dim, 'capacity': self.capacity, 'next_row': self._next_row}
+            self._db.executemany(
+                "INSERT OR REPLACE INTO store_meta VALUES (?, ?)",
+                [(key, str(value)) for key, value in meta.items() if value is not None]
+            )
+            self._db.commit()
+
+    def compact(self):
+        """Rewrite the store without its deleted rows
+
+        Live rows keep their order and are renumbered from 0, and the graph is
+        rebuilt from them. The new vectors and graph are written beside the
+        old ones and switched in by the chunks.db commit; a compaction
+        interrupted after that commit is finished when the store is opened.
+        """
+        with self._lock:
+            self._save()
+            if self.dim is None:
+                return
+            live = np.array(self._db.execute("SELECT row FROM chunks ORDER BY row").fetchall(), dtype=np.int64).ravel()
+            count = len(live)
+
+            # Unwritten capacity stays sparse in the new file
+            vectors = np.memmap(f"{self.vectors_path}.compact", dtype=np.float32, mode='w+',
+                                shape=(self.capacity, self.dim))
+            for start in range(0, count, 65536):
+                rows = live[start:start + 65536]
+                vectors[start:start + len(rows)] = self._rows(rows)
+            vectors.flush()
+            graph = None
+            if HNSW_AVAILABLE:
+                graph = hnswlib.Index(space='ip', dim=self.dim)
+                graph.init_index(max_elements=self.capacity, ef_construction=self.ef_construction, M=self.m)
+                graph.set_ef(self.ef_search)
+                if count:
+                    graph.add_items(vectors[:count], np.arange(count))
+                graph.save_index(f"{self.graph_path}.compact")
+            del vectors
+
+            self._db.execute("BEGIN")
+            self._create_chunks_table("chunks_compacted")
+            self._db.execute("""
+                INSERT INTO chunks_compacted
+                SELECT row_number() OVER (ORDER BY row) - 1, id, study_id, content, metadata FROM chunks
+            """)
+            self._db.execute("DROP TABLE chunks")
+            self._db.execute("ALTER TABLE chunks_compacted RENAME TO chunks")
+            self._db.execute("CREATE INDEX idx_chunks_study ON chunks (study_id)")
+            self._db.execute("DELETE FROM store_meta WHERE key IN ('base_directory', 'base_rows')")
+            self._db.executemany("INSERT OR REPLACE INTO store_meta VALUES (?, ?)", [
+                ('next_row', str(count)), ('compacting', '1')
+            ])
+            self._db.commit()
+            self._finish_compaction()
+
+            self._next_row = count
+            self.base_directory, self.base_rows, self._base = None, 0, None
+            self._alive = np.zeros(self.capacity, dtype=bool)
+            self._alive[:count] = True
+            self._postings = {}
+            self._vectors = None
+            self._open_vectors()
+            self._graph = graph
+
+    def _finish_compaction(self):
+        for path in (self.vectors_path, self.graph_path):
+            if os.path.exists(f"{path}.compact"):
+                os.replace(f"{path}.compact", path)
+        self._db.execute("DELETE FROM store_meta WHERE key = 'compacting'")
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            self._vectors = None
+            self._base = None
+            self._graph = None
+            self._db.close()
+
+    def snapshot_to(self, directory: str):
+        """Persist and compact, then copy the store's files into directory (opened later as a store)"""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self.persist()
+            if len(self) < self._next_row:
+                self.compact()
+            if self._base is not None:
+                # The snapshot's rows, then the rows added since
+                prefix = self.base_rows * self.dim * 4
+                with open(os.path.join(directory, "vectors.f32"), 'wb') as target:
+                    with open(os.path.join(self.base_directory, "vectors.f32"), 'rb') as base:
+                        for start in range(0, prefix, 1 << 24):
+                            target.write(base.read(min(1 << 24, prefix - start)))
+                    with open(self.vectors_path, 'rb') as overlay:
+                        overlay.seek(prefix)
+                        shutil.copyfileobj(overlay, target)
+            elif self._vectors is not None:
+                shutil.copyfile(self.vectors_path, os.path.join(directory, "vectors.f32"))
+            if self._graph is not None:
+                shutil.copyfile(self.graph_path, os.path.join(directory, "graph.bin"))
+            target = sqlite3.connect(os.path.join(directory, "chunks.db"))
+            self._db.backup(target)
+            target.execute("DELETE FROM store_meta WHERE key IN ('base_directory', 'base_rows')")
+            target.commit()
+            target.close()
+
+    def _posting_list(self, study_id: Optional[str]) -> Set[int]:
+        if study_id not in self._postings:
+            self._postings[study_id] = {
+                row for row, in self._db.execute("SELECT row FROM chunks WHERE study_id IS ?", (study_id,))
+            }
+        return self._postings[study_id]
+
+    def _search(self, query: np.ndarray, k: int, filter: Optional[Dict]) -> List[Tuple[int, float]]:
+        """(row, cosine distance) of the k nearest live rows"""
+        if self._vectors is None or k <= 0:
+            return []
+        query = self._normalize(np.asarray(query, dtype=np.float32))
+
+        if filter:
+            if set(filter) != {self.FILTER_KEY}:
+                raise ValueError(f"Only '{self.FILTER_KEY}' filters are supported, got {filter}")
+            rows = np.fromiter(self._posting_list(filter[self.FILTER_KEY]), dtype=np.int64)
+        elif self._graph is not None:
+            k = min(k, len(self))
+            if k == 0:
+                return []
+            labels, distances = self._graph.knn_query(query, k=k)
+            return list(zip(labels[0].tolist(), distances[0].tolist()))
+        else:
+            rows = np.flatnonzero(self._alive[:self._next_row])
+
+        if len(rows) == 0:
+            return []
+        # Fancy indexing reads only these rows from the mapped file
+        similarities = self._rows(rows) @ query
+        k = min(k, len(rows))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top], kind='stable')]
+        return [(int(rows[i]), float(1 - similarities[i])) for i in top]
+
+    def _documents(self, rows: List[int]) -> Dict[int, Document]:
+        if not rows:
+            return {}
+        found = self._db.execute(
+            f"SELECT row, content, metadata FROM chunks WHERE row IN ({', '.join('?' * len(rows))})", rows
+        ).fetchall()
+        return {row: Document(page_content=content, metadata=json.loads(metadata)) for row, content, metadata in found}
+
+    def similarity_search_by_vector_with_relevance_scores(self,
+                                                          embedding: List[float],
+                                                          k: int = 4,
+                                                          filter: Optional[Dict] = None) -> List[Tuple[Document, float]]:
+        with self._lock:
+            hits = self._search(embedding, k, filter)
+            documents = self._documents([row for row, _ in hits])
+        return [(documents[row], distance) for row, distance in hits if row in documents]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[Dict] = None) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_relevance_scores(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict] = None) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_relevance_scores(self.embedding_function.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict] = None) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]